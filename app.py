@@ -1,24 +1,40 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for, flash, Response, g
-import sqlite3
+from flask import Flask, render_template, jsonify, request, session, redirect, url_for, flash, Response, g, make_response
 from datetime import datetime, timedelta
 import os
+import math
 from dotenv import load_dotenv
 import json
+import base64
 import hashlib
 import secrets
 from functools import wraps
-import threading
 import time
+import threading
 import logging
 from logging.handlers import RotatingFileHandler
 from signalwire_swaig.swaig import SWAIG, SWAIGArgument, SWAIGFunctionProperties
 from signalwire.rest import Client as SignalWireClient
-import schedule
 from signalwire.voice_response import VoiceResponse
-import sys
-from mfa_util import SignalWireMFA, is_valid_uuid, validate_phone
-import requests
-import random
+from mfa_util import SignalWireMFA, validate_phone
+import db_util
+import events
+import reminders
+import outbox
+import signalwire_http
+from modem_reboots import RebootScheduler
+import telemetry
+import status_history
+import cache
+import metrics
+import profiler
+import passwords
+import ratelimit
+import job_numbers
+import ledger
+import billing_cycle
+from migrations import migrate
+from scheduling import (TIME_SLOTS, SlotEngine, SlotUnavailable, DuplicateBooking,
+                        to_epoch, format_appointment_time, parse_appointment_time)
 
 # Global SignalWire configuration variables
 SIGNALWIRE_PROJECT_ID = None
@@ -40,6 +56,9 @@ mfa_util = None
 # Add a global flag to track SWAIG endpoint registration
 SWAIG_ENDPOINTS_REGISTERED = False
 
+# Technician capacity per appointment slot
+slot_engine = SlotEngine()
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
@@ -99,7 +118,7 @@ def initialize_signalwire():
         app.logger.info("No .env file found; SignalWire not initialized")
 
 def register_swaig_endpoints():
-    global swaig, SWAIG_ENDPOINTS_REGISTERED
+    global SWAIG_ENDPOINTS_REGISTERED
     if not swaig:
         app.logger.error("Cannot register SWAIG endpoints: SWAIG not initialized")
         return
@@ -125,23 +144,23 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def check_balance(customer_id, meta_data=None, meta_data_token=None):
         try:
-            db = get_db()
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
+            db = get_read_db()
+            customer = lookup_customer(db, customer_id)
             if not customer:
                 return "I couldn't find your account. Please verify your account number.", []
-            billing = db.execute('''
-                SELECT * FROM billing 
-                WHERE customer_id = ? 
-                ORDER BY due_date DESC LIMIT 1
-            ''', (customer_id,)).fetchone()
+            billing = lookup_balance(db, customer_id)
             db.close()
-            if billing:
+            if billing and billing['due_date']:
                 return f"Your current balance is ${billing['amount']:.2f}, due on {billing['due_date']}.", []
+            if billing:
+                return f"Your current balance is ${billing['amount']:.2f}.", []
             return "No billing information found for your account.", []
         except Exception as e:
             app.logger.error(f"Error in check_balance: {str(e)}")
+            metrics.record_error(e)
             return "Error checking balance. Please try again later.", []
 
     @swaig.endpoint(
@@ -163,30 +182,33 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def make_payment(customer_id, amount, payment_method=None, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
+            customer = lookup_customer(db, customer_id)
             if not customer:
                 return "I couldn't find your account. Please verify your account number.", []
-            if not amount or amount <= 0:
+            try:
+                amount_cents = ledger.to_cents(amount)
+            except ValueError:
+                amount_cents = 0
+            if amount_cents <= 0:
                 return "Please provide a valid payment amount.", []
-            # Insert payment record
-            db.execute('''
-                INSERT INTO payments (customer_id, amount, payment_date, payment_method, status, transaction_id)
-                VALUES (?, ?, CURRENT_TIMESTAMP, ?, 'pending', ?)
-            ''', (customer_id, amount, payment_method or 'phone', secrets.token_hex(16)))
-            # Update balance
-            current_balance = db.execute('SELECT amount FROM billing WHERE customer_id = ? ORDER BY due_date DESC LIMIT 1', (customer_id,)).fetchone()
-            if current_balance:
-                new_balance = current_balance['amount'] - amount
-                db.execute('UPDATE billing SET amount = ? WHERE id = (SELECT id FROM billing WHERE customer_id = ? ORDER BY due_date DESC LIMIT 1)', 
-                           (new_balance, customer_id))
+            amount = amount_cents / 100
+            # The payment and its ledger entry move the balance in one transaction
+            ledger.record_payment(db, customer['id'], amount_cents, payment_method or 'phone', 'pending',
+                                  secrets.token_hex(16))
+            queue_customer_sms(db, customer_id, f"Zen Cable received your payment of ${amount:.2f}. Thank you!")
             db.commit()
+            invalidate_customer(customer_id)
+            sms_dispatcher.wake()
+            notify_balance(db, customer_id)
             db.close()
             return f"Payment of ${amount:.2f} initiated. Confirmation text incoming.", []
         except Exception as e:
             app.logger.error(f"Error in make_payment: {str(e)}")
+            metrics.record_error(e)
             return "Error processing payment. Please try again.", []
 
     @swaig.endpoint(
@@ -206,19 +228,28 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def check_modem_status(customer_id, meta_data=None, meta_data_token=None):
         try:
-            db = get_db()
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
+            db = get_read_db()
+            customer = lookup_customer(db, customer_id)
             if not customer:
                 return "I couldn't find your account. Please verify your account number.", []
             modem = db.execute('SELECT * FROM modems WHERE customer_id = ?', (customer_id,)).fetchone()
-            db.close()
             if modem:
-                return f"Your modem is {modem['status']}. MAC: {modem['mac_address']}.", []
+                now = int(time.time())
+                _, _, totals = status_history.query(db, customer_id, now - 7 * 86400, now, resolution='day')
+                db.close()
+                drops = totals['drops']
+                summary = f"It has gone offline {drops} time{'s' if drops != 1 else ''} in the last 7 days."
+                if totals['uptime_percent'] is not None:
+                    summary += f" Uptime over that period was {totals['uptime_percent']}%."
+                return f"Your modem is {modem['status']}. MAC: {modem['mac_address']}. {summary}", []
+            db.close()
             return "No modem information found for your account.", []
         except Exception as e:
             app.logger.error(f"Error in check_modem_status: {str(e)}")
+            metrics.record_error(e)
             return "Error checking modem status.", []
 
     @swaig.endpoint(
@@ -238,10 +269,11 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def reboot_modem(customer_id, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
+            customer = lookup_customer(db, customer_id)
             if not customer:
                 return "I couldn't find your account. Please verify your account number.", []
 
@@ -249,20 +281,16 @@ def register_swaig_endpoints():
             if not modem:
                 return "No modem information found for your account.", []
 
-            # Update modem status to rebooting
-            db.execute('UPDATE modems SET status = "rebooting", last_seen = CURRENT_TIMESTAMP WHERE customer_id = ?', 
-                      (customer_id,))
-            db.commit()
-
-            # Start the reboot simulation in a background thread
-            thread = threading.Thread(target=simulate_modem_reboot, args=(customer_id,))
-            thread.daemon = True
-            thread.start()
+            # Update modem status to rebooting; the reboot scheduler brings it back online
+            if not start_modem_reboot(db, customer_id):
+                db.close()
+                return "Your modem is already rebooting. It should be back online shortly.", []
 
             db.close()
             return "Modem reboot initiated. This will take about 30 seconds.", []
         except Exception as e:
             app.logger.error(f"Error in reboot_modem: {str(e)}")
+            metrics.record_error(e)
             return "Error rebooting modem.", []
 
     @swaig.endpoint(
@@ -290,6 +318,7 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def schedule_appointment(customer_id, type, date, time_slot, notes=None, make=None, model=None, mac_address=None, sms_reminder=True, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
@@ -306,91 +335,41 @@ def register_swaig_endpoints():
                     return "Please select a future date.", []
             except ValueError:
                 return "Invalid date format.", []
-            # Check for existing appointments
-            existing = db.execute('''
-                SELECT * FROM appointments 
-                WHERE customer_id = ? 
-                AND date(start_time) = date(?)
-            ''', (customer_id, appointment_date)).fetchone()
-            if existing:
-                return f"You already have an appointment on {date}. Would you like to reschedule it?", []
-            # Set time slots
-            time_slots = {
-                'morning': ('08:00 AM', '11:00 AM'),
-                'afternoon': ('02:00 PM', '04:00 PM'),
-                'evening': ('06:00 PM', '08:00 PM'),
-                'all_day': ('08:00 AM', '08:00 PM')
-            }
-            start_time, end_time = time_slots[time_slot]
-            # Check if time slot is available
-            slot_conflict = db.execute('''
-                SELECT * FROM appointments 
-                WHERE date(start_time) = date(?)
-                AND (
-                    (start_time <= ? AND end_time > ?) OR
-                    (start_time < ? AND end_time >= ?) OR
-                    (start_time >= ? AND end_time <= ?)
-                )
-            ''', (appointment_date, 
-                  f"{date} {end_time}", f"{date} {start_time}",
-                  f"{date} {end_time}", f"{date} {start_time}",
-                  f"{date} {start_time}", f"{date} {end_time}")).fetchone()
-            if slot_conflict:
-                return f"The {time_slot} time slot on {date} is already booked. Please choose another time.", []
-            # Generate job number
-            job_number = generate_job_number()
+            start_time, end_time = TIME_SLOTS[time_slot]
             # Prepare appointment notes
             appointment_notes = notes or ""
             if type == "modem_swap":
                 if not all([make, model, mac_address]):
                     return "For modem swap appointments, please provide the make, model, and MAC address of the new modem.", []
-                formatted_mac = format_mac_address(mac_address)
+                formatted_mac = telemetry.normalize_mac(mac_address)
                 if not formatted_mac:
                     return "Invalid MAC address format. Please provide a valid MAC address.", []
                 appointment_notes = f"New Modem Details - Make: {make}, Model: {model}, MAC: {formatted_mac}\n{appointment_notes}"
-            # Insert appointment
-            cursor = db.execute('''
-                INSERT INTO appointments (customer_id, type, status, start_time, end_time, notes, sms_reminder, job_number)
-                VALUES (?, ?, 'scheduled', ?, ?, ?, ?, ?)
-            ''', (customer_id, type, 
-                  f"{date} {start_time}", 
-                  f"{date} {end_time}",
-                  appointment_notes,
-                  sms_reminder,
-                  job_number))
-            appointment_id = cursor.lastrowid
-            # Get the created appointment
-            appointment = db.execute('''
-                SELECT a.*, t.name as technician_name
-                FROM appointments a
-                LEFT JOIN technicians t ON a.technician_id = t.id
-                WHERE a.id = ?
-            ''', (appointment_id,)).fetchone()
-            # Schedule reminders if enabled
-            if sms_reminder:
-                schedule_reminders(dict(appointment))
-            db.commit()
-            # Send SMS notification about new appointment
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
-            if customer:
-                try:
-                    compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                    appointment_time = appointment['start_time']
-                    message = f"Your {appointment['type']} appointment (Job #{appointment['job_number']}) is scheduled for {appointment_time}. Call 1-800-ZEN-CABLE to reschedule."
-                    payload = {
-                        "From": FROM_NUMBER,
-                        "To": customer['phone'],
-                        "Body": message
-                    }
-                    response = requests.post(
-                        compat_url,
-                        data=payload,
-                        auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                        headers={"Content-Type": "application/x-www-form-urlencoded"}
-                    )
-                    response.raise_for_status()
-                except Exception as e:
-                    app.logger.error(f"Error sending appointment SMS: {str(e)}")
+            # Reserve a technician and insert the appointment in one write transaction
+            try:
+                with slot_engine.reserve(db, customer_id, date, time_slot) as (slot_start, slot_end):
+                    job_number = generate_job_number(db)
+                    cursor = db.execute('''
+                        INSERT INTO appointments (customer_id, type, status, start_time, end_time, start_ts, end_ts, notes, sms_reminder, job_number)
+                        VALUES (?, ?, 'scheduled', ?, ?, ?, ?, ?, ?, ?)
+                    ''', (customer_id, type,
+                          format_appointment_time(slot_start),
+                          format_appointment_time(slot_end),
+                          to_epoch(slot_start),
+                          to_epoch(slot_end),
+                          appointment_notes,
+                          sms_reminder,
+                          job_number))
+                    appointment_id = cursor.lastrowid
+                    # Reminders and the confirmation text commit together with the booking
+                    reminder_due = reminders.arm(db, appointment_id, to_epoch(slot_start)) if sms_reminder else None
+                    queue_customer_sms(db, customer_id, f"Your {type} appointment (Job #{job_number}) is scheduled for {format_appointment_time(slot_start)}. Call 1-800-ZEN-CABLE to reschedule.")
+            except DuplicateBooking:
+                return f"You already have an appointment on {date}. Would you like to reschedule it?", []
+            except SlotUnavailable:
+                return f"The {time_slot} time slot on {date} is already booked. Please choose another time.", []
+            reminder_scheduler.notify(reminder_due)
+            sms_dispatcher.wake()
             formatted_time = f"{date} {start_time[:5]} - {end_time[:5]}"
             response = f"Your {type} appointment has been scheduled for {formatted_time}. Your job number is {job_number}. "
             if sms_reminder:
@@ -399,6 +378,7 @@ def register_swaig_endpoints():
             return response, []
         except Exception as e:
             app.logger.error(f"SWAIG error in schedule_appointment: {str(e)}")
+            metrics.record_error(e)
             return "Error scheduling appointment.", []
         finally:
             db.close()
@@ -425,6 +405,7 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def reschedule_appointment(customer_id, date, time_slot, notes=None, job_number=None, appointment_id=None, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
@@ -456,84 +437,46 @@ def register_swaig_endpoints():
             except ValueError:
                 db.close()
                 return "Invalid date format.", []
-            # Set time slots
-            time_slots = {
-                'morning': ('08:00 AM', '11:00 AM'),
-                'afternoon': ('02:00 PM', '04:00 PM'),
-                'evening': ('06:00 PM', '08:00 PM'),
-                'all_day': ('08:00 AM', '08:00 PM')
-            }
-            start_time, end_time = time_slots[time_slot]
-            # Check for slot conflict
-            slot_conflict = db.execute('''
-                SELECT * FROM appointments 
-                WHERE customer_id = ? AND id != ? AND date(start_time) = date(?)
-                AND (
-                    (start_time <= ? AND end_time > ?) OR
-                    (start_time < ? AND end_time >= ?) OR
-                    (start_time >= ? AND end_time <= ?)
-                )
-            ''', (customer_id, appointment_id, appointment_date,
-                  f"{date} {end_time}", f"{date} {start_time}",
-                  f"{date} {end_time}", f"{date} {start_time}",
-                  f"{date} {start_time}", f"{date} {end_time}")).fetchone()
-            if slot_conflict:
+            start_time, end_time = TIME_SLOTS[time_slot]
+            # Reserve the new slot and move the appointment in one write transaction
+            try:
+                with slot_engine.reserve(db, customer_id, date, time_slot, exclude_id=appointment_id) as (slot_start, slot_end):
+                    db.execute('''
+                        UPDATE appointments
+                        SET start_time = ?, end_time = ?, start_ts = ?, end_ts = ?, notes = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (
+                        format_appointment_time(slot_start),
+                        format_appointment_time(slot_end),
+                        to_epoch(slot_start),
+                        to_epoch(slot_end),
+                        notes or appt['notes'],
+                        appointment_id
+                    ))
+                    # Log the reschedule
+                    db.execute('''
+                        INSERT INTO appointment_history (appointment_id, action, details, created_at)
+                        VALUES (?, 'rescheduled', ?, CURRENT_TIMESTAMP)
+                    ''', (appointment_id, json.dumps({
+                        'date': date,
+                        'time_slot': time_slot,
+                        'notes': notes or appt['notes'],
+                        'job_number': appt['job_number']
+                    })))
+                    # Re-arm reminders for the new time
+                    reminder_due = reminders.arm(db, appointment_id, to_epoch(slot_start)) if appt['sms_reminder'] else None
+                    queue_customer_sms(db, customer_id, f"Your {appt['type']} appointment (Job #{appt['job_number']}) has been rescheduled to {format_appointment_time(slot_start)}. Call 1-800-ZEN-CABLE to reschedule.")
+            except (DuplicateBooking, SlotUnavailable):
                 db.close()
                 return f"The {time_slot} time slot is already booked.", []
-            # Update appointment
-            db.execute('''
-                UPDATE appointments 
-                SET start_time = ?, end_time = ?, notes = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (
-                f"{date} {start_time}",
-                f"{date} {end_time}",
-                notes or appt['notes'],
-                appointment_id
-            ))
-            # Log the reschedule
-            db.execute('''
-                INSERT INTO appointment_history (appointment_id, action, details, created_at)
-                VALUES (?, 'rescheduled', ?, CURRENT_TIMESTAMP)
-            ''', (appointment_id, json.dumps({
-                'date': date,
-                'time_slot': time_slot,
-                'notes': notes or appt['notes'],
-                'job_number': appt['job_number']
-            })))
-            db.commit()
-            # Get updated appointment
-            updated_appointment = db.execute('''
-                SELECT a.*, t.name as technician_name
-                FROM appointments a
-                LEFT JOIN technicians t ON a.technician_id = t.id
-                WHERE a.id = ?
-            ''', (appointment_id,)).fetchone()
-            # Send SMS notification about reschedule
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
-            if customer:
-                try:
-                    compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                    appointment_time = updated_appointment['start_time']
-                    message = f"Your {updated_appointment['type']} appointment (Job #{updated_appointment['job_number']}) has been rescheduled to {appointment_time}. Call 1-800-ZEN-CABLE to reschedule."
-                    payload = {
-                        "From": FROM_NUMBER,
-                        "To": customer['phone'],
-                        "Body": message
-                    }
-                    response = requests.post(
-                        compat_url,
-                        data=payload,
-                        auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                        headers={"Content-Type": "application/x-www-form-urlencoded"}
-                    )
-                    response.raise_for_status()
-                except Exception as e:
-                    app.logger.error(f"Error sending reschedule appointment SMS: {str(e)}")
+            slot_engine.invalidate(appt['start_time'][:10])
+            reminder_scheduler.notify(reminder_due)
+            sms_dispatcher.wake()
             db.close()
             return f"Your appointment has been rescheduled to {date} {start_time} - {end_time}.", []
         except Exception as e:
             app.logger.error(f"SWAIG error in reschedule_appointment: {str(e)}")
+            metrics.record_error(e)
             return "Error rescheduling appointment.", []
 
     @swaig.endpoint(
@@ -554,6 +497,7 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def cancel_appointment(customer_id, job_number=None, appointment_id=None, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
@@ -581,6 +525,7 @@ def register_swaig_endpoints():
                 SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (appointment_id,))
+            reminders.disarm(db, appointment_id)
             # Log the cancellation
             db.execute('''
                 INSERT INTO appointment_history (appointment_id, action, details, created_at)
@@ -589,51 +534,18 @@ def register_swaig_endpoints():
                 'job_number': appt['job_number'],
                 'reason': 'Customer requested cancellation'
             })))
+            queue_customer_sms(db, customer_id, f"Your {appt['type']} appointment (Job #{appt['job_number']}) for {appt['start_time']} has been cancelled. Call 1-800-ZEN-CABLE to reschedule.")
             db.commit()
-            # Get updated appointment
-            updated_appointment = db.execute('''
-                SELECT a.*, t.name as technician_name
-                FROM appointments a
-                LEFT JOIN technicians t ON a.technician_id = t.id
-                WHERE a.id = ?
-            ''', (appointment_id,)).fetchone()
-            # Send SMS notification about cancellation
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
-            if customer:
-                try:
-                    compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                    appointment_time = updated_appointment['start_time']
-                    message = f"Your {updated_appointment['type']} appointment (Job #{updated_appointment['job_number']}) for {appointment_time} has been cancelled. Call 1-800-ZEN-CABLE to reschedule."
-                    payload = {
-                        "From": FROM_NUMBER,
-                        "To": customer['phone'],
-                        "Body": message
-                    }
-                    response = requests.post(
-                        compat_url,
-                        data=payload,
-                        auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                        headers={"Content-Type": "application/x-www-form-urlencoded"}
-                    )
-                    response.raise_for_status()
-                except Exception as e:
-                    app.logger.error(f"Error sending cancel appointment SMS: {str(e)}")
+            sms_dispatcher.wake()
+            # The freed technician is available again for that day
+            slot_engine.invalidate(appt['start_time'][:10])
             db.close()
             return "Your appointment has been cancelled.", []
         except Exception as e:
             app.logger.error(f"SWAIG error in cancel_appointment: {str(e)}")
+            metrics.record_error(e)
             return "Error cancelling appointment.", []
 
-    def format_mac_address(mac_address):
-        """Format MAC address to XX:XX:XX:XX:XX:XX format."""
-        # Remove any non-alphanumeric characters
-        mac = ''.join(c for c in mac_address if c.isalnum())
-        # Ensure we have exactly 12 characters
-        if len(mac) != 12:
-            return None
-        # Format with colons
-        return ':'.join(mac[i:i+2] for i in range(0, 12, 2))
-
     @swaig.endpoint(
         "Swap the customer's modem",
         SWAIGFunctionProperties(
@@ -654,17 +566,18 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def swap_modem(customer_id, make, model, mac_address, meta_data=None, meta_data_token=None):
         try:
             db = get_db()
-            customer = db.execute('SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone()
+            customer = lookup_customer(db, customer_id)
             if not customer:
                 return "I couldn't find your account. Please verify your account number.", []
 
-            # Format MAC address
-            formatted_mac = format_mac_address(mac_address)
+            # Stored in the same XX:XX:XX:XX:XX:XX form that telemetry looks up
+            formatted_mac = telemetry.normalize_mac(mac_address)
             if not formatted_mac:
-                return "Invalid MAC address. Please provide a valid 12-character MAC address.", []
+                return "Invalid MAC address. Please provide the 12 hexadecimal digits of the MAC address.", []
 
             # Check if MAC address is already in use
             existing = db.execute('SELECT * FROM modems WHERE mac_address = ? AND customer_id != ?', 
@@ -673,11 +586,14 @@ def register_swaig_endpoints():
                 return "This MAC address is already registered to another customer. Please provide a different MAC address.", []
 
             # Update modem information
-            db.execute('''
+            updated = db.execute('''
                 UPDATE modems 
                 SET make = ?, model = ?, mac_address = ?, last_updated = CURRENT_TIMESTAMP
                 WHERE customer_id = ?
-            ''', (make, model, formatted_mac, customer_id))
+            ''', (make, model, formatted_mac, customer_id)).rowcount
+            if not updated:
+                db.rollback()
+                return "I couldn't find a modem on your account to swap. Please contact support to add one.", []
 
             # Log the modem swap
             db.execute('''
@@ -690,15 +606,16 @@ def register_swaig_endpoints():
             })))
 
             db.commit()
+            invalidate_customer(customer_id)
+            notify_modem_status(db, customer_id)
 
-            # Get updated modem info
-            modem = db.execute('SELECT * FROM modems WHERE customer_id = ?', (customer_id,)).fetchone()
             db.close()
 
             return f"Modem information updated successfully. Your new modem is a {make} {model} with MAC address {formatted_mac}.", []
 
         except Exception as e:
             app.logger.error(f"Error in swap_modem: {str(e)}")
+            metrics.record_error(e)
             return "Error updating modem information.", []
 
     @swaig.endpoint(
@@ -718,15 +635,16 @@ def register_swaig_endpoints():
         meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
         meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
     )
+    @metrics.instrument
     def check_existing_appointments(customer_id, meta_data=None, meta_data_token=None):
         try:
-            db = get_db()
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            db = get_read_db()
+            now = to_epoch(datetime.now())
             appointments = db.execute('''
                 SELECT id, type, status, start_time, end_time, notes
                 FROM appointments
-                WHERE customer_id = ? AND start_time >= ?
-                ORDER BY start_time ASC
+                WHERE customer_id = ? AND start_ts >= ?
+                ORDER BY start_ts ASC
             ''', (customer_id, now)).fetchall()
             db.close()
             if not appointments:
@@ -738,8 +656,54 @@ def register_swaig_endpoints():
             return response, []
         except Exception as e:
             app.logger.error(f"SWAIG error in check_existing_appointments: {str(e)}")
+            metrics.record_error(e)
             return "Error checking appointments.", []
 
+    @swaig.endpoint(
+        "Find the next available appointment slots so the caller can pick one",
+        SWAIGFunctionProperties(
+            active=True,
+            wait_for_fillers=True,
+            fillers={
+                "default": [
+                    "Let me check which times are open...",
+                    "Looking up available appointments...",
+                    "One moment while I check the schedule..."
+                ]
+            }
+        ),
+        customer_id=SWAIGArgument(type="string", description="The customer's account ID", required=True),
+        start_date=SWAIGArgument(type="string", description="Earliest date to search from (YYYY-MM-DD); defaults to tomorrow", required=False),
+        days=SWAIGArgument(type="integer", description="How many days ahead to search (default 14)", required=False),
+        time_slot=SWAIGArgument(type="string", description="Only return this time slot", enum=["morning", "afternoon", "evening", "all_day"], required=False),
+        limit=SWAIGArgument(type="integer", description="Maximum number of options to return (default 3)", required=False),
+        meta_data=SWAIGArgument(type="object", description="Additional metadata", required=False),
+        meta_data_token=SWAIGArgument(type="string", description="Metadata token", required=False)
+    )
+    @metrics.instrument
+    def find_available_slots(customer_id, start_date=None, days=14, time_slot=None, limit=3, meta_data=None, meta_data_token=None):
+        try:
+            if time_slot and time_slot not in TIME_SLOTS:
+                return "Invalid time slot.", []
+            db = get_read_db()
+            try:
+                slots = lookup_available_slots(db, customer_id, start=start_date, days=days or 14,
+                                               limit=limit or 3, time_slot=time_slot)
+            except ValueError:
+                return "Invalid date format.", []
+            if not slots:
+                return "There are no open appointments in that period. Would you like me to check further out?", []
+            options = []
+            for slot in slots:
+                day = datetime.strptime(slot['date'], '%Y-%m-%d').strftime('%A, %B %d')
+                start_time, end_time = TIME_SLOTS[slot['time_slot']]
+                options.append(f"{slot['time_slot'].replace('_', ' ')} on {day} ({start_time} - {end_time})")
+            return "The next available appointments are: " + "; ".join(options) + ". Which one works best for you?", []
+        except Exception as e:
+            app.logger.error(f"SWAIG error in find_available_slots: {str(e)}")
+            metrics.record_error(e)
+            return "Error checking availability.", []
+
 # Add template filters
 @app.template_filter('status_color')
 def status_color(status):
@@ -793,28 +757,135 @@ def swaig_endpoint():
     return Response(resp_body, mimetype='application/json')
 
 def get_db():
+    """Pooled read-write connection, held for the rest of the app context."""
     if 'db' not in g:
-        g.db = sqlite3.connect('zen_cable.db')
-        g.db.row_factory = sqlite3.Row
+        g.db = db_util.acquire()
     return g.db
 
+def get_read_db():
+    """Pooled read-only connection for handlers that never write."""
+    if 'read_db' not in g:
+        g.read_db = db_util.acquire(readonly=True)
+    return g.read_db
+
 @app.teardown_appcontext
 def close_db(error):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    for key in ('db', 'read_db'):
+        db = g.pop(key, None)
+        if db is not None:
+            db_util.release(db)
+
+@app.before_request
+def tag_request_thread():
+    # Lets /admin/profile attribute samples to the route or SWAIG function
+    if request.path == '/swaig':
+        data = request.get_json(silent=True)
+        profiler.tag(f"swaig:{data.get('function') if isinstance(data, dict) else None}")
+    else:
+        profiler.tag(f"route:{request.endpoint}")
+
+@app.teardown_request
+def untag_request_thread(error):
+    profiler.untag()
+
+# Token buckets as '<count>/<seconds>': a key may make <count> requests at once
+# and regains them over <seconds>. Set a RATE_LIMIT_<NAME> to 0 to turn it off.
+RATE_LIMIT_DEFAULTS = {
+    'login': '100/1',               # all callers together
+    'login_ip': '20/60',
+    'login_email': '10/300',
+    'sms': '60/60',                 # texts and MFA codes sent, all callers
+    'sms_ip': '10/600',
+    'sms_account': '5/600',
+    'mfa_verify': '30/1',
+    'mfa_verify_ip': '30/600',
+    'mfa_verify_session': '10/600',
+    'swaig': '200/1',
+    'swaig_customer': '120/60',
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+rate_limiters = {name: ratelimit.from_spec(os.getenv(f'RATE_LIMIT_{name.upper()}', default), RATE_LIMIT_MAX_KEYS)
+                 for name, default in RATE_LIMIT_DEFAULTS.items()}
+
+def _request_email():
+    if request.is_json:
+        data = request.get_json(silent=True)
+        email = data.get('email') if isinstance(data, dict) else None
+    else:
+        email = request.form.get('email')
+    return f"email:{email.strip().lower()}" if isinstance(email, str) and email.strip() else None
+
+def _sms_account():
+    if 'customer_id' in session:
+        return f"customer:{session['customer_id']}"
+    return _request_email()
+
+def _swaig_customer():
+    data = request.get_json(silent=True)
+    try:
+        return str(data['argument']['parsed'][0]['customer_id'])
+    except (KeyError, IndexError, TypeError):
+        return None
+
+# endpoint -> [(limiter name, key function)]; a key of None skips that bucket.
+# Per-caller buckets come before the shared one, which is only spent when
+# every bucket admits the request (see ratelimit.admit).
+RATE_LIMIT_RULES = {
+    'login': [('login_ip', lambda: request.remote_addr), ('login_email', _request_email),
+              ('login', lambda: 'all')],
+    'initiate_password_reset': [('sms_ip', lambda: request.remote_addr), ('sms_account', _sms_account),
+                                ('sms', lambda: 'all')],
+    'test_sms': [('sms_ip', lambda: request.remote_addr), ('sms_account', _sms_account), ('sms', lambda: 'all')],
+    'test_mfa': [('sms_ip', lambda: request.remote_addr), ('sms_account', _sms_account), ('sms', lambda: 'all')],
+    'verify_mfa': [('mfa_verify_ip', lambda: request.remote_addr),
+                   ('mfa_verify_session', lambda: session.get('password_reset_mfa_id')),
+                   ('mfa_verify', lambda: 'all')],
+    'swaig': [('swaig_customer', _swaig_customer), ('swaig', lambda: 'all')],
+}
+
+@app.before_request
+def admit_request():
+    # Shed bursts before they reach SQLite or the SignalWire quota
+    if request.method != 'POST':
+        return None
+    rules = RATE_LIMIT_RULES.get('swaig' if request.path == '/swaig' else request.endpoint)
+    if not rules:
+        return None
+    names, buckets = [], []
+    for name, key_func in rules:
+        limiter = rate_limiters.get(name)
+        key = key_func() if limiter is not None else None
+        if key:
+            names.append(name)
+            buckets.append((limiter, key))
+    wait, refused = ratelimit.admit(buckets)
+    if not wait:
+        return None
+    app.logger.warning(f"Rate limited {request.path} ({names[refused]})")
+    if request.endpoint == 'login':
+        flash('Too many sign-in attempts. Please wait a moment and try again.', 'danger')
+        response = make_response(render_template('login.html'), 429)
+    else:
+        response = jsonify({'error': 'Too many requests; try again later'})
+        response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
 
 def init_db_if_needed():
     try:
-        db = get_db()
-        if not db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='customers'").fetchone():
+        with db_util.connection() as db:
+            initialized = db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='customers'").fetchone()
+            # Upgrade an existing database in place to the latest schema version
+            applied = migrate(db)
+        if applied:
+            app.logger.info(f"Applied schema migrations: {applied}")
+        if not initialized:
             from init_db import init_db
             from init_test_data import init_test_data
             print("Initializing database...")
             init_db()
             init_test_data()
             print("Database initialized!")
-        db.close()
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
@@ -828,14 +899,71 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def hash_password(password):
-    salt = secrets.token_hex(16)
-    hash_obj = hashlib.sha256((password + salt).encode())
-    return hash_obj.hexdigest(), salt
+def service_auth_required(f):
+    """HTTP basic auth with the SWAIG credentials, for machine-to-machine endpoints."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not (HTTP_USERNAME and HTTP_PASSWORD):
+            return jsonify({'error': 'Service credentials not configured'}), 503
+        auth = request.authorization
+        if not (auth and auth.username and auth.password
+                and secrets.compare_digest(auth.username, HTTP_USERNAME)
+                and secrets.compare_digest(auth.password, HTTP_PASSWORD)):
+            return jsonify({'error': 'Unauthorized'}), 401, {'WWW-Authenticate': 'Basic realm="zen"'}
+        return f(*args, **kwargs)
+    return decorated_function
 
-def verify_password(password, stored_hash, salt):
-    hash_obj = hashlib.sha256((password + salt).encode())
-    return hash_obj.hexdigest() == stored_hash
+def data_version(db, customer_id, resource):
+    row = db.execute('SELECT version FROM data_versions WHERE customer_id = ? AND resource = ?',
+                     (customer_id, resource)).fetchone()
+    return row[0] if row else 0
+
+def versioned(resource, vary_on_query=False):
+    """Serve a per-customer JSON endpoint with a weak ETag.
+
+    The tag comes from the data_versions counter that triggers bump on every
+    write, so a matching If-None-Match is answered with 304 after one
+    primary-key lookup, without running the handler at all.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            customer_id = session['customer_id']
+            version = data_version(get_read_db(), customer_id, resource)
+            etag = f"{resource}-{customer_id}-{version}"
+            if vary_on_query:
+                etag += '-' + hashlib.sha1(request.query_string).hexdigest()[:12]
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Let browsers keep the body but revalidate before every use
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def upgrade_password_hash(user, password):
+    """Re-hash a password that just verified against outdated KDF settings."""
+    try:
+        password_hash, password_salt = passwords.hash_password(password)
+    except passwords.PasswordPoolBusy:
+        return  # try again on a later login
+    db = get_db()
+    try:
+        # Skip if the password changed since it was read
+        db.execute('UPDATE customers SET password_hash = ?, password_salt = ? WHERE id = ? AND password_hash = ?',
+                   (password_hash, password_salt, user['id'], user['password_hash']))
+        db.commit()
+        invalidate_customer(user['id'])
+    except Exception as e:
+        db.rollback()
+        app.logger.error(f"Error upgrading password hash: {str(e)}")
+    finally:
+        db.close()
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -843,10 +971,22 @@ def login():
         email = request.form['email']
         password = request.form['password']
         remember = request.form.get('remember', False)
-        db = get_db()
+        db = get_read_db()
         user = db.execute('SELECT * FROM customers WHERE email = ?', (email,)).fetchone()
         db.close()
-        if user and verify_password(password, user['password_hash'], user['password_salt']):
+        # Unknown emails pay for a hash too, so timing does not give them away
+        stored_hash, salt = (user['password_hash'], user['password_salt']) if user else passwords.dummy_hash()
+        try:
+            valid, needs_rehash = passwords.verify_password(password, stored_hash, salt)
+            valid = valid and user is not None
+        except passwords.PasswordPoolBusy:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'warning')
+            response = make_response(render_template('login.html'), 503)
+            response.headers['Retry-After'] = '1'
+            return response
+        if valid:
+            if needs_rehash:
+                upgrade_password_hash(user, password)
             session['customer_id'] = user['id']
             if remember:
                 session.permanent = True
@@ -882,19 +1022,11 @@ def forgot_password():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    db = get_db()
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
-    services = db.execute('''
-        SELECT s.* FROM services s
-        JOIN customer_services cs ON s.id = cs.service_id
-        WHERE cs.customer_id = ? AND cs.status = 'active'
-    ''', (session['customer_id'],)).fetchall()
+    db = get_read_db()
+    customer = lookup_customer(db, session['customer_id'])
+    services = lookup_services(db, session['customer_id'])
     modem = db.execute('SELECT * FROM modems WHERE customer_id = ?', (session['customer_id'],)).fetchone()
-    billing = db.execute('''
-        SELECT * FROM billing 
-        WHERE customer_id = ? 
-        ORDER BY due_date DESC LIMIT 1
-    ''', (session['customer_id'],)).fetchone()
+    billing = lookup_balance(db, session['customer_id'])
     db.close()
 
     # Create a default billing object if none exists
@@ -916,37 +1048,222 @@ def dashboard():
 
     return render_template('dashboard.html', customer=customer, services=services, modem=modem, billing=billing)
 
+# Read-through caches for the rows nearly every page view and SWAIG call
+# starts with. Writers call invalidate_customer() after committing.
+CACHE_TTL = int(os.getenv('CACHE_TTL', 60))
+CACHE_SIZE = int(os.getenv('CACHE_SIZE', 10000))
+customer_cache = cache.TTLCache(CACHE_SIZE, CACHE_TTL)
+services_cache = cache.TTLCache(CACHE_SIZE, CACHE_TTL)
+billing_cache = cache.TTLCache(CACHE_SIZE, CACHE_TTL)
+# The services catalog changes only with a deploy, so it is kept longer
+catalog_cache = cache.TTLCache(1, int(os.getenv('CATALOG_CACHE_TTL', 600)))
+
+def lookup_customer(db, customer_id):
+    return customer_cache.get_or_load(str(customer_id), lambda: db.execute(
+        'SELECT * FROM customers WHERE id = ?', (customer_id,)).fetchone())
+
+def lookup_services(db, customer_id):
+    """The customer's active services, resolved against the cached catalog."""
+    catalog = catalog_cache.get_or_load('services', lambda: {
+        row['id']: row for row in db.execute('SELECT * FROM services')})
+    service_ids = services_cache.get_or_load(str(customer_id), lambda: tuple(row[0] for row in db.execute('''
+        SELECT service_id FROM customer_services
+        WHERE customer_id = ? AND status = 'active' ORDER BY id
+    ''', (customer_id,))))
+    return [catalog[service_id] for service_id in service_ids if service_id in catalog]
+
+def lookup_balance(db, customer_id):
+    """Amount owed, due date and status from the ledger's running balance."""
+    return billing_cache.get_or_load(str(customer_id), lambda: ledger.balance(db, customer_id))
+
+def invalidate_customer(customer_id):
+    """Drop a customer's cached rows; call after committing a write to them."""
+    key = str(customer_id)
+    for entries in (customer_cache, services_cache, billing_cache):
+        entries.invalidate(key)
+
+def read_modem_status(db, customer_id):
+    modem = db.execute('SELECT status, mac_address FROM modems WHERE customer_id = ?', (customer_id,)).fetchone()
+    return {'status': modem['status'], 'mac_address': modem['mac_address']} if modem else None
+
+def read_balance(db, customer_id):
+    billing = ledger.balance(db, customer_id)
+    return {'balance': billing['amount']} if billing else None
+
+def notify_modem_status(db, customer_id):
+    """Push the committed modem status to the customer's open dashboards."""
+    try:
+        status = read_modem_status(db, customer_id)
+        if status:
+            events.broker.publish(customer_id, 'modem_status', status)
+    except Exception as e:
+        app.logger.error(f"Error publishing modem status: {str(e)}")
+
+def notify_balance(db, customer_id):
+    """Push the committed balance to the customer's open dashboards."""
+    try:
+        balance = read_balance(db, customer_id)
+        if balance:
+            events.broker.publish(customer_id, 'balance', balance)
+    except Exception as e:
+        app.logger.error(f"Error publishing balance: {str(e)}")
+
 @app.route('/api/modem/status', methods=['GET'])
 @login_required
+@versioned('modem')
 def get_modem_status():
-    db = get_db()
-    modem = db.execute('SELECT status FROM modems WHERE customer_id = ?', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    modem = read_modem_status(db, session['customer_id'])
     db.close()
     if modem:
-        return jsonify({'status': modem['status']})
+        return jsonify(modem)
     return jsonify({'error': 'Modem not found'}), 404
 
+@app.route('/api/modem/history', methods=['GET'])
+@login_required
+def get_modem_history():
+    """Bucketed modem status history: ?days=7 (max 400), optional ?resolution=minute|hour|day."""
+    try:
+        days = float(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'Invalid days'}), 400
+    resolution = request.args.get('resolution')
+    if not 0 < days <= 400 or (resolution and resolution not in status_history.BUCKET_SECONDS):
+        return jsonify({'error': 'Invalid days or resolution'}), 400
+    now = int(time.time())
+    db = get_read_db()
+    resolution, buckets, totals = status_history.query(db, session['customer_id'], now - int(days * 86400), now, resolution)
+    db.close()
+    return jsonify({'resolution': resolution, 'buckets': buckets, 'totals': totals})
+
+@app.route('/metrics', methods=['GET'])
+@service_auth_required
+def prometheus_metrics():
+    """SWAIG function metrics for this process in Prometheus text format."""
+    lines = [
+        '# HELP rate_limit_rejections_total Requests turned away with 429, by rate limit.',
+        '# TYPE rate_limit_rejections_total counter',
+    ]
+    for name, limiter in sorted(rate_limiters.items()):
+        if limiter is not None:
+            lines.append(f'rate_limit_rejections_total{{limit="{name}"}} {limiter.rejected}')
+    return Response(metrics.registry.render() + '\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# Upper bound on one /admin/profile run, in seconds
+PROFILE_MAX_SECONDS = 60
+
+@app.route('/admin/profile', methods=['GET'])
+@service_auth_required
+def profile():
+    """Sample this worker's threads: ?seconds=10&interval=0.01&format=collapsed|summary&all_threads=1."""
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.01))
+    except ValueError:
+        return jsonify({'error': 'Invalid seconds or interval'}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({'error': f'seconds must be in (0, {PROFILE_MAX_SECONDS}] and interval in [0.001, 1]'}), 400
+    try:
+        stacks = profiler.sample(seconds, interval, all_threads=request.args.get('all_threads') == '1')
+    except profiler.ProfilerBusy:
+        return jsonify({'error': 'A profile is already running in this worker'}), 409
+    if request.args.get('format') == 'summary':
+        return jsonify(profiler.summary(stacks))
+    return Response(profiler.collapsed(stacks), mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename="profile-{int(time.time())}.folded"'
+    })
+
 @app.route('/api/billing/balance', methods=['GET'])
 @login_required
+@versioned('billing')
 def get_balance():
-    db = get_db()
-    billing = db.execute('''
-        SELECT amount FROM billing 
-        WHERE customer_id = ? 
-        ORDER BY due_date DESC LIMIT 1
-    ''', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    balance = read_balance(db, session['customer_id'])
     db.close()
-    if billing:
-        return jsonify({'balance': billing['amount']})
+    if balance:
+        return jsonify(balance)
     return jsonify({'error': 'No billing information found'}), 404
 
+# Seconds between keepalives on an idle stream. Each keepalive also re-reads
+# the customer's state, which picks up writes made by other worker processes.
+STREAM_HEARTBEAT = int(os.getenv('STREAM_HEARTBEAT', 20))
+# Streams are closed after this many seconds so worker threads get recycled;
+# EventSource reconnects on its own after the retry delay.
+STREAM_MAX_AGE = int(os.getenv('STREAM_MAX_AGE', 900))
+STREAM_RETRY_MS = 3000
+
+@app.route('/api/stream', methods=['GET'])
+@login_required
+def stream():
+    """Server-Sent Events feed of modem_status and balance changes."""
+    customer_id = session['customer_id']
+
+    def read_state():
+        with db_util.connection(readonly=True) as db:
+            return [('modem_status', read_modem_status(db, customer_id)),
+                    ('balance', read_balance(db, customer_id))]
+
+    def generate():
+        # Subscribe before the first read so no change slips in between
+        sub = events.broker.subscribe(customer_id)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            deadline = time.monotonic() + STREAM_MAX_AGE
+            sent = {}
+            pending = read_state()
+            while True:
+                for event, data in pending:
+                    if data is not None and sent.get(event) != data:
+                        sent[event] = data
+                        yield events.format_sse(event, data)
+                if time.monotonic() >= deadline:
+                    return
+                item = sub.get(timeout=STREAM_HEARTBEAT)
+                if item:
+                    pending = [item]
+                else:
+                    yield ': keepalive\n\n'
+                    pending = read_state()
+        finally:
+            events.broker.unsubscribe(sub)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Sort expressions for /api/appointments. NULL-able text columns are
+# coalesced so the (sort key, id) cursor comparison stays well defined.
+APPOINTMENT_SORT_KEYS = {
+    'start_time': 'a.start_ts',
+    'end_time': 'a.end_ts',
+    'type': "IFNULL(a.type, '')",
+    'status': "IFNULL(a.status, '')",
+    'priority': "IFNULL(a.priority, '')"
+}
+
+def encode_cursor(sort_by, sort_order, sort_value, appointment_id):
+    payload = json.dumps([sort_by, sort_order, sort_value, appointment_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, sort_by, sort_order):
+    """Return the (sort value, id) to continue after; ValueError if unusable."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort_by, cursor_order, sort_value, appointment_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError('Malformed cursor')
+    if (cursor_sort_by, cursor_order) != (sort_by, sort_order) or not isinstance(appointment_id, int):
+        raise ValueError('Cursor does not match the requested sort')
+    return sort_value, appointment_id
+
 @app.route('/api/appointments', methods=['GET'])
 @login_required
+@versioned('appointments', vary_on_query=True)
 def get_appointments():
     start = request.args.get('start')
     end = request.args.get('end')
-    page = max(1, request.args.get('page', 1, type=int))
+    cursor = request.args.get('cursor')
     per_page = min(max(1, request.args.get('per_page', 10, type=int)), 100)
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
     status = request.args.get('status')
     type_filter = request.args.get('type')
     technician = request.args.get('technician')
@@ -959,8 +1276,9 @@ def get_appointments():
     if not start or not end:
         return jsonify({'error': 'Start and end dates required'}), 400
     try:
-        start_date = datetime.strptime(start, '%Y-%m-%d')
-        end_date = datetime.strptime(end, '%Y-%m-%d')
+        # FullCalendar sends full ISO timestamps; only the date part matters
+        start_date = datetime.strptime(start[:10], '%Y-%m-%d')
+        end_date = datetime.strptime(end[:10], '%Y-%m-%d')
         if start_date > end_date or (end_date - start_date).days > 365:
             return jsonify({'error': 'Invalid date range'}), 400
     except ValueError:
@@ -982,16 +1300,22 @@ def get_appointments():
         return jsonify({'error': f'Invalid sort field: {valid_sort_fields}'}), 400
     if sort_order not in valid_sort_orders:
         return jsonify({'error': f'Invalid sort order: {valid_sort_orders}'}), 400
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort_by, sort_order)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
-    db = get_db()
+    db = get_read_db()
     query = '''
         SELECT a.*, c.name as customer_name, c.phone as customer_phone, t.name as technician_name
         FROM appointments a
         LEFT JOIN customers c ON a.customer_id = c.id
         LEFT JOIN technicians t ON a.technician_id = t.id
-        WHERE a.customer_id = ? AND a.start_time BETWEEN ? AND ?
+        WHERE a.customer_id = ? AND a.start_ts >= ? AND a.start_ts < ?
     '''
-    params = [session['customer_id'], start, end]
+    params = [session['customer_id'], to_epoch(start_date), to_epoch(end_date)]
     if status:
         query += ' AND a.status = ?'
         params.append(status)
@@ -1004,12 +1328,29 @@ def get_appointments():
     if priority:
         query += ' AND a.priority = ?'
         params.append(priority)
-    query += f' ORDER BY a.{sort_by} {sort_order}'
-    total = db.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
-    query += ' LIMIT ? OFFSET ?'
-    params.extend([per_page, (page - 1) * per_page])
-    appointments = db.execute(query, params).fetchall()
-    result = [dict(appt) for appt in appointments]
+    total = None
+    if include_total:
+        total = db.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+    # Keyset pagination: continue strictly after the (sort key, id) of the
+    # previous page's last row, so every page is an index seek, not an OFFSET scan.
+    sort_key = APPOINTMENT_SORT_KEYS[sort_by]
+    if after is not None:
+        query += f" AND ({sort_key}, a.id) {'<' if sort_order == 'desc' else '>'} (?, ?)"
+        params.extend(after)
+    query += f' ORDER BY {sort_key} {sort_order}, a.id {sort_order} LIMIT ?'
+    params.append(per_page + 1)
+    appointments = db.execute(query.replace('SELECT a.*', f'SELECT {sort_key} AS sort_key, a.*', 1), params).fetchall()
+    has_more = len(appointments) > per_page
+    appointments = appointments[:per_page]
+    next_cursor = None
+    if has_more:
+        last = appointments[-1]
+        next_cursor = encode_cursor(sort_by, sort_order, last['sort_key'], last['id'])
+    result = []
+    for appt in appointments:
+        appt = dict(appt)
+        del appt['sort_key']
+        result.append(appt)
 
     if include_history:
         for appt in result:
@@ -1020,25 +1361,28 @@ def get_appointments():
             reminders = db.execute('SELECT * FROM appointment_reminders WHERE appointment_id = ? ORDER BY sent_at DESC', (appt['id'],)).fetchall()
             appt['reminders'] = [dict(r) for r in reminders]
     db.close()
+    pagination = {'per_page': per_page, 'has_more': has_more, 'next_cursor': next_cursor}
+    if include_total:
+        pagination['total'] = total
     return jsonify({
         'appointments': result,
-        'pagination': {'total': total, 'page': page, 'per_page': per_page, 'total_pages': (total + per_page - 1) // per_page}
+        'pagination': pagination
     })
 
 @app.route('/appointments')
 @login_required
 def appointments():
-    db = get_db()
+    db = get_read_db()
     # Get all appointments for the customer
     appointments = db.execute('''
         SELECT a.*, t.name as technician_name
         FROM appointments a
         LEFT JOIN technicians t ON a.technician_id = t.id
         WHERE a.customer_id = ?
-        ORDER BY a.start_time DESC
+        ORDER BY a.start_ts DESC
     ''', (session['customer_id'],)).fetchall()
     # Fetch customer details to include in the template context
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
+    customer = lookup_customer(db, session['customer_id'])
     db.close()
 
     return render_template('appointments.html', appointments=appointments, customer=customer)
@@ -1046,13 +1390,9 @@ def appointments():
 @app.route('/billing')
 @login_required
 def billing():
-    db = get_db()
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
-    current_balance = db.execute('''
-        SELECT amount, due_date FROM billing 
-        WHERE customer_id = ? 
-        ORDER BY due_date DESC LIMIT 1
-    ''', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    customer = lookup_customer(db, session['customer_id'])
+    current_balance = lookup_balance(db, session['customer_id'])
     payment_methods = db.execute('''
         SELECT * FROM payment_methods 
         WHERE customer_id = ?
@@ -1085,19 +1425,40 @@ def modem_status():
             return jsonify({'error': 'Invalid status'}), 400
         try:
             if status == 'rebooting':
-                thread = threading.Thread(target=simulate_modem_reboot, args=(session['customer_id'],))
-                thread.daemon = True
-                thread.start()
+                start_modem_reboot(db, session['customer_id'])
             else:
                 db.execute('UPDATE modems SET status = ?, last_seen = CURRENT_TIMESTAMP WHERE customer_id = ?', 
                           (status, session['customer_id']))
                 db.commit()
+                notify_modem_status(db, session['customer_id'])
         except Exception as e:
             app.logger.error(f"Error updating modem status: {str(e)}")
             return jsonify({'error': 'Failed to update modem status'}), 500
     modem = db.execute('SELECT * FROM modems WHERE customer_id = ?', (session['customer_id'],)).fetchone()
     db.close()
-    return jsonify(dict(modem)) if modem else jsonify({'error': 'Modem not found'}), 404
+    if modem:
+        return jsonify(dict(modem))
+    return jsonify({'error': 'Modem not found'}), 404
+
+# Fleet heartbeats are buffered per MAC and written in one batch per interval
+heartbeat_buffer = telemetry.HeartbeatBuffer(flush_interval=float(os.getenv('HEARTBEAT_FLUSH_SECONDS', 1)))
+MAX_HEARTBEAT_BATCH = 10000
+
+@app.route('/api/modems/telemetry', methods=['POST'])
+@service_auth_required
+def ingest_telemetry():
+    """Accept a batch of modem heartbeats: {"heartbeats": [{"mac", "status", "ts"}]}."""
+    data = request.get_json(silent=True)
+    records = data.get('heartbeats') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a list of heartbeats'}), 400
+    if len(records) > MAX_HEARTBEAT_BATCH:
+        return jsonify({'error': f'At most {MAX_HEARTBEAT_BATCH} heartbeats per request'}), 413
+    heartbeats, rejected = telemetry.parse_heartbeats(records)
+    for mac, status, ts in heartbeats:
+        heartbeat_buffer.add(mac, status, ts)
+    heartbeat_buffer.start()
+    return jsonify({'accepted': len(heartbeats), 'rejected': rejected}), 202
 
 @app.route('/api/modem/swap', methods=['POST'])
 @login_required
@@ -1117,6 +1478,8 @@ def swap_modem():
     import re
     if not re.match(r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$', mac_address):
         return jsonify({'error': 'Invalid MAC address format'}), 400
+    # Stored in the same XX:XX:XX:XX:XX:XX form that telemetry looks up
+    mac_address = telemetry.normalize_mac(mac_address)
 
     db = get_db()
     try:
@@ -1144,6 +1507,8 @@ def swap_modem():
         })))
 
         db.commit()
+        invalidate_customer(session['customer_id'])
+        notify_modem_status(db, session['customer_id'])
 
         # Get updated modem info
         modem = db.execute('SELECT * FROM modems WHERE customer_id = ?', (session['customer_id'],)).fetchone()
@@ -1155,56 +1520,116 @@ def swap_modem():
         app.logger.error(f"Error swapping modem: {str(e)}")
         return jsonify({'error': 'Failed to update modem information'}), 500
 
-def simulate_modem_reboot(customer_id):
-    with app.app_context():
-        db = get_db()
-        try:
-            db.execute('UPDATE modems SET status = "rebooting", last_seen = CURRENT_TIMESTAMP WHERE customer_id = ?', (customer_id,))
-            db.commit()
-            time.sleep(30)
-            db.execute('UPDATE modems SET status = "online", last_seen = CURRENT_TIMESTAMP WHERE customer_id = ?', (customer_id,))
-            db.commit()
-        except Exception as e:
-            app.logger.error(f"Error in modem reboot simulation: {str(e)}")
-        finally:
-            db.close()
+def start_modem_reboot(db, customer_id):
+    """Put the modem into 'rebooting'; False if a reboot is already running."""
+    if not reboot_scheduler.request(customer_id):
+        return False
+    db.execute('UPDATE modems SET status = "rebooting", last_seen = CURRENT_TIMESTAMP WHERE customer_id = ?', (customer_id,))
+    db.commit()
+    notify_modem_status(db, customer_id)
+    return True
+
+def finish_modem_reboots(db, customer_ids):
+    for customer_id in customer_ids:
+        notify_modem_status(db, customer_id)
 
-def send_appointment_reminder(appointment, reminder_type='sms'):
+# Brings rebooting modems back online after MODEM_REBOOT_SECONDS, on one thread
+reboot_scheduler = RebootScheduler(duration=int(os.getenv('MODEM_REBOOT_SECONDS', 30)), on_complete=finish_modem_reboots)
+
+def signalwire_api():
+    """Shared keep-alive client for SignalWire REST calls."""
+    return signalwire_http.get_client(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN, SIGNALWIRE_SPACE)
+
+def send_appointment_reminder(reminder):
+    """Deliver one claimed appointment_reminders row; raises on failure."""
     if not signalwire_client or not FROM_NUMBER:
-        return False
-    db = get_db()
-    try:
-        customer = db.execute('SELECT * FROM customers WHERE id = ?', (appointment['customer_id'],)).fetchone()
-        if not customer:
-            return False
-        appointment_time = datetime.strptime(appointment['start_time'], '%Y-%m-%d %H:%M:%S')
+        raise RuntimeError("SignalWire is not configured")
+    with db_util.connection(readonly=True) as db:
+        customer = db.execute('SELECT phone FROM customers WHERE id = ?', (reminder['customer_id'],)).fetchone()
+    if not customer:
+        raise RuntimeError(f"Customer {reminder['customer_id']} not found")
+    if reminder['reminder_type'] == 'sms':
+        appointment_time = parse_appointment_time(reminder['start_time'])
         formatted_time = appointment_time.strftime('%B %d, %Y at %I:%M %p')
-        message = f"Reminder: Your {appointment['type']} appointment is on {formatted_time}. Call 1-800-ZEN-CABLE to reschedule."
-        if reminder_type == 'sms':
-            signalwire_client.messages.create(to=customer['phone'], from_=FROM_NUMBER, body=message)
-        else:
-            signalwire_client.calls.create(to=customer['phone'], from_=FROM_NUMBER, 
-                                         url=f"{request.host_url}reminder_call/{appointment['id']}")
-        db.execute('INSERT INTO appointment_reminders (appointment_id, reminder_type, sent_at, status) VALUES (?, ?, CURRENT_TIMESTAMP, "sent")', 
-                  (appointment['id'], reminder_type))
-        db.commit()
-        return True
-    except Exception as e:
-        app.logger.error(f"Error sending {reminder_type} reminder: {str(e)}")
-        return False
-    finally:
-        db.close()
+        message = f"Reminder: Your {reminder['type']} appointment is on {formatted_time}. Call 1-800-ZEN-CABLE to reschedule."
+        send_sms(customer['phone'], message)
+    else:
+        public_url = os.getenv('PUBLIC_URL')
+        if not public_url:
+            raise RuntimeError("PUBLIC_URL is not set; cannot place reminder calls")
+        response = signalwire_api().create_call(customer['phone'], FROM_NUMBER,
+                                                f"{public_url.rstrip('/')}/reminder_call/{reminder['appointment_id']}")
+        response.raise_for_status()
 
-def schedule_reminders(appointment):
-    if not signalwire_client or not FROM_NUMBER:
+# Delivers reminders persisted in appointment_reminders; see start_background_workers
+reminder_scheduler = reminders.ReminderScheduler(send_appointment_reminder)
+
+def send_sms(to_number, body):
+    """Send one SMS through the SignalWire Messages API; raises on failure."""
+    if not all([SIGNALWIRE_SPACE, SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN, FROM_NUMBER]):
+        raise RuntimeError("SignalWire is not configured")
+    response = signalwire_api().send_sms(to_number, FROM_NUMBER, body)
+    response.raise_for_status()
+
+def queue_customer_sms(db, customer_id, body):
+    """Queue a text to the customer in the caller's transaction."""
+    customer = db.execute('SELECT phone FROM customers WHERE id = ?', (customer_id,)).fetchone()
+    if customer and customer['phone']:
+        outbox.enqueue(db, customer['phone'], body, customer_id=customer_id)
+
+# Sends queued sms_outbox rows in the background; see start_background_workers
+sms_dispatcher = outbox.OutboxDispatcher(send_sms)
+
+# Rolls modem status transitions up into minute/hour/day buckets; see start_background_workers
+status_rollup = status_history.StatusRollup(interval=int(os.getenv('STATUS_ROLLUP_SECONDS', 60)))
+
+# Bills the month on BILLING_CYCLE_DAY and marks overdue bills; off unless set
+BILLING_CYCLE_DAY = int(os.getenv('BILLING_CYCLE_DAY', 0))
+billing_scheduler = billing_cycle.BillingScheduler(
+    BILLING_CYCLE_DAY, due_days=int(os.getenv('BILLING_DUE_DAYS', billing_cycle.DEFAULT_DUE_DAYS)),
+    chunk_size=int(os.getenv('BILLING_CHUNK_SIZE', billing_cycle.DEFAULT_CHUNK_SIZE)),
+    on_change=billing_cache.clear) if BILLING_CYCLE_DAY else None
+
+# Set BACKGROUND_WORKERS=0 for processes that should only serve requests
+BACKGROUND_WORKERS = os.getenv('BACKGROUND_WORKERS', '1') != '0'
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+def start_background_workers():
+    """Start the schedulers and senders once per process (again in a forked worker)."""
+    global _workers_pid
+    if _workers_pid == os.getpid():
         return
-    appointment_time = datetime.strptime(appointment['start_time'], '%Y-%m-%d %H:%M:%S')
-    sms_time = appointment_time - timedelta(hours=24)
-    if sms_time > datetime.now():
-        schedule.every().day.at(sms_time.strftime('%H:%M')).do(send_appointment_reminder, appointment, 'sms')
-    call_time = appointment_time - timedelta(hours=1)
-    if call_time > datetime.now():
-        schedule.every().day.at(call_time.strftime('%H:%M')).do(send_appointment_reminder, appointment, 'call')
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        with db_util.connection() as db:
+            reboot_scheduler.recover(db)
+        status_rollup.start()
+        if billing_scheduler:
+            billing_scheduler.start()
+        if signalwire_client:
+            reminder_scheduler.start()
+            sms_dispatcher.start()
+        _workers_pid = os.getpid()
+
+@app.before_request
+def ensure_background_workers():
+    # WSGI servers never run __main__, so the first request starts them
+    if BACKGROUND_WORKERS:
+        start_background_workers()
+
+@app.route('/reminder_call/<int:appointment_id>', methods=['GET', 'POST'])
+def reminder_call(appointment_id):
+    db = get_read_db()
+    appointment = db.execute('SELECT type, start_time FROM appointments WHERE id = ?', (appointment_id,)).fetchone()
+    db.close()
+    response = VoiceResponse()
+    if appointment:
+        formatted_time = parse_appointment_time(appointment['start_time']).strftime('%B %d at %I:%M %p')
+        response.say(f"This is Zen Cable reminding you of your {appointment['type']} appointment on {formatted_time}. "
+                     "Call 1-800-ZEN-CABLE to reschedule.")
+    return Response(str(response), mimetype='text/xml')
 
 def log_appointment_history(appointment_id, action, details):
     db = get_db()
@@ -1220,8 +1645,8 @@ def log_appointment_history(appointment_id, action, details):
 @app.route('/settings')
 @login_required
 def settings():
-    db = get_db()
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    customer = lookup_customer(db, session['customer_id'])
     db.close()
     return render_template('settings.html', customer=customer)
 
@@ -1245,7 +1670,8 @@ def update_profile():
               request.json['phone'], request.json['address'], 
               session['customer_id']))
         db.commit()
-        customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
+        invalidate_customer(session['customer_id'])
+        customer = lookup_customer(db, session['customer_id'])
         db.close()
         return jsonify(dict(customer))
     except Exception as e:
@@ -1265,17 +1691,18 @@ def change_password():
     db = get_db()
     customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
 
-    if not verify_password(request.json['current_password'], customer['password_hash'], customer['password_salt']):
+    if not passwords.verify_password(request.json['current_password'], customer['password_hash'], customer['password_salt'])[0]:
         return jsonify({'error': 'Current password is incorrect'}), 400
 
+    password_hash, password_salt = passwords.hash_password(request.json['new_password'])
     try:
-        password_hash, password_salt = hash_password(request.json['new_password'])
         db.execute('''
             UPDATE customers 
             SET password_hash = ?, password_salt = ?
             WHERE id = ?
         ''', (password_hash, password_salt, session['customer_id']))
         db.commit()
+        invalidate_customer(session['customer_id'])
         db.close()
         return jsonify({'message': 'Password updated successfully'})
     except Exception as e:
@@ -1290,7 +1717,7 @@ def initiate_password_reset():
     email = data.get('email')
     if not email:
         return jsonify({'error': 'Email is required'}), 400
-    db = get_db()
+    db = get_read_db()
     customer = db.execute('SELECT * FROM customers WHERE email = ?', (email,)).fetchone()
     db.close()
     if not customer or not customer['phone']:
@@ -1298,21 +1725,10 @@ def initiate_password_reset():
     if not validate_phone(customer['phone']):
         return jsonify({'error': 'Invalid phone number format for this account.'}), 400
     try:
-        mfa_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/relay/rest/mfa/sms"
-        payload = {
-            "to": customer['phone'],
-            "from": FROM_NUMBER,
-            "message": "Your Zen Cable password reset code is: {{code}}. This code will expire in 5 minutes.",
-            "token_length": 6,
-            "max_attempts": 3,
-            "allow_alphas": False,
-            "valid_for": 300
-        }
-        response = requests.post(
-            mfa_url,
-            json=payload,
-            auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-            headers={"Content-Type": "application/json"}
+        response = signalwire_api().send_mfa(
+            customer['phone'], FROM_NUMBER,
+            "Your Zen Cable password reset code is: {{code}}. This code will expire in 5 minutes.",
+            valid_for=300
         )
         response.raise_for_status()
         mfa_data = response.json()
@@ -1343,15 +1759,8 @@ def verify_mfa():
         print("[MFA VERIFY] No code or MFA session found")
         return jsonify({'error': 'No code or MFA session found'}), 400
     try:
-        verify_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/relay/rest/mfa/{mfa_id}/verify"
-        payload = {"token": code}
-        print(f"[MFA VERIFY] Sending POST to {verify_url} with payload: {payload}")
-        response = requests.post(
-            verify_url,
-            json=payload,
-            auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-            headers={"Content-Type": "application/json"}
-        )
+        print(f"[MFA VERIFY] Verifying MFA ID {mfa_id}")
+        response = signalwire_api().verify_mfa(mfa_id, code)
         print(f"[MFA VERIFY] Response status: {response.status_code}")
         print(f"[MFA VERIFY] Response body: {response.text}")
         if response.status_code == 404:
@@ -1381,24 +1790,22 @@ def process_payment():
     if not all(field in request.json for field in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
 
+    try:
+        amount_cents = ledger.to_cents(request.json['amount'])
+    except ValueError:
+        amount_cents = 0
+    if amount_cents <= 0:
+        return jsonify({'error': 'Invalid payment amount'}), 400
+
     db = get_db()
     try:
-        # Insert payment record
+        # The payment and its ledger entry move the balance in one transaction
         transaction_id = secrets.token_hex(16)
-        db.execute('''
-            INSERT INTO payments (customer_id, amount, payment_method, status, transaction_id)
-            VALUES (?, ?, ?, 'completed', ?)
-        ''', (session['customer_id'], request.json['amount'], request.json['payment_method'], transaction_id))
-
-        # Update balance
-        current_balance = db.execute('SELECT amount FROM billing WHERE customer_id = ? ORDER BY due_date DESC LIMIT 1', 
-                                   (session['customer_id'],)).fetchone()
-        if current_balance:
-            new_balance = current_balance['amount'] - float(request.json['amount'])
-            db.execute('UPDATE billing SET amount = ? WHERE customer_id = ?', 
-                      (new_balance, session['customer_id']))
-
+        ledger.record_payment(db, session['customer_id'], amount_cents, request.json['payment_method'],
+                              'completed', transaction_id)
         db.commit()
+        invalidate_customer(session['customer_id'])
+        notify_balance(db, session['customer_id'])
         return jsonify({'success': True, 'transaction_id': transaction_id})
     except Exception as e:
         db.rollback()
@@ -1419,10 +1826,10 @@ def complete_password_reset():
     if not customer_id:
         return jsonify({'error': 'Invalid reset session'}), 401
 
+    password_hash, password_salt = passwords.hash_password(request.json['new_password'])
     db = get_db()
     try:
         # Update the password
-        password_hash, password_salt = hash_password(request.json['new_password'])
         db.execute('''
             UPDATE customers 
             SET password_hash = ?, password_salt = ?
@@ -1433,6 +1840,7 @@ def complete_password_reset():
         db.execute('DELETE FROM password_resets WHERE customer_id = ?', (customer_id,))
 
         db.commit()
+        invalidate_customer(customer_id)
         db.close()
 
         # Clear session data
@@ -1449,7 +1857,7 @@ def complete_password_reset():
 @app.route('/api/appointments/<int:appointment_id>', methods=['GET'])
 @login_required
 def get_appointment(appointment_id):
-    db = get_db()
+    db = get_read_db()
     appointment = db.execute('''
         SELECT a.*, t.name as technician_name
         FROM appointments a
@@ -1469,16 +1877,47 @@ def get_appointment(appointment_id):
         return jsonify(appt_dict)
     return jsonify({'error': 'Appointment not found'}), 404
 
-def generate_job_number():
-    """Generate a unique 5-digit job number."""
-    db = get_db()
-    while True:
-        # Generate a random 5-digit number
-        job_number = str(random.randint(10000, 99999))
-        # Check if it exists
-        exists = db.execute('SELECT 1 FROM appointments WHERE job_number = ?', (job_number,)).fetchone()
-        if not exists:
-            return job_number
+def lookup_available_slots(db, customer_id, start=None, days=14, limit=5, time_slot=None):
+    """Next bookable slots from `start` (YYYY-MM-DD), never earlier than tomorrow."""
+    earliest = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    start_date = datetime.strptime(start, '%Y-%m-%d') if start else earliest
+    start_date = max(start_date, earliest)
+    days = min(max(1, int(days)), 60)
+    limit = min(max(1, int(limit)), 20)
+    found = slot_engine.next_available(db, start_date, days, limit,
+                                       [time_slot] if time_slot else None, customer_id)
+    return [{
+        'date': date,
+        'time_slot': slot,
+        'start_time': f"{date} {TIME_SLOTS[slot][0]}",
+        'end_time': f"{date} {TIME_SLOTS[slot][1]}",
+        'remaining': remaining
+    } for date, slot, remaining in found]
+
+@app.route('/api/appointments/availability', methods=['GET'])
+@login_required
+def get_availability():
+    time_slot = request.args.get('time_slot')
+    if time_slot and time_slot not in TIME_SLOTS:
+        return jsonify({'error': f'Invalid time slot: {list(TIME_SLOTS)}'}), 400
+    try:
+        slots = lookup_available_slots(
+            get_read_db(), session['customer_id'],
+            start=request.args.get('start'),
+            days=request.args.get('days', 14, type=int),
+            limit=request.args.get('limit', 5, type=int),
+            time_slot=time_slot
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    return jsonify({'slots': slots})
+
+# Width of new job numbers; 8 digits allow 90 million appointments
+JOB_NUMBER_DIGITS = int(os.getenv('JOB_NUMBER_DIGITS', job_numbers.DEFAULT_DIGITS))
+
+def generate_job_number(db):
+    """Unique, non-sequential job number; call inside the booking transaction."""
+    return job_numbers.allocate(db, JOB_NUMBER_DIGITS)
 
 @app.route('/api/appointments', methods=['POST'])
 @login_required
@@ -1506,59 +1945,37 @@ def create_appointment():
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
 
-        # Check for existing appointments
-        existing = db.execute('''
-            SELECT * FROM appointments 
-            WHERE customer_id = ? 
-            AND date(start_time) = date(?)
-        ''', (session['customer_id'], appointment_date)).fetchone()
-
-        if existing:
+        # Reserve a technician and insert the appointment in one write transaction
+        try:
+            with slot_engine.reserve(db, session['customer_id'], request.json['date'], request.json['time_slot']) as (slot_start, slot_end):
+                # Generate job number
+                job_number = generate_job_number(db)
+
+                # Insert appointment
+                cursor = db.execute('''
+                    INSERT INTO appointments (customer_id, type, status, start_time, end_time, start_ts, end_ts, notes, sms_reminder, job_number)
+                    VALUES (?, ?, 'scheduled', ?, ?, ?, ?, ?, ?, ?)
+                ''', (session['customer_id'],
+                      request.json['type'],
+                      format_appointment_time(slot_start),
+                      format_appointment_time(slot_end),
+                      to_epoch(slot_start),
+                      to_epoch(slot_end),
+                      request.json.get('notes', ''),
+                      request.json.get('sms_reminder', True),
+                      job_number))
+
+                appointment_id = cursor.lastrowid
+                # Reminders are persisted in the same transaction as the booking
+                reminder_due = None
+                if request.json.get('sms_reminder', True):
+                    reminder_due = reminders.arm(db, appointment_id, to_epoch(slot_start))
+                queue_customer_sms(db, session['customer_id'], f"Your {request.json['type']} appointment (Job #{job_number}) is scheduled for {format_appointment_time(slot_start)}. Call 1-800-ZEN-CABLE to reschedule.")
+        except DuplicateBooking:
             return jsonify({'error': f'You already have an appointment on {request.json["date"]}'}), 400
-
-        # Set time slots
-        time_slots = {
-            'morning': ('08:00 AM', '11:00 AM'),
-            'afternoon': ('02:00 PM', '04:00 PM'),
-            'evening': ('06:00 PM', '08:00 PM'),
-            'all_day': ('08:00 AM', '08:00 PM')
-        }
-        start_time, end_time = time_slots[request.json['time_slot']]
-
-        # Check if time slot is available
-        slot_conflict = db.execute('''
-            SELECT * FROM appointments 
-            WHERE date(start_time) = date(?)
-            AND (
-                (start_time <= ? AND end_time > ?) OR
-                (start_time < ? AND end_time >= ?) OR
-                (start_time >= ? AND end_time <= ?)
-            )
-        ''', (appointment_date, 
-              f"{request.json['date']} {end_time}", f"{request.json['date']} {start_time}",
-              f"{request.json['date']} {end_time}", f"{request.json['date']} {start_time}",
-              f"{request.json['date']} {start_time}", f"{request.json['date']} {end_time}")).fetchone()
-
-        if slot_conflict:
+        except SlotUnavailable:
             return jsonify({'error': f'The {request.json["time_slot"]} time slot on {request.json["date"]} is already booked'}), 400
 
-        # Generate job number
-        job_number = generate_job_number()
-
-        # Insert appointment
-        cursor = db.execute('''
-            INSERT INTO appointments (customer_id, type, status, start_time, end_time, notes, sms_reminder, job_number)
-            VALUES (?, ?, 'scheduled', ?, ?, ?, ?, ?)
-        ''', (session['customer_id'], 
-              request.json['type'],
-              f"{request.json['date']} {start_time}",
-              f"{request.json['date']} {end_time}",
-              request.json.get('notes', ''),
-              request.json.get('sms_reminder', True),
-              job_number))
-
-        appointment_id = cursor.lastrowid
-
         # Get the created appointment
         appointment = db.execute('''
             SELECT a.*, t.name as technician_name
@@ -1567,33 +1984,8 @@ def create_appointment():
             WHERE a.id = ?
         ''', (appointment_id,)).fetchone()
 
-        db.commit()
-
-        # Schedule reminders if enabled
-        if request.json.get('sms_reminder', True):
-            schedule_reminders(dict(appointment))
-
-        # Send SMS notification about new appointment
-        customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
-        if customer:
-            try:
-                compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                appointment_time = appointment['start_time']
-                message = f"Your {appointment['type']} appointment (Job #{appointment['job_number']}) is scheduled for {appointment_time}. Call 1-800-ZEN-CABLE to reschedule."
-                payload = {
-                    "From": FROM_NUMBER,
-                    "To": customer['phone'],
-                    "Body": message
-                }
-                response = requests.post(
-                    compat_url,
-                    data=payload,
-                    auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
-                )
-                response.raise_for_status()
-            except Exception as e:
-                app.logger.error(f"Error sending appointment SMS: {str(e)}")
+        reminder_scheduler.notify(reminder_due)
+        sms_dispatcher.wake()
 
         return jsonify({
             'success': True,
@@ -1631,6 +2023,7 @@ def cancel_appointment(appointment_id):
             SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
         ''', (appointment_id,))
+        reminders.disarm(db, appointment_id)
 
         # Log the cancellation
         if request.is_json and request.json:
@@ -1644,8 +2037,11 @@ def cancel_appointment(appointment_id):
             'job_number': appointment['job_number'],
             'reason': reason
         })))
+        queue_customer_sms(db, session['customer_id'], f"Your {appointment['type']} appointment (Job #{appointment['job_number']}) for {appointment['start_time']} has been cancelled. Call 1-800-ZEN-CABLE to reschedule.")
 
         db.commit()
+        sms_dispatcher.wake()
+        slot_engine.invalidate(appointment['start_time'][:10])
 
         # Get updated appointment
         updated_appointment = db.execute('''
@@ -1655,28 +2051,6 @@ def cancel_appointment(appointment_id):
             WHERE a.id = ?
         ''', (appointment_id,)).fetchone()
 
-        # Send SMS notification about cancellation
-        customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
-        if customer:
-            try:
-                compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                appointment_time = updated_appointment['start_time']
-                message = f"Your {updated_appointment['type']} appointment (Job #{updated_appointment['job_number']}) for {appointment_time} has been cancelled. Call 1-800-ZEN-CABLE to reschedule."
-                payload = {
-                    "From": FROM_NUMBER,
-                    "To": customer['phone'],
-                    "Body": message
-                }
-                response = requests.post(
-                    compat_url,
-                    data=payload,
-                    auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
-                )
-                response.raise_for_status()
-            except Exception as e:
-                app.logger.error(f"Error sending cancel appointment SMS: {str(e)}")
-
         return jsonify({
             'success': True,
             'appointment': dict(updated_appointment)
@@ -1717,51 +2091,42 @@ def reschedule_appointment(appointment_id):
         ''', (appointment_id, session['customer_id'])).fetchone()
         if not appointment:
             return jsonify({'error': 'Appointment not found'}), 404
-        # Set time slots
-        time_slots = {
-            'morning': ('08:00 AM', '11:00 AM'),
-            'afternoon': ('02:00 PM', '04:00 PM'),
-            'evening': ('06:00 PM', '08:00 PM'),
-            'all_day': ('08:00 AM', '08:00 PM')
-        }
-        start_time, end_time = time_slots[request.json['time_slot']]
-        # Check for slot conflict
-        slot_conflict = db.execute('''
-            SELECT * FROM appointments 
-            WHERE customer_id = ? AND id != ? AND date(start_time) = date(?)
-            AND (
-                (start_time <= ? AND end_time > ?) OR
-                (start_time < ? AND end_time >= ?) OR
-                (start_time >= ? AND end_time <= ?)
-            )
-        ''', (session['customer_id'], appointment_id, appointment_date,
-              f"{request.json['date']} {end_time}", f"{request.json['date']} {start_time}",
-              f"{request.json['date']} {end_time}", f"{request.json['date']} {start_time}",
-              f"{request.json['date']} {start_time}", f"{request.json['date']} {end_time}")).fetchone()
-        if slot_conflict:
+        # Reserve the new slot and move the appointment in one write transaction
+        try:
+            with slot_engine.reserve(db, session['customer_id'], request.json['date'], request.json['time_slot'],
+                                     exclude_id=appointment_id) as (slot_start, slot_end):
+                db.execute('''
+                    UPDATE appointments
+                    SET start_time = ?, end_time = ?, start_ts = ?, end_ts = ?, notes = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (
+                    format_appointment_time(slot_start),
+                    format_appointment_time(slot_end),
+                    to_epoch(slot_start),
+                    to_epoch(slot_end),
+                    request.json.get('notes', appointment['notes']),
+                    appointment_id
+                ))
+                # Log the reschedule
+                db.execute('''
+                    INSERT INTO appointment_history (appointment_id, action, details, created_at)
+                    VALUES (?, 'rescheduled', ?, CURRENT_TIMESTAMP)
+                ''', (appointment_id, json.dumps({
+                    'date': request.json['date'],
+                    'time_slot': request.json['time_slot'],
+                    'notes': request.json.get('notes', appointment['notes']),
+                    'job_number': appointment['job_number']
+                })))
+                # Re-arm reminders for the new time
+                reminder_due = None
+                if appointment['sms_reminder']:
+                    reminder_due = reminders.arm(db, appointment_id, to_epoch(slot_start))
+                queue_customer_sms(db, session['customer_id'], f"Your {appointment['type']} appointment (Job #{appointment['job_number']}) has been rescheduled to {format_appointment_time(slot_start)}. Call 1-800-ZEN-CABLE to reschedule.")
+        except (DuplicateBooking, SlotUnavailable):
             return jsonify({'error': f'The {request.json["time_slot"]} time slot is already booked'}), 400
-        # Update appointment
-        db.execute('''
-            UPDATE appointments 
-            SET start_time = ?, end_time = ?, notes = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (
-            f"{request.json['date']} {start_time}",
-            f"{request.json['date']} {end_time}",
-            request.json.get('notes', appointment['notes']),
-            appointment_id
-        ))
-        # Log the reschedule
-        db.execute('''
-            INSERT INTO appointment_history (appointment_id, action, details, created_at)
-            VALUES (?, 'rescheduled', ?, CURRENT_TIMESTAMP)
-        ''', (appointment_id, json.dumps({
-            'date': request.json['date'],
-            'time_slot': request.json['time_slot'],
-            'notes': request.json.get('notes', appointment['notes']),
-            'job_number': appointment['job_number']
-        })))
-        db.commit()
+        slot_engine.invalidate(appointment['start_time'][:10])
+        reminder_scheduler.notify(reminder_due)
+        sms_dispatcher.wake()
         # Get updated appointment
         updated_appointment = db.execute('''
             SELECT a.*, t.name as technician_name
@@ -1769,27 +2134,6 @@ def reschedule_appointment(appointment_id):
             LEFT JOIN technicians t ON a.technician_id = t.id
             WHERE a.id = ?
         ''', (appointment_id,)).fetchone()
-        # Send SMS notification about reschedule
-        customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
-        if customer:
-            try:
-                compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-                appointment_time = updated_appointment['start_time']
-                message = f"Your {updated_appointment['type']} appointment (Job #{updated_appointment['job_number']}) has been rescheduled to {appointment_time}. Call 1-800-ZEN-CABLE to reschedule."
-                payload = {
-                    "From": FROM_NUMBER,
-                    "To": customer['phone'],
-                    "Body": message
-                }
-                response = requests.post(
-                    compat_url,
-                    data=payload,
-                    auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
-                )
-                response.raise_for_status()
-            except Exception as e:
-                app.logger.error(f"Error sending reschedule appointment SMS: {str(e)}")
         return jsonify({
             'success': True,
             'appointment': dict(updated_appointment)
@@ -1807,25 +2151,16 @@ def test_sms():
         return jsonify({'error': 'SignalWire client not initialized'}), 503
     if 'customer_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    db = sqlite3.connect('zen_cable.db')
-    db.row_factory = sqlite3.Row
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    customer = lookup_customer(db, session['customer_id'])
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     try:
         # Use the Compatibility API endpoint
-        compat_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages.json"
-        payload = {
-            "From": FROM_NUMBER,
-            "To": customer['phone'],
-            "Body": "This is a test SMS from Zen Cable. Your phone number is working correctly!"
-        }
-        print(f"[Compat SMS] POST to {compat_url} with payload: {payload}")
-        response = requests.post(
-            compat_url,
-            data=payload,
-            auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        print(f"[Compat SMS] Sending test SMS to {customer['phone']}")
+        response = signalwire_api().send_sms(
+            customer['phone'], FROM_NUMBER,
+            "This is a test SMS from Zen Cable. Your phone number is working correctly!"
         )
         print(f"[Compat SMS] Response status: {response.status_code}")
         print(f"[Compat SMS] Response body: {response.text}")
@@ -1841,27 +2176,15 @@ def test_mfa():
         return jsonify({'error': 'SignalWire client not initialized'}), 503
     if 'customer_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    db = sqlite3.connect('zen_cable.db')
-    db.row_factory = sqlite3.Row
-    customer = db.execute('SELECT * FROM customers WHERE id = ?', (session['customer_id'],)).fetchone()
+    db = get_read_db()
+    customer = lookup_customer(db, session['customer_id'])
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     try:
-        mfa_url = f"https://{SIGNALWIRE_SPACE}.signalwire.com/api/relay/rest/mfa/sms"
-        payload = {
-            "to": customer['phone'],
-            "from": FROM_NUMBER,
-            "message": "Your Zen Cable MFA test code is: {{code}}. This code will expire in 5 minutes.",
-            "token_length": 6,
-            "max_attempts": 3,
-            "allow_alphas": False,
-            "valid_for": 300
-        }
-        response = requests.post(
-            mfa_url,
-            json=payload,
-            auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_TOKEN),
-            headers={"Content-Type": "application/json"}
+        response = signalwire_api().send_mfa(
+            customer['phone'], FROM_NUMBER,
+            "Your Zen Cable MFA test code is: {{code}}. This code will expire in 5 minutes.",
+            valid_for=300
         )
         response.raise_for_status()
         mfa_data = response.json()
@@ -1879,10 +2202,18 @@ def test_mfa():
 def not_found_error(error):
     return jsonify({'error': 'Not found'}), 404
 
+@app.errorhandler(passwords.PasswordPoolBusy)
+def password_pool_busy(error):
+    response = jsonify({'error': 'Too many password requests; try again shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
 @app.errorhandler(500)
 def internal_error(error):
-    db = get_db()
-    db.rollback()
+    db = g.get('db')
+    if db is not None:
+        db.rollback()
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
@@ -1890,4 +2221,6 @@ if __name__ == '__main__':
     with app.app_context():
         init_db_if_needed()
         initialize_signalwire()
+    if BACKGROUND_WORKERS:
+        start_background_workers()
     app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,292 @@
+"""In-process benchmarks for the portal's hot paths.
+
+Each run seeds a fresh temporary database per size, then times requests
+through the Flask test client and direct calls into app.py:
+
+    python benchmark.py --sizes 100,1000,10000 --repeat 5
+    python benchmark.py --filter swaig: --json results.json
+
+Nothing here talks to SignalWire: SMS is only queued in the outbox, whose
+dispatcher is not started.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import timeit
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+import db_util
+import passwords
+import ledger
+from migrations import migrate
+from scheduling import TIME_SLOTS, format_appointment_time, to_epoch
+
+BENCH_EMAIL = 'bench@example.com'
+BENCH_PASSWORD = 'password123'
+BENCH_USER, BENCH_TOKEN = 'bench', 'bench'
+SWAIG_AUTH = {'Authorization': 'Basic YmVuY2g6YmVuY2g='}
+
+
+def seed(db, customers, rng):
+    """Fill an empty, migrated database. Customer 1 is the benchmark login."""
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    db.executemany('INSERT INTO services (name, price, type) VALUES (?, ?, ?)', [
+        ('Basic Cable', 49.99, 'cable'), ('High-Speed Internet', 39.99, 'internet'),
+        ('Premium Channels', 19.99, 'cable'), ('Home Phone', 24.99, 'phone'),
+    ])
+    db.executemany('INSERT INTO technicians (name, phone, email) VALUES (?, ?, ?)',
+                   [(f'Tech {i}', f'+1555000{i:04d}', f'tech{i}@example.com') for i in range(1, 11)])
+    password_hash, salt = passwords.make_hash(BENCH_PASSWORD)
+    slots = list(TIME_SLOTS.items())
+    customer_rows, service_rows, modem_rows, billing_rows, payment_rows = [], [], [], [], []
+    appointment_rows = []
+    for cid in range(1, customers + 1):
+        email = BENCH_EMAIL if cid == 1 else f'customer{cid}@example.com'
+        customer_rows.append((cid, f'Customer {cid}', email, f'+1650{cid:07d}', f'{cid} Main St',
+                              password_hash, salt, 'Customer', str(cid)))
+        for service_id in rng.sample(range(1, 5), 2):
+            service_rows.append((cid, service_id))
+        modem_rows.append((cid, ':'.join(f'{b:02X}' for b in cid.to_bytes(6, 'big')), 'Netgear', 'CM1000'))
+        billing_rows.append((cid, round(rng.uniform(20, 200), 2), (now + timedelta(days=rng.randint(1, 30))).strftime('%Y-%m-%d')))
+        for _ in range(6):
+            paid = now - timedelta(days=rng.randint(1, 365))
+            payment_rows.append((cid, round(rng.uniform(20, 200), 2), paid.strftime('%Y-%m-%d %H:%M:%S'),
+                                 'credit_card', 'completed', '%032x' % rng.getrandbits(128)))
+        # The benchmark login has a long appointment list; everyone else a few
+        for i in range(40 if cid == 1 else 3):
+            day = now.date() + timedelta(days=rng.randint(-180, 60))
+            slot, (start, end) = rng.choice(slots)
+            start_dt = datetime.strptime(f'{day} {start}', '%Y-%m-%d %H:%M')
+            end_dt = datetime.strptime(f'{day} {end}', '%Y-%m-%d %H:%M')
+            status = 'scheduled' if start_dt > now else rng.choice(['completed', 'completed', 'cancelled'])
+            appointment_rows.append((cid, rng.randint(1, 10), rng.choice(['installation', 'repair', 'upgrade']),
+                                     status, format_appointment_time(start_dt), format_appointment_time(end_dt),
+                                     to_epoch(start_dt), to_epoch(end_dt), f'J{cid:07d}{i:03d}'))
+    db.executemany('''
+        INSERT INTO customers (id, name, email, phone, address, password_hash, password_salt, first_name, last_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', customer_rows)
+    db.executemany("INSERT INTO customer_services (customer_id, service_id, status) VALUES (?, ?, 'active')", service_rows)
+    db.executemany("INSERT INTO modems (customer_id, mac_address, make, model, status, last_seen) VALUES (?, ?, ?, ?, 'online', CURRENT_TIMESTAMP)", modem_rows)
+    db.executemany('INSERT INTO billing (customer_id, amount, due_date) VALUES (?, ?, ?)', billing_rows)
+    ledger.open_from_billing(db)
+    db.executemany('''
+        INSERT INTO payments (customer_id, amount, payment_date, payment_method, status, transaction_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', payment_rows)
+    db.executemany('''
+        INSERT INTO appointments (customer_id, technician_id, type, status, start_time, end_time, start_ts, end_ts, job_number)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', appointment_rows)
+    db.execute('''
+        INSERT INTO appointment_history (appointment_id, action, details)
+        SELECT id, 'created', '{}' FROM appointments
+    ''')
+    db.execute('''
+        INSERT INTO appointment_reminders (appointment_id, reminder_type, due_ts, status)
+        SELECT id, 'sms', start_ts - 86400, CASE WHEN status = 'scheduled' THEN 'pending' ELSE 'sent' END
+        FROM appointments
+    ''')
+    db.commit()
+
+
+def cycle(values):
+    """Endless iterator over values, for cases that must not repeat the same write."""
+    while True:
+        yield from values
+
+
+def build_cases(app_module, db):
+    """(name, callable) pairs; every callable does one operation."""
+    A = app_module
+    client = A.app.test_client()
+    response = client.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+    assert response.status_code == 302, 'benchmark login failed'
+    login_client = A.app.test_client()
+    bench = db.execute('SELECT password_hash, password_salt FROM customers WHERE id = 1').fetchone()
+    customers = [row[0] for row in db.execute('SELECT id FROM customers')]
+    scheduled = [(row[0], row[1]) for row in db.execute(
+        "SELECT id, customer_id FROM appointments WHERE status = 'scheduled' ORDER BY id")]
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    window = f"start={tomorrow - timedelta(days=300)}&end={tomorrow + timedelta(days=60)}&per_page=20"
+    future = [(str(tomorrow + timedelta(days=d)), slot) for d in range(60) for slot in TIME_SLOTS]
+    booking = cycle([(cid, date, slot) for date, slot in future for cid in customers[:50]])
+    rescheduling = cycle([(appt, cid, date, slot) for (appt, cid), (date, slot) in zip(scheduled, cycle(future))])
+    cancelling = cycle(scheduled)
+    swapping = cycle(customers)
+    paying = cycle(customers)
+
+    def in_context(fn):
+        def run():
+            with A.app.app_context():
+                return fn()
+        return run
+
+    def allocate_job_number():
+        db = A.get_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            return A.generate_job_number(db)
+        finally:
+            db.rollback()
+
+    def swaig(function, args):
+        def run():
+            arguments = args() if callable(args) else args
+            return client.post('/swaig', json={'function': function, 'argument': {'parsed': [arguments]}},
+                               headers=SWAIG_AUTH)
+        return run
+
+    def slot_usage():
+        A.slot_engine.invalidate()
+        return A.slot_engine.usage(A.get_read_db(), str(tomorrow))
+
+    def next_booking():
+        cid, date, slot = next(booking)
+        return {'customer_id': str(cid), 'type': 'repair', 'date': date, 'time_slot': slot}
+
+    def next_reschedule():
+        appointment_id, cid, date, slot = next(rescheduling)
+        return {'customer_id': str(cid), 'appointment_id': appointment_id, 'date': date, 'time_slot': slot}
+
+    def next_cancel():
+        appointment_id, cid = next(cancelling)
+        return {'customer_id': str(cid), 'appointment_id': appointment_id}
+
+    def next_swap():
+        cid = next(swapping)
+        return {'customer_id': str(cid), 'make': 'Arris', 'model': 'SB8200',
+                'mac_address': '%012X' % (0xA00000000000 + cid)}
+
+    return [
+        ('verify_password', lambda: passwords.verify_password(BENCH_PASSWORD, bench[0], bench[1])),
+        ('login', lambda: login_client.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})),
+        ('dashboard', lambda: client.get('/dashboard')),
+        ('get_appointments', lambda: client.get(f'/api/appointments?{window}')),
+        ('get_appointments+history+reminders',
+         lambda: client.get(f'/api/appointments?{window}&include_history=true&include_reminders=true')),
+        ('slot_usage (cold)', in_context(slot_usage)),
+        ('lookup_available_slots', in_context(lambda: A.lookup_available_slots(A.get_read_db(), 1))),
+        ('generate_job_number', in_context(allocate_job_number)),
+        ('process_payment', lambda: client.post('/api/payments', json={'amount': 1, 'payment_method': 'credit_card'})),
+        ('swaig:check_balance', swaig('check_balance', lambda: {'customer_id': str(next(paying))})),
+        ('swaig:make_payment', swaig('make_payment', lambda: {'customer_id': str(next(paying)), 'amount': 1})),
+        ('swaig:check_modem_status', swaig('check_modem_status', lambda: {'customer_id': str(next(paying))})),
+        ('swaig:reboot_modem', swaig('reboot_modem', lambda: {'customer_id': str(next(paying))})),
+        ('swaig:schedule_appointment', swaig('schedule_appointment', next_booking)),
+        ('swaig:reschedule_appointment', swaig('reschedule_appointment', next_reschedule)),
+        ('swaig:cancel_appointment', swaig('cancel_appointment', next_cancel)),
+        ('swaig:swap_modem', swaig('swap_modem', next_swap)),
+        ('swaig:check_existing_appointments', swaig('check_existing_appointments', {'customer_id': '1'})),
+        ('swaig:find_available_slots', swaig('find_available_slots', {'customer_id': '1'})),
+    ]
+
+
+def measure(fn, repeat, min_time):
+    """Per-call seconds for each of `repeat` runs, timeit-style (GC disabled)."""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    return number, [t / number for t in timer.repeat(repeat, number)]
+
+
+BENCH_ENV = {
+    'SIGNALWIRE_PROJECT_ID': 'bench',
+    'SIGNALWIRE_TOKEN': 'bench',
+    'SIGNALWIRE_SPACE': 'bench.invalid',
+    'HTTP_USERNAME': BENCH_USER,
+    'HTTP_PASSWORD': BENCH_TOKEN,
+    'FROM_NUMBER': '+15550000000',
+}
+
+
+def prepare_app(workdir):
+    """Import app.py from workdir with a throwaway .env, so SWAIG is set up on import."""
+    os.environ.update(BENCH_ENV)
+    with open(os.path.join(workdir, '.env'), 'w') as f:
+        f.writelines(f'{name}={value}\n' for name, value in BENCH_ENV.items())
+    os.chdir(workdir)
+    import app as A
+    assert A.swaig is not None, 'SWAIG was not initialized'
+    # Time the handlers themselves; the same few keys would soon be rate limited
+    A.rate_limiters.clear()
+    return A
+
+
+def reset_caches(A):
+    for entries in (A.customer_cache, A.services_cache, A.billing_cache, A.catalog_cache):
+        entries.clear()
+    A.slot_engine.invalidate()
+    A.slot_engine._capacity = None
+
+
+def run(sizes, repeat, min_time, name_filter=None, seed_value=1):
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='zen-bench-')
+    results = []
+    try:
+        A = prepare_app(workdir)
+        for size in sizes:
+            db_util.close_all()
+            os.environ['DATABASE_PATH'] = os.path.join(workdir, f'bench-{size}.db')
+            reset_caches(A)
+            with db_util.connection() as db:
+                migrate(db)
+                seed(db, size, random.Random(seed_value))
+                cases = build_cases(A, db)
+            print(f"\n{size} customers")
+            print(f"{'case':<40} {'loops':>7} {'min ms':>9} {'median ms':>10} {'mean ms':>9} {'stdev ms':>9}")
+            for name, fn in cases:
+                if name_filter and name_filter not in name:
+                    continue
+                status = getattr(fn(), 'status_code', 200)
+                if status >= 400:
+                    print(f"{name}: HTTP {status}, timing the error path")
+                number, timings = measure(fn, repeat, min_time)
+                row = {
+                    'size': size, 'case': name, 'loops': number,
+                    'min_ms': min(timings) * 1000,
+                    'median_ms': statistics.median(timings) * 1000,
+                    'mean_ms': statistics.mean(timings) * 1000,
+                    'stdev_ms': (statistics.stdev(timings) if len(timings) > 1 else 0.0) * 1000,
+                }
+                results.append(row)
+                print(f"{name:<40} {number:>7} {row['min_ms']:>9.3f} {row['median_ms']:>10.3f} "
+                      f"{row['mean_ms']:>9.3f} {row['stdev_ms']:>9.3f}")
+            db_util.close_all()
+            os.remove(os.environ['DATABASE_PATH'])
+    finally:
+        db_util.close_all()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the portal hot paths in-process.')
+    parser.add_argument('--sizes', default='100,1000,10000', help='comma-separated customer counts')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timed run')
+    parser.add_argument('--filter', help='only run cases whose name contains this')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the generated data')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    import logging
+    logging.disable(logging.WARNING)
+    results = run([int(s) for s in args.sizes.split(',')], args.repeat, args.min_time, args.filter, args.seed)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
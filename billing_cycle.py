@@ -0,0 +1,247 @@
+"""Monthly billing cycle: invoices every customer and marks unpaid bills overdue.
+
+    python billing_cycle.py --period 2026-11              # bill November, due the 15th
+    python billing_cycle.py --period 2026-11 --due-date 2026-11-20 --chunk-size 5000
+    python billing_cycle.py --overdue-only
+
+Charges are the sum of each customer's active services, computed in SQL a
+chunk of customers at a time. Every chunk writes its bills, their ledger
+charges and the run's progress in one short transaction, so portal writes
+interleave with the run and a crashed or interrupted run picks up after the
+last committed chunk when started again. A period is billed at most once.
+"""
+import sys
+import time
+import logging
+import argparse
+import calendar
+import threading
+from datetime import date, datetime, timedelta
+import db_util
+import ledger
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_DUE_DAYS = 14
+
+
+def parse_period(period):
+    """'2026-11' -> date(2026, 11, 1); ValueError otherwise."""
+    return datetime.strptime(period, '%Y-%m').date()
+
+
+def current_period(today=None):
+    return (today or date.today()).strftime('%Y-%m')
+
+
+def default_due_date(period, due_days=DEFAULT_DUE_DAYS):
+    return (parse_period(period) + timedelta(days=due_days)).isoformat()
+
+
+def start_run(db, period, due_date):
+    """The billing_runs row for period, created if needed; a resumed run keeps its due date."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('INSERT OR IGNORE INTO billing_runs (period, due_date) VALUES (?, ?)', (period, due_date))
+        run = db.execute('SELECT * FROM billing_runs WHERE period = ?', (period,)).fetchone()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return run
+
+
+def bill_chunk(db, period, due_date, after, chunk_size):
+    """Invoice the next chunk_size customers after id `after`.
+
+    Returns (last customer id, invoices, cents), or None when no customers
+    are left. The bills, their ledger charges and the run's cursor commit
+    together.
+    """
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        upto = db.execute('SELECT max(id) FROM (SELECT id FROM customers WHERE id > ? ORDER BY id LIMIT ?)',
+                          (after, chunk_size)).fetchone()[0]
+        if upto is None:
+            db.rollback()
+            return None
+        last_bill = db.execute('SELECT coalesce(max(id), 0) FROM billing').fetchone()[0]
+        db.execute('''
+            INSERT INTO billing (customer_id, amount, due_date, status, period)
+            SELECT cs.customer_id, sum(CAST(round(s.price * 100) AS INTEGER)) / 100.0, ?, 'pending', ?
+            FROM customer_services cs JOIN services s ON s.id = cs.service_id
+            WHERE cs.status = 'active' AND cs.customer_id > ? AND cs.customer_id <= ?
+            GROUP BY cs.customer_id
+            ON CONFLICT DO NOTHING
+        ''', (due_date, period, after, upto))
+        # Bills are append-only here, so everything past last_bill is this chunk's
+        db.execute('''
+            INSERT INTO ledger_entries (customer_id, kind, amount_cents, due_date, billing_id, memo)
+            SELECT customer_id, ?, CAST(round(amount * 100) AS INTEGER), due_date, id, ?
+            FROM billing WHERE id > ? AND period = ?
+        ''', (ledger.CHARGE, f'Services {period}', last_bill, period))
+        invoices, cents = db.execute('''
+            SELECT count(*), coalesce(sum(CAST(round(amount * 100) AS INTEGER)), 0)
+            FROM billing WHERE id > ? AND period = ?
+        ''', (last_bill, period)).fetchone()
+        db.execute('''
+            UPDATE billing_runs SET cursor = ?, invoices = invoices + ?, amount_cents = amount_cents + ?
+            WHERE period = ?
+        ''', (upto, invoices, cents, period))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return upto, invoices, cents
+
+
+def finish_run(db, period):
+    db.execute("UPDATE billing_runs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE period = ?", (period,))
+    db.commit()
+
+
+def run_cycle(db, period, due_date=None, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.0, log=logging.info):
+    """Bill period from where any earlier attempt stopped; returns the run's totals."""
+    run = start_run(db, period, due_date or default_due_date(period))
+    if run['status'] == 'done':
+        log(f"Billing period {period} was already completed")
+        return dict(run)
+    if due_date and due_date != run['due_date']:
+        log(f"Resuming {period} with its original due date {run['due_date']}")
+    if run['cursor']:
+        log(f"Resuming {period} after customer {run['cursor']}")
+    after, due_date = run['cursor'], run['due_date']
+    started = last_report = time.monotonic()
+    customers = invoices = 0
+    while True:
+        result = bill_chunk(db, period, due_date, after, chunk_size)
+        if result is None:
+            break
+        upto, chunk_invoices, _ = result
+        customers += db.execute('SELECT count(*) FROM customers WHERE id > ? AND id <= ?', (after, upto)).fetchone()[0]
+        invoices += chunk_invoices
+        after = upto
+        now = time.monotonic()
+        if now - last_report >= 5:
+            log(f"{period}: {customers} customers, {invoices} invoices, "
+                f"{customers / (now - started):.0f} customers/s")
+            last_report = now
+        if pause:
+            time.sleep(pause)
+    finish_run(db, period)
+    elapsed = time.monotonic() - started
+    run = dict(db.execute('SELECT * FROM billing_runs WHERE period = ?', (period,)).fetchone())
+    run.update(customers_this_pass=customers, invoices_this_pass=invoices, seconds=elapsed,
+               customers_per_second=customers / elapsed if elapsed else 0.0)
+    log(f"{period}: billed {invoices} invoices for {customers} customers in {elapsed:.1f}s "
+        f"({run['customers_per_second']:.0f} customers/s); period total {run['invoices']} invoices, "
+        f"${run['amount_cents'] / 100:,.2f}")
+    return run
+
+
+def mark_overdue(db, today=None, chunk_size=DEFAULT_CHUNK_SIZE, log=logging.info):
+    """Move pending bills past their due date to 'overdue', a chunk per transaction."""
+    today = (today or date.today()).isoformat()
+    total = 0
+    while True:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute('''
+                UPDATE billing SET status = 'overdue'
+                WHERE id IN (SELECT id FROM billing WHERE status = 'pending' AND due_date < ? LIMIT ?)
+            ''', (today, chunk_size))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        total += cursor.rowcount
+        if cursor.rowcount < chunk_size:
+            break
+    log(f"Marked {total} bills overdue")
+    return total
+
+
+class BillingScheduler:
+    """Background worker that bills the current month once its cycle day arrives.
+
+    Checks every `interval` seconds. Overdue marking runs on every check;
+    billing a period that is already done is a no-op.
+    """
+
+    def __init__(self, cycle_day, due_days=DEFAULT_DUE_DAYS, chunk_size=DEFAULT_CHUNK_SIZE,
+                 interval=3600, on_change=None):
+        if not 1 <= cycle_day <= 31:
+            raise ValueError(f"Billing cycle day must be 1-31, got {cycle_day}")
+        self.cycle_day = cycle_day
+        self.due_days = due_days
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.on_change = on_change
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='billing-cycle', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def billing_day(self, today):
+        """The cycle day in today's month; a day past the month's end bills on its last day."""
+        return min(self.cycle_day, calendar.monthrange(today.year, today.month)[1])
+
+    def run_once(self, today=None):
+        today = today or date.today()
+        with db_util.connection() as db:
+            if today.day >= self.billing_day(today):
+                period = current_period(today)
+                run_cycle(db, period, default_due_date(period, self.due_days), self.chunk_size)
+            mark_overdue(db, today, self.chunk_size)
+        if self.on_change:
+            self.on_change()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("Billing cycle failed")
+            self._wake.wait(self.interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the billing cycle for one period.')
+    parser.add_argument('--period', default=current_period(), help='month to bill, YYYY-MM (default this month)')
+    parser.add_argument('--due-date', help=f'YYYY-MM-DD (default {DEFAULT_DUE_DAYS} days into the period)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='customers per transaction')
+    parser.add_argument('--pause-ms', type=float, default=0, help='sleep between chunks to favour portal writes')
+    parser.add_argument('--as-of', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='date overdue bills are judged against (default today)')
+    parser.add_argument('--skip-overdue', action='store_true', help='only write invoices')
+    parser.add_argument('--overdue-only', action='store_true', help='only mark overdue bills')
+    opts = parser.parse_args(argv)
+    try:
+        parse_period(opts.period)
+        if opts.due_date:
+            datetime.strptime(opts.due_date, '%Y-%m-%d')
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    with db_util.connection() as db:
+        if not opts.overdue_only:
+            run_cycle(db, opts.period, opts.due_date, opts.chunk_size, opts.pause_ms / 1000)
+        if not opts.skip_overdue:
+            mark_overdue(db, opts.as_of, opts.chunk_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
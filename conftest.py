@@ -0,0 +1,66 @@
+import os
+import itertools
+import pytest
+import db_util
+
+# A manual script that drives a running server (see run_test.bat)
+collect_ignore = ['test_swaig.py']
+
+TEST_ENV = {
+    'SIGNALWIRE_PROJECT_ID': 'test-project',
+    'SIGNALWIRE_TOKEN': 'test-token',
+    'SIGNALWIRE_SPACE': 'example',
+    'HTTP_USERNAME': 'swaig',
+    'HTTP_PASSWORD': 'secret',
+    'FROM_NUMBER': '+15550000000',
+}
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """app imported against a fresh test database, with SWAIG enabled."""
+    workdir = tmp_path_factory.mktemp('zen')
+    # initialize_signalwire() only runs when a .env exists in the working directory
+    (workdir / '.env').write_text(''.join(f'{k}={v}\n' for k, v in TEST_ENV.items()))
+    os.environ.update(TEST_ENV)
+    os.environ['DATABASE_PATH'] = str(workdir / 'zen_cable.db')
+    # Tests drive the schedulers and senders directly
+    os.environ['BACKGROUND_WORKERS'] = '0'
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app
+        with app.app.app_context():
+            app.init_db_if_needed()
+    finally:
+        os.chdir(cwd)
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    for limiter in app_module.rate_limiters.values():
+        if limiter is not None:
+            limiter.reset()
+    return app_module.app.test_client()
+
+
+_customer_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def make_customer(app_module):
+    """Insert a customer of the test's own, with a modem when mac is given; returns its id."""
+    def make(mac=None):
+        n = next(_customer_numbers)
+        with db_util.connection() as db:
+            customer_id = db.execute('''
+                INSERT INTO customers (name, email, phone, password_hash, password_salt) VALUES (?, ?, ?, 'x', 'x')
+            ''', (f'Fixture {n}', f'fixture-{n}@example.com', f'+1555030{n:04d}')).lastrowid
+            if mac:
+                db.execute("INSERT INTO modems (customer_id, mac_address, status) VALUES (?, ?, 'online')",
+                           (customer_id, mac))
+            db.commit()
+        return customer_id
+    return make
@@ -0,0 +1,178 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+import metrics
+
+# Connection tuning. Each value can be overridden from the environment as
+# SQLITE_<NAME> (e.g. SQLITE_CACHE_SIZE) before the first connection is opened.
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,        # ~20 MB page cache per connection
+    'mmap_size': 268435456,      # 256 MB memory-mapped I/O
+    'busy_timeout': 5000,        # ms to wait on a locked database
+    'temp_store': 'MEMORY',
+}
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() releases state instead of the handle.
+
+    Handlers still call db.close() once they are done; for a pooled
+    connection that only discards uncommitted work so the handle can be
+    reused by the next request.
+    """
+
+    pool = None
+
+    # Statement time is charged to the instrumented call (see metrics.py)
+    # running on this thread, if there is one.
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            metrics.add_time('db', time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            metrics.add_time('db', time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            metrics.add_time('db', time.perf_counter() - start)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path, readonly=False, max_idle=8, pragmas=None):
+        self.path = path
+        self.readonly = readonly
+        self.pragmas = dict(pragmas or DEFAULT_PRAGMAS)
+        self.closed = False
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True,
+                                   factory=PooledConnection, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if self.closed:
+            conn.dispose()
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.dispose()
+        except sqlite3.Error as e:
+            logging.warning(f"Dropping broken pooled connection: {e}")
+            conn.dispose()
+
+    def close_all(self):
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().dispose()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def database_path():
+    return os.getenv('DATABASE_PATH', 'zen_cable.db')
+
+
+def _pragmas_from_env():
+    pragmas = dict(DEFAULT_PRAGMAS)
+    for name in pragmas:
+        value = os.getenv(f'SQLITE_{name.upper()}')
+        if value:
+            pragmas[name] = value
+    return pragmas
+
+
+def _create_pool(readonly):
+    pool = ConnectionPool(
+        database_path(),
+        readonly=readonly,
+        max_idle=int(os.getenv('DB_POOL_SIZE', 8)),
+        pragmas=_pragmas_from_env()
+    )
+    if not readonly:
+        # Opening one writer up front switches the file to WAL before any
+        # read-only connection (which cannot change the journal mode) attaches.
+        pool.release(pool.acquire())
+    return pool
+
+
+def get_pool(readonly=False):
+    pool = _pools.get(readonly)
+    if pool is None:
+        with _pools_lock:
+            if False not in _pools:
+                _pools[False] = _create_pool(False)
+            if readonly not in _pools:
+                _pools[readonly] = _create_pool(readonly)
+            pool = _pools[readonly]
+    return pool
+
+
+def acquire(readonly=False):
+    return get_pool(readonly).acquire()
+
+
+def release(conn):
+    conn.pool.release(conn)
+
+
+@contextmanager
+def connection(readonly=False):
+    """Borrow a pooled connection for code running outside a request."""
+    conn = acquire(readonly)
+    try:
+        yield conn
+    finally:
+        release(conn)
+
+
+def close_all():
+    """Dispose of every pooled connection, e.g. after the file was replaced."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
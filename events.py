@@ -0,0 +1,76 @@
+import json
+import queue
+import threading
+
+# Server-Sent Events fan-out for per-customer dashboard updates.
+
+
+class Subscription:
+    """Bounded queue of (event, data) pairs for one open stream."""
+
+    def __init__(self, customer_id, maxsize=32):
+        self.customer_id = str(customer_id)
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        # Events are state snapshots, so a slow reader only needs the newest
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """In-process publish/subscribe keyed by customer id (as a string, since
+    SWAIG passes ids as text and the session holds integers).
+
+    Only streams served by the same process see a publish; the stream
+    endpoint re-reads state on its heartbeat so other workers' writes still
+    arrive, just later.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, customer_id):
+        sub = Subscription(customer_id)
+        with self._lock:
+            self._subscribers.setdefault(sub.customer_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.customer_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.customer_id]
+
+    def publish(self, customer_id, event, data):
+        with self._lock:
+            subs = list(self._subscribers.get(str(customer_id), ()))
+        for sub in subs:
+            sub.put((event, data))
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+broker = EventBroker()
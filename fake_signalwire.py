@@ -0,0 +1,263 @@
+"""Local stand-in for the SignalWire REST APIs the portal calls.
+
+Serves MFA (/api/relay/rest/mfa/...) and the LaML Messages and Calls
+endpoints with injectable latency, errors, hangs and rate limiting, so load
+tests and failure drills never touch the real space:
+
+    python fake_signalwire.py --port 9000 --latency-ms 120 --error-rate 0.02
+    SIGNALWIRE_BASE_URL=http://127.0.0.1:9000 python app.py
+
+Nothing is delivered. Sent messages, calls and MFA codes are kept in memory
+and can be read back from /_fake/messages, /_fake/calls and /_fake/mfa/<id>;
+/_fake/stats counts outcomes and POST /_fake/config changes the fault
+settings of a running server.
+"""
+import sys
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from collections import Counter, deque
+from flask import Flask, request, jsonify
+
+DEFAULTS = {
+    'latency_ms': 0.0,          # median of a lognormal latency
+    'latency_sigma': 0.5,       # spread of the lognormal; 0 = fixed latency
+    'slow_rate': 0.0,           # share of requests that take slow_ms instead
+    'slow_ms': 5000.0,
+    'error_rate': 0.0,          # share answered with one of error_codes
+    'error_codes': (500, 503),
+    'hang_rate': 0.0,           # share held for hang_seconds, then dropped with a 504
+    'hang_seconds': 30.0,
+    'rate_limit': 0.0,          # requests per second; 0 = unlimited
+    'burst': 10,
+    'mfa_valid_for': None,      # override the valid_for the client asks for
+    'keep': 1000,               # messages and calls kept for inspection
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """0 if a request may proceed, else seconds until one may."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class FakeState:
+    def __init__(self, config, seed=None):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.mfa = {}
+        self.configure(config)
+        self.messages = deque(maxlen=self.config['keep'])
+        self.calls = deque(maxlen=self.config['keep'])
+
+    def configure(self, config):
+        with self.lock:
+            self.config = dict(DEFAULTS, **{k: v for k, v in config.items() if v is not None})
+            self.config['error_codes'] = tuple(int(c) for c in self.config['error_codes'])
+            rate = float(self.config['rate_limit'])
+            self.bucket = TokenBucket(rate, max(1, int(self.config['burst']))) if rate > 0 else None
+
+    def draw(self):
+        """Decide this request's fate up front: (delay, status or None)."""
+        with self.lock:
+            c, rng = self.config, self.rng
+            roll = rng.random()
+            if roll < c['hang_rate']:
+                return c['hang_seconds'], 504
+            roll -= c['hang_rate']
+            status = rng.choice(c['error_codes']) if roll < c['error_rate'] else None
+            if rng.random() < c['slow_rate']:
+                delay = c['slow_ms'] / 1000
+            elif c['latency_ms'] > 0:
+                delay = c['latency_ms'] / 1000 * math.exp(rng.gauss(0, c['latency_sigma']))
+            else:
+                delay = 0.0
+            return delay, status
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def create_app(config=None, seed=None, project_id=None, token=None):
+    """The fake as a Flask app; checks basic auth only if project_id and token are given."""
+    app = Flask(__name__)
+    state = app.config['FAKE_STATE'] = FakeState(config or {}, seed)
+
+    def fail(status, message, **headers):
+        response = jsonify({"code": str(status), "message": message, "status": status})
+        response.status_code = status
+        response.headers.update(headers)
+        return response
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith('/_fake/'):
+            return None
+        if project_id and token:
+            auth = request.authorization
+            if not auth or auth.username != project_id or auth.password != token:
+                return fail(401, 'Unauthorized')
+        bucket = state.bucket
+        wait = bucket.take() if bucket else 0
+        if wait:
+            return fail(429, 'Too Many Requests', **{'Retry-After': str(max(1, math.ceil(wait)))})
+        delay, status = state.draw()
+        if delay:
+            time.sleep(delay)
+        if status:
+            return fail(status, 'Injected failure')
+        return None
+
+    @app.after_request
+    def count_response(response):
+        if not request.path.startswith('/_fake/'):
+            state.count((request.endpoint or 'unknown', response.status_code))
+        return response
+
+    @app.route('/api/relay/rest/mfa/<channel>', methods=['POST'])
+    def mfa_send(channel):
+        if channel not in ('sms', 'call'):
+            return fail(404, 'Not Found')
+        body = request.get_json(silent=True) or {}
+        if not body.get('to') or not body.get('from'):
+            return fail(400, "'to' and 'from' are required")
+        length = int(body.get('token_length', 6))
+        valid_for = state.config['mfa_valid_for'] or int(body.get('valid_for', 3600))
+        with state.lock:
+            code = ''.join(state.rng.choice('0123456789') for _ in range(length))
+        mfa_id = str(uuid.uuid4())
+        state.mfa[mfa_id] = {
+            'id': mfa_id, 'channel': channel, 'to': body['to'], 'from': body['from'],
+            'message': body.get('message', '').replace('{{code}}', code), 'code': code,
+            'attempts_left': int(body.get('max_attempts', 3)),
+            'expires': time.time() + valid_for,
+        }
+        return jsonify({"id": mfa_id, "success": True, "to": body['to'], "channel": channel})
+
+    @app.route('/api/relay/rest/mfa/<mfa_id>/verify', methods=['POST'])
+    def mfa_verify(mfa_id):
+        entry = state.mfa.get(mfa_id)
+        if entry is None or entry['expires'] < time.time():
+            state.mfa.pop(mfa_id, None)
+            return fail(404, 'Not Found')
+        supplied = str((request.get_json(silent=True) or {}).get('token', ''))
+        with state.lock:
+            if entry['attempts_left'] <= 0:
+                return jsonify({"success": False})
+            if supplied == entry['code']:
+                state.mfa.pop(mfa_id, None)
+                return jsonify({"success": True})
+            entry['attempts_left'] -= 1
+        return jsonify({"success": False})
+
+    def laml_resource(kind, store, required):
+        missing = [field for field in required if not request.form.get(field)]
+        if missing:
+            return fail(400, f"Missing required parameter(s): {', '.join(missing)}")
+        sid = f"{kind}{uuid.uuid4().hex}"
+        record = dict(request.form, sid=sid, status='queued',
+                      date_created=time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime()))
+        store.append(record)
+        response = jsonify({
+            "sid": sid, "status": "queued", "to": record['To'], "from": record['From'],
+            "date_created": record['date_created'], "account_sid": request.view_args['project'],
+        })
+        response.status_code = 201
+        return response
+
+    @app.route('/api/laml/2010-04-01/Accounts/<project>/Messages.json', methods=['POST'])
+    def messages(project):
+        return laml_resource('SM', state.messages, ('To', 'From', 'Body'))
+
+    @app.route('/api/laml/2010-04-01/Accounts/<project>/Calls.json', methods=['POST'])
+    def calls(project):
+        return laml_resource('CA', state.calls, ('To', 'From', 'Url'))
+
+    @app.route('/_fake/messages')
+    def fake_messages():
+        return jsonify(list(state.messages))
+
+    @app.route('/_fake/calls')
+    def fake_calls():
+        return jsonify(list(state.calls))
+
+    @app.route('/_fake/mfa/<mfa_id>')
+    def fake_mfa(mfa_id):
+        entry = state.mfa.get(mfa_id)
+        return jsonify(entry) if entry else fail(404, 'Not Found')
+
+    @app.route('/_fake/stats')
+    def fake_stats():
+        with state.lock:
+            counts = {f"{operation} {status}": n for (operation, status), n in sorted(state.stats.items())}
+        return jsonify({'config': state.config, 'responses': counts, 'pending_mfa': len(state.mfa)})
+
+    @app.route('/_fake/config', methods=['POST'])
+    def fake_config():
+        state.configure(dict(state.config, **(request.get_json(silent=True) or {})))
+        return jsonify(state.config)
+
+    @app.route('/_fake/reset', methods=['POST'])
+    def fake_reset():
+        with state.lock:
+            state.stats.clear()
+            state.mfa.clear()
+            state.messages.clear()
+            state.calls.clear()
+        return jsonify({'ok': True})
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a local SignalWire stand-in with fault injection.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--seed', type=int, help='make injected faults repeatable')
+    parser.add_argument('--project-id', help='require basic auth with this project id')
+    parser.add_argument('--token', help='and this token')
+    parser.add_argument('--latency-ms', type=float, help='median response latency')
+    parser.add_argument('--latency-sigma', type=float, help='lognormal spread (0 = fixed)')
+    parser.add_argument('--slow-rate', type=float, help='share of requests that take --slow-ms')
+    parser.add_argument('--slow-ms', type=float)
+    parser.add_argument('--error-rate', type=float, help='share answered with an error status')
+    parser.add_argument('--error-codes', type=lambda s: tuple(int(c) for c in s.split(',')),
+                        help='comma separated, default 500,503')
+    parser.add_argument('--hang-rate', type=float, help='share held for --hang-seconds then failed')
+    parser.add_argument('--hang-seconds', type=float)
+    parser.add_argument('--rate-limit', type=float, help='requests per second before 429s')
+    parser.add_argument('--burst', type=int, help='bucket size for --rate-limit')
+    parser.add_argument('--mfa-valid-for', type=int, help='override MFA code lifetime in seconds')
+    opts = vars(parser.parse_args(argv))
+    host, port, seed = opts.pop('host'), opts.pop('port'), opts.pop('seed')
+    project_id, token = opts.pop('project_id'), opts.pop('token')
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(opts, seed=seed, project_id=project_id, token=token)
+    print(f"Fake SignalWire on http://{host}:{port} (set SIGNALWIRE_BASE_URL to this)")
+    app.run(host=host, port=port, threaded=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
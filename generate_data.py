@@ -0,0 +1,312 @@
+"""Deterministic synthetic data for load testing.
+
+Builds a fresh, fully migrated database with production-like volumes:
+
+    python generate_data.py --customers 500000 --out load.db
+    python generate_data.py --customers 1000 --seed 7 --as-of 2025-01-01 --out small.db
+
+The same --seed and --as-of always produce the same rows. Customer 1 is
+test@example.com / password123, as in init_test_data.py, so the portal can
+be logged into. Every other customer shares that password.
+"""
+import os
+import sys
+import math
+import time
+import random
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+import job_numbers
+import ledger
+from migrations import migrate
+from scheduling import TIME_SLOTS, format_appointment_time, to_epoch
+
+# Only for the load: the file is rebuilt from scratch if anything fails
+BULK_PRAGMAS = {
+    'journal_mode': 'OFF',
+    'synchronous': 'OFF',
+    'locking_mode': 'EXCLUSIVE',
+    'cache_size': -262144,       # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+SERVICES = [
+    ('Basic Cable', 'Essential channels', 49.99, 'cable'),
+    ('Premium Cable', 'All channels plus sports', 89.99, 'cable'),
+    ('High-Speed Internet', '300 Mbps', 39.99, 'internet'),
+    ('Gigabit Internet', '1 Gbps', 79.99, 'internet'),
+    ('Home Phone', 'Unlimited local and long distance', 24.99, 'phone'),
+    ('Streaming Add-on', 'On-demand library', 9.99, 'cable'),
+]
+MODEMS = [('Motorola', 'MB8600'), ('Netgear', 'CM1000'), ('Arris', 'SB8200'), ('Technicolor', 'TC4400')]
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor']
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Elm St', 'Lake Blvd', 'Hill Ct']
+APPOINTMENT_TYPES = (['installation', 'repair', 'upgrade', 'modem_swap'], [2, 5, 2, 1])
+PAYMENT_METHODS = (['credit_card', 'debit_card', 'bank_transfer', 'phone'], [5, 2, 2, 1])
+PRIORITIES = (['low', 'medium', 'high', 'urgent'], [2, 6, 2, 1])
+TEST_EMAIL, TEST_PASSWORD = 'test@example.com', 'password123'
+
+
+def poisson(rng, mean):
+    """Poisson-distributed count (Knuth); means here are small."""
+    if mean <= 0:
+        return 0
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def pick(rng, choices):
+    values, weights = choices
+    return rng.choices(values, weights)[0]
+
+
+class BatchWriter:
+    """Buffers rows per INSERT statement and flushes them with executemany."""
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.rows = {}
+        self.counts = {}
+
+    def add(self, table, sql, row):
+        buffered = self.rows.setdefault((table, sql), [])
+        buffered.append(row)
+        if len(buffered) >= self.batch_size:
+            self._flush(table, sql)
+
+    def _flush(self, table, sql):
+        buffered = self.rows[(table, sql)]
+        if buffered:
+            self.db.executemany(sql, buffered)
+            self.counts[table] = self.counts.get(table, 0) + len(buffered)
+            buffered.clear()
+
+    def flush(self):
+        for table, sql in list(self.rows):
+            self._flush(table, sql)
+
+
+INSERT = {
+    'customers': '''INSERT INTO customers (id, name, email, phone, address, password_hash, password_salt,
+                    created_at, first_name, last_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+    'customer_services': '''INSERT INTO customer_services (customer_id, service_id, status, start_date)
+                            VALUES (?, ?, ?, ?)''',
+    'modems': '''INSERT INTO modems (customer_id, mac_address, make, model, status, last_seen, last_updated)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
+    'modem_history': '''INSERT INTO modem_history (customer_id, action, details, created_at) VALUES (?, ?, ?, ?)''',
+    'billing': 'INSERT INTO billing (customer_id, amount, due_date, status, created_at) VALUES (?, ?, ?, ?, ?)',
+    'payment_methods': 'INSERT INTO payment_methods (customer_id, type, details, created_at) VALUES (?, ?, ?, ?)',
+    'payments': '''INSERT INTO payments (customer_id, amount, payment_date, payment_method, status, transaction_id)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+    'appointments': '''INSERT INTO appointments (id, customer_id, technician_id, type, status, start_time, end_time,
+                       start_ts, end_ts, notes, priority, created_at, updated_at, sms_reminder, job_number)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+    'appointment_history': '''INSERT INTO appointment_history (appointment_id, action, details, created_at)
+                              VALUES (?, ?, ?, ?)''',
+    'appointment_reminders': '''INSERT INTO appointment_reminders (appointment_id, reminder_type, sent_at, status,
+                                due_ts) VALUES (?, ?, ?, ?, ?)''',
+}
+
+
+def _stamp(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_customer(w, rng, cid, as_of, opts, next_appointment_id, technicians, job_secret):
+    """Write one customer and everything hanging off it; returns the next free appointment id."""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    joined = as_of - timedelta(days=rng.randint(30, opts.history_days))
+    # Legacy salted SHA-256, which a KDF would make far too slow to generate;
+    # login upgrades it to the configured KDF
+    salt = '%032x' % rng.getrandbits(128)
+    password_hash = hashlib.sha256((TEST_PASSWORD + salt).encode()).hexdigest()
+    email = TEST_EMAIL if cid == 1 else f'{first.lower()}.{last.lower()}.{cid}@example.com'
+    w.add('customers', INSERT['customers'], (
+        cid, f'{first} {last}', email, f'+1{rng.randint(2002000000, 9899999999)}',
+        f'{rng.randint(1, 9999)} {rng.choice(STREETS)}', password_hash, salt, _stamp(joined), first, last))
+
+    for service_id in rng.sample(range(1, len(SERVICES) + 1), rng.randint(1, 3)):
+        status = 'active' if rng.random() < 0.9 else 'cancelled'
+        w.add('customer_services', INSERT['customer_services'], (cid, service_id, status, _stamp(joined)))
+
+    make, model = rng.choice(MODEMS)
+    status = 'online' if rng.random() < opts.online_ratio else rng.choice(['offline', 'initializing'])
+    mac = ':'.join(f'{b:02X}' for b in (0x02_00_00_00_00_00 + cid).to_bytes(6, 'big'))
+    w.add('modems', INSERT['modems'], (cid, mac, make, model, status,
+                                       _stamp(as_of - timedelta(seconds=rng.randint(0, 3600))), _stamp(joined)))
+    for _ in range(poisson(rng, 0.2)):
+        w.add('modem_history', INSERT['modem_history'], (
+            cid, 'swap', f'{{"make": "{make}", "model": "{model}"}}',
+            _stamp(joined + timedelta(days=rng.randint(0, (as_of - joined).days)))))
+
+    # One bill per month since joining, the latest one still open
+    months = min((as_of - joined).days // 30 + 1, opts.billing_months)
+    plan = round(rng.uniform(30, 220), 2)
+    for m in range(months - 1, -1, -1):
+        due = as_of + timedelta(days=15) - timedelta(days=30 * m)
+        status = 'pending' if m == 0 else ('paid' if rng.random() < 0.97 else 'overdue')
+        w.add('billing', INSERT['billing'], (cid, plan, due.strftime('%Y-%m-%d'), status,
+                                             _stamp(due - timedelta(days=20))))
+
+    w.add('payment_methods', INSERT['payment_methods'],
+          (cid, 'credit_card', f'Card ending in {rng.randint(1000, 9999)}', _stamp(joined)))
+    for _ in range(poisson(rng, opts.payments_per_customer)):
+        paid = joined + timedelta(seconds=rng.randint(0, int((as_of - joined).total_seconds())))
+        w.add('payments', INSERT['payments'], (
+            cid, round(plan * rng.choice([1, 1, 1, 0.5, 2]), 2), _stamp(paid), pick(rng, PAYMENT_METHODS),
+            'completed' if rng.random() < 0.98 else 'failed', '%032x' % rng.getrandbits(128)))
+
+    slots = list(TIME_SLOTS.values())
+    for _ in range(poisson(rng, opts.appointments_per_customer)):
+        appointment_id = next_appointment_id
+        next_appointment_id += 1
+        day = (as_of + timedelta(days=rng.randint(-opts.history_days, opts.future_days))).date()
+        start, end = rng.choice(slots)
+        start_dt = datetime.strptime(f'{day} {start}', '%Y-%m-%d %H:%M')
+        end_dt = datetime.strptime(f'{day} {end}', '%Y-%m-%d %H:%M')
+        if start_dt > as_of:
+            status = 'scheduled' if rng.random() < 0.9 else 'cancelled'
+        else:
+            status = 'completed' if rng.random() < 0.85 else 'cancelled'
+        created = min(start_dt - timedelta(days=rng.randint(1, 30)), as_of)
+        w.add('appointments', INSERT['appointments'], (
+            appointment_id, cid, rng.randint(1, technicians), pick(rng, APPOINTMENT_TYPES), status,
+            format_appointment_time(start_dt), format_appointment_time(end_dt), to_epoch(start_dt), to_epoch(end_dt),
+            None, pick(rng, PRIORITIES), _stamp(created), _stamp(created), 1,
+            job_numbers.job_number(job_secret, appointment_id - 1)))
+        w.add('appointment_history', INSERT['appointment_history'], (appointment_id, 'created', '{}', _stamp(created)))
+        for _ in range(poisson(rng, opts.history_per_appointment)):
+            w.add('appointment_history', INSERT['appointment_history'], (
+                appointment_id, rng.choice(['rescheduled', 'updated', 'note_added']), '{}',
+                _stamp(created + timedelta(hours=rng.randint(1, 240)))))
+        if status == 'cancelled':
+            w.add('appointment_history', INSERT['appointment_history'], (appointment_id, 'cancelled', '{}', _stamp(created)))
+        for reminder_type, offset in (('sms', 86400), ('call', 3600)):
+            due_ts = to_epoch(start_dt) - offset
+            if status == 'scheduled':
+                w.add('appointment_reminders', INSERT['appointment_reminders'],
+                      (appointment_id, reminder_type, None, 'pending', due_ts))
+            elif status == 'completed':
+                w.add('appointment_reminders', INSERT['appointment_reminders'],
+                      (appointment_id, reminder_type, _stamp(start_dt - timedelta(seconds=offset)), 'sent', due_ts))
+    return next_appointment_id
+
+
+def schema_objects(db):
+    """(type, name, sql) of the secondary indexes and triggers, to drop during the load."""
+    return db.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type = 'trigger'
+    ''').fetchall()
+
+
+def generate(path, opts, log=print):
+    db = sqlite3.connect(path, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    # Schema first, with normal settings, then switch to bulk-load mode
+    migrate(db)
+    for name, value in BULK_PRAGMAS.items():
+        db.execute(f'PRAGMA {name} = {value}')
+    deferred = schema_objects(db)
+    for kind, name, _ in deferred:
+        db.execute(f'DROP {kind.upper()} {name}')
+
+    rng = random.Random(opts.seed)
+    # Separate stream, so the allocator key does not shift the other data
+    job_secret = '%032x' % random.Random(f'job-numbers:{opts.seed}').getrandbits(128)
+    as_of = opts.as_of
+    db.execute('BEGIN')
+    db.executemany('INSERT INTO services (id, name, description, price, type) VALUES (?, ?, ?, ?, ?)',
+                   [(i, *service) for i, service in enumerate(SERVICES, 1)])
+    db.executemany('INSERT INTO technicians (id, name, phone, email, created_at) VALUES (?, ?, ?, ?, ?)', [
+        (i, f'Technician {i}', f'+1555{i:07d}', f'tech{i}@zencable.example', _stamp(as_of - timedelta(days=opts.history_days)))
+        for i in range(1, opts.technicians + 1)])
+    w = BatchWriter(db, opts.batch_size)
+    started = time.monotonic()
+    next_appointment_id = 1
+    for cid in range(1, opts.customers + 1):
+        next_appointment_id = generate_customer(w, rng, cid, as_of, opts, next_appointment_id, opts.technicians,
+                                                 job_secret)
+        if cid % opts.commit_every == 0:
+            w.flush()
+            db.execute('COMMIT')
+            db.execute('BEGIN')
+            log(f"{cid} customers, {time.monotonic() - started:.0f}s")
+    w.flush()
+    # The app carries on allocating job numbers after the generated ones
+    db.execute('UPDATE id_sequences SET next_value = ?, secret = ? WHERE name = ?',
+               (next_appointment_id - 1, job_secret, job_numbers.SEQUENCE))
+    db.execute('COMMIT')
+
+    log("Rebuilding indexes and triggers")
+    db.execute('BEGIN')
+    for kind, _, sql in deferred:
+        if kind == 'index':
+            db.execute(sql)
+    # What migration 10 does for existing bills, while the ledger triggers are
+    # still off, so it stays one set-wise pass with fixed timestamps
+    ledger.open_from_billing(db, _stamp(as_of))
+    for kind, _, sql in deferred:
+        if kind == 'trigger':
+            db.execute(sql)
+    # What migration 8 does for existing modems: history opens with the current status
+    db.execute('''
+        INSERT INTO modem_status_events (customer_id, status, ts)
+        SELECT customer_id, status, CAST(strftime('%s', last_seen) AS INTEGER) FROM modems
+    ''')
+    db.execute('COMMIT')
+    db.execute('ANALYZE')
+    db.execute('PRAGMA locking_mode = NORMAL')
+    db.execute('PRAGMA journal_mode = WAL')
+    db.close()
+    return w.counts, time.monotonic() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic Zen Cable database.')
+    parser.add_argument('--out', default='load_test.db', help='database file to create')
+    parser.add_argument('--force', action='store_true', help='replace --out if it exists')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--as-of', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help='the "current" date the data is generated around (default today)')
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--technicians', type=int, default=50)
+    parser.add_argument('--payments-per-customer', type=float, default=12, help='Poisson mean')
+    parser.add_argument('--appointments-per-customer', type=float, default=4, help='Poisson mean')
+    parser.add_argument('--history-per-appointment', type=float, default=1.5,
+                        help='Poisson mean of history rows beyond "created"')
+    parser.add_argument('--billing-months', type=int, default=24, help='most bills kept per customer')
+    parser.add_argument('--history-days', type=int, default=730, help='how far back data goes')
+    parser.add_argument('--future-days', type=int, default=60, help='how far ahead appointments are booked')
+    parser.add_argument('--online-ratio', type=float, default=0.95, help='share of modems online')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per executemany')
+    parser.add_argument('--commit-every', type=int, default=50000, help='customers per transaction')
+    opts = parser.parse_args(argv)
+
+    if os.path.exists(opts.out):
+        if not opts.force:
+            parser.error(f'{opts.out} exists; pass --force to replace it')
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(opts.out + suffix):
+                os.remove(opts.out + suffix)
+    counts, elapsed = generate(opts.out, opts)
+    for table, count in sorted(counts.items()):
+        print(f"{table:<24} {count:>12}")
+    size_mb = os.path.getsize(opts.out) / 1e6
+    print(f"Wrote {opts.out} ({size_mb:.0f} MB) in {elapsed:.0f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,14 @@
 import sqlite3
 from datetime import datetime, timedelta
-import hashlib
-import secrets
-import random
-
-def hash_password(password):
-    salt = secrets.token_hex(16)
-    hash_obj = hashlib.sha256((password + salt).encode())
-    return hash_obj.hexdigest(), salt
+import db_util
+import job_numbers
+import ledger
+import reminders
+from passwords import make_hash as hash_password
+from scheduling import format_appointment_time, to_epoch
 
 def init_test_data():
-    db = sqlite3.connect('zen_cable.db')
+    db = sqlite3.connect(db_util.database_path())
     cursor = db.cursor()
 
     # Add test services if not present
@@ -52,6 +50,12 @@ def init_test_data():
             cursor.execute('INSERT INTO customer_services (customer_id, service_id, status) VALUES (?, ?, ?)', (customer_id, service[0], 'active'))
     db.commit()
 
+    # init_db no longer wipes the database, so don't duplicate the sample rows on re-runs
+    if cursor.execute('SELECT 1 FROM modems WHERE customer_id = ?', (customer_id,)).fetchone():
+        db.close()
+        print("Test data already present")
+        return
+
     # Add a modem
     cursor.execute(
         '''
@@ -82,6 +86,8 @@ def init_test_data():
         VALUES (?, ?, ?, ?)
         ''', past_billing
     )
+    # The current bill opens the customer's ledger balance
+    ledger.open_from_billing(db)
 
     # Add payment methods
     payment_methods = [
@@ -118,19 +124,24 @@ def init_test_data():
     for desc, status, offset in [('installation', 'completed', -120),
                                  ('repair', 'scheduled', 7),
                                  ('upgrade', 'scheduled', 14)]:
-        start = (current_date + timedelta(days=offset)).strftime('%Y-%m-%d %H:00:00')
-        end = (current_date + timedelta(days=offset)).strftime('%Y-%m-%d %H:00:00')
-        job_number = str(random.randint(10000, 99999))  # Generate a unique 5-digit job number
+        start = (current_date + timedelta(days=offset)).replace(minute=0, second=0, microsecond=0)
+        end = start
+        job_number = job_numbers.allocate(cursor)
         appointments.append(
-            (customer_id, desc, status, start, end, f'{desc.capitalize()} service event', job_number)
+            (customer_id, desc, status, format_appointment_time(start), format_appointment_time(end),
+             to_epoch(start), to_epoch(end), f'{desc.capitalize()} service event', job_number)
         )
-    cursor.executemany(
-        '''
-        INSERT OR IGNORE INTO appointments 
-            (customer_id, type, status, start_time, end_time, notes, job_number)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', appointments
-    )
+    for appointment in appointments:
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO appointments
+                (customer_id, type, status, start_time, end_time, start_ts, end_ts, notes, job_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', appointment
+        )
+        # Booked appointments get their reminders, as the app arms them
+        if cursor.rowcount and appointment[2] == 'scheduled':
+            reminders.arm(cursor, cursor.lastrowid, appointment[5])
 
     # Add service history
     service_history = [
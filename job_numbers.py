@@ -0,0 +1,91 @@
+import hashlib
+from functools import lru_cache
+
+# Job numbers are DEFAULT_DIGITS long (no leading zero) unless configured
+DEFAULT_DIGITS = 8
+SEQUENCE = 'job_number'
+ROUNDS = 6
+_MASK64 = (1 << 64) - 1
+
+
+class JobNumbersExhausted(Exception):
+    pass
+
+
+@lru_cache(maxsize=8)
+def _round_keys(secret):
+    digest = hashlib.blake2b(secret.encode(), digest_size=8 * ROUNDS).digest()
+    return tuple(int.from_bytes(digest[i * 8:i * 8 + 8], 'big') for i in range(ROUNDS))
+
+
+def _round(key, value, mask):
+    # Any keyed mix works; the Feistel structure is what makes it a bijection
+    x = ((value ^ key) * 0x9E3779B97F4A7C15) & _MASK64
+    x ^= x >> 29
+    x = (x * 0xBF58476D1CE4E5B9) & _MASK64
+    return (x ^ (x >> 32)) & mask
+
+
+def permute(secret, index, size):
+    """Map index in [0, size) to a unique, scrambled value in [0, size).
+
+    A balanced Feistel network over the smallest even bit width that covers
+    size, keyed by secret; values that land outside the range are fed back
+    in (cycle walking) until one lands inside, which keeps it a bijection.
+    """
+    if not 0 <= index < size:
+        raise ValueError(f"index {index} outside [0, {size})")
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = _round_keys(secret)
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for key in keys:
+            left, right = right, left ^ _round(key, right, mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+def unpermute(secret, value, size):
+    """Inverse of permute: the index that permute maps to value."""
+    if not 0 <= value < size:
+        raise ValueError(f"value {value} outside [0, {size})")
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = _round_keys(secret)
+    index = value
+    while True:
+        left, right = index >> half, index & mask
+        for key in reversed(keys):
+            left, right = right ^ _round(key, left, mask), left
+        index = (left << half) | right
+        if index < size:
+            return index
+
+
+def job_number(secret, index, digits=DEFAULT_DIGITS):
+    """The index-th job number for this secret, as a string of `digits` digits."""
+    low = 10 ** (digits - 1)
+    return str(low + permute(secret, index, 9 * low))
+
+
+def allocate(db, digits=DEFAULT_DIGITS):
+    """Next unused job number; call inside the caller's write transaction.
+
+    The counter and the booking commit (or roll back) together, and the
+    write lock keeps concurrent workers from drawing the same index.
+    Numbers already taken, e.g. from before the allocator or from a
+    different digit setting, are skipped.
+    """
+    size = 9 * 10 ** (digits - 1)
+    while True:
+        db.execute('UPDATE id_sequences SET next_value = next_value + 1 WHERE name = ?', (SEQUENCE,))
+        index, secret = db.execute('SELECT next_value - 1, secret FROM id_sequences WHERE name = ?',
+                                   (SEQUENCE,)).fetchone()
+        if index >= size:
+            raise JobNumbersExhausted(f"All {size} {digits}-digit job numbers are used; raise JOB_NUMBER_DIGITS")
+        number = job_number(secret, index, digits)
+        if not db.execute('SELECT 1 FROM appointments WHERE job_number = ?', (number,)).fetchone():
+            return number
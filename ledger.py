@@ -0,0 +1,90 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Charges are positive and payments negative, so a customer's balance is
+# the sum of their entries. Kinds are free text; these are the ones written.
+CHARGE = 'charge'
+PAYMENT = 'payment'
+OPENING = 'opening'
+
+
+def to_cents(amount):
+    """Dollars (number or string) to integer cents, rounding half up; ValueError if not a finite amount."""
+    try:
+        cents = (Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f"Invalid amount {amount!r}")
+    if not cents.is_finite():
+        raise ValueError(f"Invalid amount {amount!r}")
+    return int(cents)
+
+
+def post(db, customer_id, kind, amount_cents, due_date=None, billing_id=None, payment_id=None, memo=None):
+    """Append one entry in the caller's transaction; the balance row moves with it."""
+    cursor = db.execute('''
+        INSERT INTO ledger_entries (customer_id, kind, amount_cents, due_date, billing_id, payment_id, memo)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (customer_id, kind, amount_cents, due_date, billing_id, payment_id, memo))
+    return cursor.lastrowid
+
+
+def record_payment(db, customer_id, amount_cents, payment_method, status, transaction_id):
+    """Insert the payments row and its ledger entry; settles bills once nothing is owed.
+
+    Recording a transaction_id the customer already has returns that payment
+    instead of posting it again, so a retried request is not paid twice.
+    """
+    existing = db.execute('SELECT id FROM payments WHERE transaction_id = ? AND customer_id = ?',
+                          (transaction_id, customer_id)).fetchone()
+    if existing:
+        return existing[0]
+    cursor = db.execute('''
+        INSERT INTO payments (customer_id, amount, payment_date, payment_method, status, transaction_id)
+        VALUES (?, ?, CURRENT_TIMESTAMP, ?, ?, ?)
+    ''', (customer_id, amount_cents / 100, payment_method, status, transaction_id))
+    post(db, customer_id, PAYMENT, -amount_cents, payment_id=cursor.lastrowid)
+    db.execute('''
+        UPDATE billing SET status = 'paid'
+        WHERE customer_id = ? AND status IN ('pending', 'overdue')
+        AND (SELECT balance_cents FROM account_balances WHERE customer_id = ?) <= 0
+    ''', (customer_id, customer_id))
+    return cursor.lastrowid
+
+
+def balance(db, customer_id, today=None):
+    """The customer's balance as the billing views use it, or None without any entries."""
+    row = db.execute('SELECT balance_cents, due_date FROM account_balances WHERE customer_id = ?',
+                     (customer_id,)).fetchone()
+    if row is None:
+        return None
+    cents, due_date = row[0], row[1]
+    if cents <= 0:
+        status = 'paid'
+    elif due_date and due_date < (today or date.today()).isoformat():
+        status = 'overdue'
+    else:
+        status = 'pending'
+    return {'amount': cents / 100, 'balance_cents': cents, 'due_date': due_date, 'status': status}
+
+
+def open_from_billing(db, created_at=None):
+    """Opening entries carrying each customer's latest bill, as balances were kept before the ledger.
+
+    Customers that already have a balance row are left alone. Works with or
+    without the balance trigger in place (a bulk load may drop it).
+    """
+    db.execute('''
+        INSERT INTO ledger_entries (customer_id, kind, amount_cents, due_date, billing_id, memo, created_at)
+        SELECT b.customer_id, ?, CAST(round(b.amount * 100) AS INTEGER), b.due_date, b.id,
+               'Opening balance', coalesce(?, CURRENT_TIMESTAMP)
+        FROM billing b
+        WHERE b.id = (SELECT id FROM billing WHERE customer_id = b.customer_id ORDER BY due_date DESC LIMIT 1)
+        AND NOT EXISTS (SELECT 1 FROM account_balances a WHERE a.customer_id = b.customer_id)
+        ORDER BY b.customer_id
+    ''', (OPENING, created_at))
+    db.execute('''
+        INSERT INTO account_balances (customer_id, balance_cents, due_date, last_entry_id, updated_at)
+        SELECT customer_id, sum(amount_cents), max(due_date), max(id), max(created_at)
+        FROM ledger_entries WHERE true GROUP BY customer_id
+        ON CONFLICT (customer_id) DO NOTHING
+    ''')
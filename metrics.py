@@ -0,0 +1,133 @@
+import time
+import bisect
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds; voice turns feel slow well before the last one
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Time is split into the whole call, time inside SQLite and time waiting on
+# external HTTP APIs.
+PHASES = ('total', 'db', 'http')
+
+_local = threading.local()
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+class FunctionMetrics:
+    """Latency histograms and call/error counters per instrumented function."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._calls = Counter()
+        self._errors = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, function, timings, error_type=None):
+        with self._lock:
+            for phase in PHASES:
+                histogram = self._histograms.get((function, phase))
+                if histogram is None:
+                    histogram = self._histograms[(function, phase)] = Histogram(len(self.buckets) + 1)
+                seconds = timings.get(phase, 0.0)
+                histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+                histogram.sum += seconds
+                histogram.count += 1
+            self._calls[(function, 'error' if error_type else 'ok')] += 1
+            if error_type:
+                self._errors[(function, error_type)] += 1
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            calls, errors = dict(self._calls), dict(self._errors)
+        lines = [
+            '# HELP swaig_function_duration_seconds SWAIG function latency by phase (total, db, http).',
+            '# TYPE swaig_function_duration_seconds histogram',
+        ]
+        for (function, phase), (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'swaig_function_duration_seconds_bucket'
+                             f'{_labels(function=function, phase=phase, le=bound)} {cumulative}')
+            lines.append(f'swaig_function_duration_seconds_sum{_labels(function=function, phase=phase)} {total}')
+            lines.append(f'swaig_function_duration_seconds_count{_labels(function=function, phase=phase)} {count}')
+        lines += [
+            '# HELP swaig_function_calls_total SWAIG function calls by outcome.',
+            '# TYPE swaig_function_calls_total counter',
+        ]
+        for (function, outcome), count in sorted(calls.items()):
+            lines.append(f'swaig_function_calls_total{_labels(function=function, outcome=outcome)} {count}')
+        lines += [
+            '# HELP swaig_function_errors_total SWAIG function errors by exception type.',
+            '# TYPE swaig_function_errors_total counter',
+        ]
+        for (function, error_type), count in sorted(errors.items()):
+            lines.append(f'swaig_function_errors_total{_labels(function=function, error_type=error_type)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = FunctionMetrics()
+
+
+def add_time(phase, seconds):
+    """Charge time to the instrumented call running on this thread, if any."""
+    span = getattr(_local, 'span', None)
+    if span is not None:
+        span[phase] = span.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, time.perf_counter() - start)
+
+
+def record_error(error):
+    """Count an exception the function handled itself (it still returns normally)."""
+    span = getattr(_local, 'span', None)
+    if span is not None:
+        span['error'] = type(error).__name__
+
+
+def instrument(func):
+    """Time every call of func and count its errors in `registry`."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(_local, 'span', None)
+        span = _local.span = {}
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            span['error'] = type(e).__name__
+            raise
+        finally:
+            span['total'] = time.perf_counter() - start
+            _local.span = outer
+            registry.observe(func.__name__, span, span.get('error'))
+    return wrapper
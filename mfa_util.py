@@ -2,6 +2,7 @@ import logging
 import requests
 import re
 from signalwire.rest import Client as SignalWireClient
+import signalwire_http
 
 class SignalWireMFA:
     def __init__(self, project_id: str, token: str, space: str, from_number: str):
@@ -11,7 +12,8 @@ class SignalWireMFA:
             self.token = token
             self.space = space
             self.from_number = from_number
-            self.base_url = f"https://{space}.signalwire.com/api/relay/rest"
+            self.http = signalwire_http.get_client(project_id, token, space)
+            self.base_url = self.http.relay_url
             logging.debug(f"Initialized SignalWireMFA with from_number: {self.from_number}")
         except Exception as e:
             logging.error(f"Failed to initialize SignalWire Client: {e}")
@@ -19,19 +21,8 @@ class SignalWireMFA:
 
     def send_mfa(self, to_number: str) -> dict:
         try:
-            url = f"{self.base_url}/mfa/sms"
-            payload = {
-                "to": to_number,
-                "from": self.from_number,
-                "message": "Here is your code: ",
-                "token_length": 6,
-                "max_attempts": 3,
-                "allow_alphas": False,
-                "valid_for": 3600
-            }
-            headers = {"Content-Type": "application/json"}
             logging.debug(f"Sending MFA from {self.from_number} to {to_number}")
-            response = requests.post(url, json=payload, auth=(self.project_id, self.token), headers=headers)
+            response = self.http.send_mfa(to_number, self.from_number, "Here is your code: ", valid_for=3600)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -40,11 +31,8 @@ class SignalWireMFA:
 
     def verify_mfa(self, mfa_id: str, token: str) -> dict:
         try:
-            verify_url = f"{self.base_url}/mfa/{mfa_id}/verify"
-            payload = {"token": token}
-            headers = {"Content-Type": "application/json"}
             logging.debug(f"Verifying MFA with ID {mfa_id} using token {token}")
-            response = requests.post(verify_url, json=payload, auth=(self.project_id, self.token), headers=headers)
+            response = self.http.verify_mfa(mfa_id, token)
             response.raise_for_status()
             return response.json()
         except requests.HTTPError as e:
@@ -0,0 +1,390 @@
+import os
+import sys
+import sqlite3
+import logging
+import secrets
+import db_util
+from scheduling import parse_appointment_time, format_appointment_time, to_epoch
+import reminders
+import outbox
+import status_history
+import job_numbers
+import ledger
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+
+def split_statements(script):
+    """Split a SQL script into complete statements (trigger bodies included)."""
+    statements, buf = [], ''
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                statements.append(buf.strip())
+            buf = ''
+    return statements
+
+
+def run_script(db, script):
+    # Unlike executescript(), this does not commit, so the script stays
+    # inside the migration's transaction.
+    for statement in split_statements(script):
+        db.execute(statement)
+
+
+def _baseline_schema(db):
+    with open(SCHEMA_FILE) as f:
+        run_script(db, f.read())
+
+
+def _appointment_epoch_columns(db):
+    db.execute('ALTER TABLE appointments ADD COLUMN start_ts INTEGER')
+    db.execute('ALTER TABLE appointments ADD COLUMN end_ts INTEGER')
+    # Rewrite legacy 12-hour strings as 24h ISO text and fill the epoch columns
+    rows = db.execute('SELECT id, start_time, end_time FROM appointments').fetchall()
+    updates = []
+    for appointment_id, start_time, end_time in rows:
+        try:
+            start = parse_appointment_time(start_time)
+            end = parse_appointment_time(end_time)
+        except (TypeError, ValueError):
+            logging.warning(f"Appointment {appointment_id} has an unparseable time; leaving start_ts empty")
+            continue
+        updates.append((format_appointment_time(start), format_appointment_time(end),
+                        to_epoch(start), to_epoch(end), appointment_id))
+    db.executemany('''
+        UPDATE appointments SET start_time = ?, end_time = ?, start_ts = ?, end_ts = ?
+        WHERE id = ?
+    ''', updates)
+    run_script(db, '''
+        DROP INDEX IF EXISTS idx_appointments_customer_start;
+        CREATE INDEX IF NOT EXISTS idx_appointments_customer_start_ts ON appointments (customer_id, start_ts);
+        CREATE INDEX IF NOT EXISTS idx_appointments_start_ts ON appointments (start_ts, end_ts);
+    ''')
+
+
+def _bump_version(resource, customer_id, when='1'):
+    return f'''
+        INSERT INTO data_versions (customer_id, resource, version)
+        SELECT {customer_id}, '{resource}', 1 WHERE {customer_id} IS NOT NULL AND {when}
+        ON CONFLICT (customer_id, resource) DO UPDATE SET version = version + 1;
+    '''
+
+
+def _data_versions(db):
+    # A per-customer counter for each polled resource, bumped by triggers so
+    # every writer (any process, any code path) invalidates cached ETags.
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            customer_id INTEGER NOT NULL,
+            resource TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (customer_id, resource)
+        ) WITHOUT ROWID
+    ''')
+    moved = 'OLD.customer_id IS NOT NEW.customer_id'
+    triggers = {
+        # modems: only the fields /api/modem/status returns, so last_seen
+        # heartbeats keep cached responses valid
+        ('modems_insert', 'AFTER INSERT ON modems'): _bump_version('modem', 'NEW.customer_id'),
+        ('modems_update', 'AFTER UPDATE OF customer_id, status, mac_address ON modems'):
+            _bump_version('modem', 'NEW.customer_id') + _bump_version('modem', 'OLD.customer_id', moved),
+        ('modems_delete', 'AFTER DELETE ON modems'): _bump_version('modem', 'OLD.customer_id'),
+        ('billing_insert', 'AFTER INSERT ON billing'): _bump_version('billing', 'NEW.customer_id'),
+        ('billing_update', 'AFTER UPDATE ON billing'):
+            _bump_version('billing', 'NEW.customer_id') + _bump_version('billing', 'OLD.customer_id', moved),
+        ('billing_delete', 'AFTER DELETE ON billing'): _bump_version('billing', 'OLD.customer_id'),
+        ('appointments_insert', 'AFTER INSERT ON appointments'): _bump_version('appointments', 'NEW.customer_id'),
+        ('appointments_update', 'AFTER UPDATE ON appointments'):
+            _bump_version('appointments', 'NEW.customer_id') + _bump_version('appointments', 'OLD.customer_id', moved),
+        ('appointments_delete', 'AFTER DELETE ON appointments'): _bump_version('appointments', 'OLD.customer_id'),
+        ('appointment_history_insert', 'AFTER INSERT ON appointment_history'):
+            _bump_version('appointments', '(SELECT customer_id FROM appointments WHERE id = NEW.appointment_id)'),
+        ('appointment_reminders_insert', 'AFTER INSERT ON appointment_reminders'):
+            _bump_version('appointments', '(SELECT customer_id FROM appointments WHERE id = NEW.appointment_id)'),
+        ('customers_update', 'AFTER UPDATE OF name, phone ON customers'): _bump_version('appointments', 'NEW.id'),
+    }
+    for (name, event), body in triggers.items():
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS trg_version_{name} {event} BEGIN {body} END')
+
+
+def _durable_reminders(db):
+    db.execute('ALTER TABLE appointment_reminders ADD COLUMN due_ts INTEGER')
+    db.execute('ALTER TABLE appointment_reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+    run_script(db, f'''
+        CREATE INDEX IF NOT EXISTS idx_appointment_reminders_due ON appointment_reminders (due_ts)
+        WHERE status IN {reminders.DUE_STATUSES};
+        CREATE TRIGGER IF NOT EXISTS trg_version_appointment_reminders_update
+        AFTER UPDATE OF status ON appointment_reminders
+        BEGIN {_bump_version('appointments', '(SELECT customer_id FROM appointments WHERE id = NEW.appointment_id)')} END;
+    ''')
+    # Reminders used to live only in process memory; arm the ones still ahead
+    now = reminders.now_ts()
+    rows = db.execute('''
+        SELECT id, start_ts FROM appointments
+        WHERE status = 'scheduled' AND sms_reminder AND start_ts > ?
+    ''', (now,)).fetchall()
+    db.executemany('''
+        INSERT INTO appointment_reminders (appointment_id, reminder_type, due_ts, sent_at, status)
+        VALUES (?, ?, ?, NULL, 'pending')
+    ''', [r for appointment_id, start_ts in rows for r in reminders.reminder_rows(appointment_id, start_ts, now)])
+
+
+def _modem_status_history(db):
+    run_script(db, '''
+        CREATE TABLE IF NOT EXISTS modem_status_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            status TEXT,
+            ts INTEGER NOT NULL,
+            ended_ts INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_modem_status_events_ts ON modem_status_events (ts);
+        CREATE INDEX IF NOT EXISTS idx_modem_status_events_ended ON modem_status_events (ended_ts);
+        CREATE INDEX IF NOT EXISTS idx_modem_status_events_open ON modem_status_events (customer_id)
+        WHERE ended_ts IS NULL;
+        CREATE TABLE IF NOT EXISTS modem_status_rollups (
+            resolution TEXT NOT NULL,
+            customer_id INTEGER NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            transitions INTEGER NOT NULL DEFAULT 0,
+            drops INTEGER NOT NULL DEFAULT 0,
+            reboots INTEGER NOT NULL DEFAULT 0,
+            offline_seconds INTEGER NOT NULL DEFAULT 0,
+            rebooting_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (resolution, customer_id, bucket_ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS modem_status_rollup_state (
+            resolution TEXT PRIMARY KEY,
+            rolled_until INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_modem_status_insert AFTER INSERT ON modems
+        BEGIN
+            INSERT INTO modem_status_events (customer_id, status, ts)
+            VALUES (NEW.customer_id, NEW.status, CAST(strftime('%s', 'now') AS INTEGER));
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_modem_status_transition AFTER UPDATE OF status ON modems
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE modem_status_events SET ended_ts = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE customer_id = NEW.customer_id AND ended_ts IS NULL;
+            INSERT INTO modem_status_events (customer_id, status, ts)
+            VALUES (NEW.customer_id, NEW.status, CAST(strftime('%s', 'now') AS INTEGER));
+        END;
+    ''')
+    # History starts now: every modem opens with its current status
+    db.execute('''
+        INSERT INTO modem_status_events (customer_id, status, ts)
+        SELECT customer_id, status, CAST(strftime('%s', 'now') AS INTEGER) FROM modems
+    ''')
+    now = db.execute("SELECT CAST(strftime('%s', 'now') AS INTEGER)").fetchone()[0]
+    db.executemany('INSERT INTO modem_status_rollup_state (resolution, rolled_until) VALUES (?, ?)',
+                   [(resolution, now - now % size) for resolution, size in status_history.RESOLUTIONS])
+
+
+def _id_sequences(db):
+    # One counter per allocator; the secret keys its permutation, so it must
+    # never change once numbers have been handed out
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL DEFAULT 0,
+            secret TEXT NOT NULL
+        )
+    ''')
+    db.execute('INSERT OR IGNORE INTO id_sequences (name, next_value, secret) VALUES (?, 0, ?)',
+               (job_numbers.SEQUENCE, secrets.token_hex(16)))
+
+
+def _billing_ledger(db):
+    # Balances move only by appending entries; the trigger keeps the
+    # per-customer running balance in the same statement as the insert
+    run_script(db, '''
+    CREATE TABLE IF NOT EXISTS ledger_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        due_date DATE,
+        billing_id INTEGER,
+        payment_id INTEGER,
+        memo TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers (id),
+        FOREIGN KEY (billing_id) REFERENCES billing (id),
+        FOREIGN KEY (payment_id) REFERENCES payments (id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_ledger_entries_customer ON ledger_entries (customer_id, id);
+    CREATE TABLE IF NOT EXISTS account_balances (
+        customer_id INTEGER PRIMARY KEY,
+        balance_cents INTEGER NOT NULL DEFAULT 0,
+        due_date DATE,
+        last_entry_id INTEGER,
+        updated_at TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers (id)
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_entries_no_update BEFORE UPDATE ON ledger_entries
+    BEGIN
+        SELECT RAISE(ABORT, 'ledger_entries is append-only; post a correcting entry');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_entries_no_delete BEFORE DELETE ON ledger_entries
+    BEGIN
+        SELECT RAISE(ABORT, 'ledger_entries is append-only; post a correcting entry');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_entries_balance AFTER INSERT ON ledger_entries
+    BEGIN
+        INSERT INTO account_balances (customer_id, balance_cents, due_date, last_entry_id, updated_at)
+        VALUES (NEW.customer_id, NEW.amount_cents, NEW.due_date, NEW.id, CURRENT_TIMESTAMP)
+        ON CONFLICT (customer_id) DO UPDATE SET
+            balance_cents = balance_cents + excluded.balance_cents,
+            due_date = CASE WHEN excluded.due_date > coalesce(due_date, '') THEN excluded.due_date ELSE due_date END,
+            last_entry_id = excluded.last_entry_id,
+            updated_at = excluded.updated_at;
+        INSERT INTO data_versions (customer_id, resource, version) VALUES (NEW.customer_id, 'billing', 1)
+        ON CONFLICT (customer_id, resource) DO UPDATE SET version = version + 1;
+    END;
+''')
+    ledger.open_from_billing(db)
+
+
+def _modem_version_changes(db):
+    # UPDATE OF still fires when a heartbeat rewrites the same status, so
+    # only bump the version when a returned field actually changed
+    changed = ('OLD.status IS NOT NEW.status OR OLD.mac_address IS NOT NEW.mac_address '
+               'OR OLD.customer_id IS NOT NEW.customer_id')
+    db.execute('DROP TRIGGER IF EXISTS trg_version_modems_update')
+    db.execute(f'''
+        CREATE TRIGGER trg_version_modems_update AFTER UPDATE OF customer_id, status, mac_address ON modems
+        WHEN {changed}
+        BEGIN {_bump_version('modem', 'NEW.customer_id')}
+        {_bump_version('modem', 'OLD.customer_id', 'OLD.customer_id IS NOT NEW.customer_id')} END
+    ''')
+
+
+# Ordered list of (version, name, step). A step is either a SQL script or a
+# callable taking the connection. Every step runs inside a single
+# transaction together with its schema_migrations row, so a failed step
+# leaves the database at the previous version. Never edit a shipped step;
+# append a new one instead.
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline_schema),
+    (2, 'hot-path indexes', '''
+        CREATE INDEX IF NOT EXISTS idx_appointments_customer_start ON appointments (customer_id, start_time);
+        CREATE INDEX IF NOT EXISTS idx_appointment_history_appointment ON appointment_history (appointment_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_appointment_reminders_appointment ON appointment_reminders (appointment_id, sent_at);
+        CREATE INDEX IF NOT EXISTS idx_billing_customer_due ON billing (customer_id, due_date, amount);
+        CREATE INDEX IF NOT EXISTS idx_payments_customer_date ON payments (customer_id, payment_date);
+        CREATE INDEX IF NOT EXISTS idx_payment_methods_customer ON payment_methods (customer_id);
+        CREATE INDEX IF NOT EXISTS idx_modems_customer ON modems (customer_id);
+        CREATE INDEX IF NOT EXISTS idx_modem_history_customer ON modem_history (customer_id);
+        CREATE INDEX IF NOT EXISTS idx_password_resets_customer ON password_resets (customer_id);
+    '''),
+    (3, 'appointment epoch columns', _appointment_epoch_columns),
+    (4, 'per-customer data versions', _data_versions),
+    (5, 'durable appointment reminders', _durable_reminders),
+    (6, 'sms outbox', f'''
+        CREATE TABLE IF NOT EXISTS sms_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            to_number TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_sms_outbox_due ON sms_outbox (next_attempt_ts)
+        WHERE status IN {outbox.DUE_STATUSES};
+    '''),
+    (7, 'modem mac lookup', '''
+        UPDATE modems SET mac_address = upper(replace(mac_address, '-', ':'));
+        CREATE INDEX IF NOT EXISTS idx_modems_mac ON modems (mac_address);
+    '''),
+    (8, 'modem status history', _modem_status_history),
+    (9, 'job number sequence', _id_sequences),
+    (10, 'billing ledger', _billing_ledger),
+    (11, 'billing cycle runs', '''
+        ALTER TABLE billing ADD COLUMN period TEXT;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_billing_customer_period ON billing (customer_id, period)
+        WHERE period IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_billing_pending_due ON billing (due_date) WHERE status = 'pending';
+        CREATE TABLE IF NOT EXISTS billing_runs (
+            period TEXT PRIMARY KEY,
+            due_date DATE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            cursor INTEGER NOT NULL DEFAULT 0,
+            invoices INTEGER NOT NULL DEFAULT 0,
+            amount_cents INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+    '''),
+    (12, 'modem versions on real changes', _modem_version_changes),
+    (13, 'payment transaction lookup', '''
+        CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id);
+    '''),
+]
+
+
+def _ensure_version_table(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
+
+
+def current_version(db):
+    _ensure_version_table(db)
+    return db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+
+
+def migrate(db, target=None):
+    """Apply pending migrations in order. Returns the list of versions applied."""
+    _ensure_version_table(db)
+    known = {row[0] for row in db.execute('SELECT version FROM schema_migrations')}
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        if version in known:
+            continue
+        # BEGIN IMMEDIATE takes the write lock, so concurrent workers starting
+        # up at the same time apply each step exactly once.
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            done = db.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone()
+            if done:
+                db.rollback()
+                continue
+            if callable(step):
+                step(db)
+            else:
+                run_script(db, step)
+            db.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            db.commit()
+        except Exception:
+            db.rollback()
+            logging.exception(f"Migration {version} ({name}) failed")
+            raise
+        logging.info(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    with db_util.connection() as db:
+        if '--status' in sys.argv:
+            version = current_version(db)
+            latest = MIGRATIONS[-1][0]
+            print(f"Database {db_util.database_path()} is at version {version} (latest {latest})")
+        else:
+            applied = migrate(db)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date")
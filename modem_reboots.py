@@ -0,0 +1,102 @@
+import time
+import heapq
+import logging
+import threading
+import db_util
+
+
+class RebootScheduler:
+    """Runs every in-flight modem reboot on one timer thread.
+
+    A reboot is a (due time, customer_id) entry in a min-heap; when it comes
+    due the modem moves from 'rebooting' to 'online'. All reboots that are
+    due together are flipped in one transaction, and a customer already
+    rebooting is not scheduled twice. Thread count stays at one no matter
+    how many reboots are in flight.
+    """
+
+    def __init__(self, duration=30, on_complete=None):
+        self.duration = duration
+        self.on_complete = on_complete
+        self._heap = []
+        self._due = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='modem-reboots', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def request(self, customer_id, due=None):
+        """Schedule a reboot to finish; False if one is already in flight."""
+        customer_id = int(customer_id)
+        with self._lock:
+            if customer_id in self._due:
+                return False
+            due = due or time.time() + self.duration
+            self._due[customer_id] = due
+            heapq.heappush(self._heap, (due, customer_id))
+        self.start()
+        self._wake.set()
+        return True
+
+    def in_flight(self, customer_id):
+        with self._lock:
+            return int(customer_id) in self._due
+
+    def recover(self, db):
+        """Re-schedule modems left 'rebooting' by a previous process."""
+        rows = db.execute('''
+            SELECT customer_id, CAST(strftime('%s', last_seen) AS INTEGER) FROM modems
+            WHERE status = 'rebooting'
+        ''').fetchall()
+        for customer_id, started in rows:
+            self.request(customer_id, due=(started or time.time()) + self.duration)
+        return len(rows)
+
+    def _pop_due(self, now):
+        finished = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, customer_id = heapq.heappop(self._heap)
+                del self._due[customer_id]
+                finished.append(customer_id)
+            timeout = self._heap[0][0] - now if self._heap else None
+        return finished, timeout
+
+    def _complete(self, customer_ids):
+        with db_util.connection() as db:
+            # Only modems still rebooting come back; anything set since wins
+            db.executemany('''
+                UPDATE modems SET status = 'online', last_seen = CURRENT_TIMESTAMP
+                WHERE customer_id = ? AND status = 'rebooting'
+            ''', [(customer_id,) for customer_id in customer_ids])
+            db.commit()
+            if self.on_complete:
+                self.on_complete(db, customer_ids)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            finished, timeout = self._pop_due(time.time())
+            if finished:
+                try:
+                    self._complete(finished)
+                except Exception:
+                    logging.exception(f"Failed to complete reboots for {len(finished)} modems; retrying")
+                    for customer_id in finished:
+                        self.request(customer_id, due=time.time() + 5)
+                continue
+            self._wake.wait(timeout)
@@ -0,0 +1,134 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import db_util
+
+# Messages still owed a delivery attempt. 'sending' rows are leased until
+# next_attempt_ts, after which they are claimed again (e.g. after a crash).
+# Kept as SQL text, since the partial due index only applies to a literal match.
+DUE_STATUSES = "('pending', 'sending')"
+
+
+def enqueue(db, to_number, body, customer_id=None):
+    """Queue an SMS inside the caller's transaction; nothing is sent until commit."""
+    db.execute('''
+        INSERT INTO sms_outbox (customer_id, to_number, body, status, attempts, next_attempt_ts)
+        VALUES (?, ?, ?, 'pending', 0, ?)
+    ''', (customer_id, to_number, body, int(time.time())))
+
+
+class OutboxDispatcher:
+    """Background sender for sms_outbox rows.
+
+    One thread claims due messages in batches and hands them to a bounded
+    pool of senders. A failed send is retried with exponential backoff and
+    moved to status 'dead' after max_attempts, keeping the last error.
+    """
+
+    def __init__(self, send, workers=4, batch_size=50, max_attempts=5,
+                 base_delay=30, max_delay=3600, lease=120, poll_interval=30):
+        self.send = send
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sms-outbox')
+        self._thread = threading.Thread(target=self._run, name='sms-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown()
+
+    def wake(self):
+        """Call after committing a transaction that queued messages."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                timeout = self.dispatch()
+            except Exception:
+                logging.exception("SMS dispatcher pass failed")
+                timeout = self.poll_interval
+            self._wake.wait(timeout)
+
+    def _claim(self, db, now):
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(f'''
+                SELECT id, to_number, body, attempts FROM sms_outbox
+                WHERE status IN {DUE_STATUSES} AND next_attempt_ts <= ?
+                ORDER BY next_attempt_ts LIMIT ?
+            ''', (now, self.batch_size)).fetchall()
+            db.executemany('''
+                UPDATE sms_outbox SET status = 'sending', attempts = attempts + 1, next_attempt_ts = ?
+                WHERE id = ?
+            ''', [(now + self.lease, row['id']) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return rows
+
+    def _send(self, row):
+        try:
+            self.send(row['to_number'], row['body'])
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+
+    def dispatch(self, now=None):
+        """Send one batch of due messages. Returns the number of seconds to sleep."""
+        self._wake.clear()
+        now = now or int(time.time())
+        with db_util.connection() as db:
+            rows = self._claim(db, now)
+            if rows:
+                if self._pool:
+                    errors = list(self._pool.map(self._send, rows))
+                else:
+                    errors = [self._send(row) for row in rows]
+                results = []
+                for row, error in zip(rows, errors):
+                    attempts = row['attempts'] + 1
+                    if error is None:
+                        results.append(('sent', now, None, row['id']))
+                    elif attempts >= self.max_attempts:
+                        logging.error(f"SMS {row['id']} dead-lettered after {attempts} attempts: {error}")
+                        results.append(('dead', now, error, row['id']))
+                    else:
+                        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                        results.append(('pending', now + delay, error, row['id']))
+                db.executemany('''
+                    UPDATE sms_outbox
+                    SET status = ?, next_attempt_ts = ?, last_error = ?,
+                        sent_at = CASE WHEN ? = 'sent' THEN CURRENT_TIMESTAMP ELSE sent_at END
+                    WHERE id = ?
+                ''', [(status, ts, error, status, message_id) for status, ts, error, message_id in results])
+                db.commit()
+            if len(rows) == self.batch_size:
+                return 0
+            next_due = db.execute(f'''
+                SELECT MIN(next_attempt_ts) FROM sms_outbox WHERE status IN {DUE_STATUSES}
+            ''').fetchone()[0]
+        if next_due is None:
+            return self.poll_interval
+        return max(0, min(next_due - now, self.poll_interval))
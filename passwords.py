@@ -0,0 +1,191 @@
+"""Password hashing with a tunable KDF on a bounded worker pool.
+
+Hashes are stored as '<scheme>$<params>$<hex digest>' in password_hash, with
+the salt in password_salt as before:
+
+    scrypt$n=16384,r=8,p=1$9f2c...
+    pbkdf2_sha256$i=600000$41be...
+
+A bare hex digest is a legacy salted SHA-256 hash. Those still verify, and
+verify_password() reports them (and anything hashed with other settings) as
+needing a rehash so login can upgrade them.
+
+hashlib's scrypt and PBKDF2 release the GIL, so a thread pool runs them in
+parallel. At most PASSWORD_MAX_PENDING hashes can be running or queued;
+past that PasswordPoolBusy is raised at once instead of piling up request
+threads behind a login storm.
+
+Pick the cost for this hardware with:
+
+    python passwords.py --target-ms 250
+"""
+import os
+import sys
+import hmac
+import math
+import time
+import hashlib
+import secrets
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Defaults; PASSWORD_* environment variables are read when first needed so
+# a .env loaded after import still applies
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+PBKDF2_ITERATIONS = 600000
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+_dummy_hashes = {}
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def workers():
+    return int(os.getenv('PASSWORD_WORKERS', os.cpu_count() or 2))
+
+
+def current_params(kdf=None):
+    """(scheme, params) new hashes are made with."""
+    kdf = kdf or os.getenv('PASSWORD_KDF', 'scrypt')
+    if kdf == 'scrypt':
+        return 'scrypt', {'n': int(os.getenv('PASSWORD_SCRYPT_N', SCRYPT_N)),
+                          'r': int(os.getenv('PASSWORD_SCRYPT_R', SCRYPT_R)), 'p': 1}
+    if kdf in ('pbkdf2', 'pbkdf2_sha256'):
+        return 'pbkdf2_sha256', {'i': int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', PBKDF2_ITERATIONS))}
+    raise ValueError(f"Unknown PASSWORD_KDF {kdf!r}; use scrypt or pbkdf2")
+
+
+def _derive(password, salt, scheme, params):
+    if scheme == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * r * (n + p + 2), dklen=32).hex()
+    if scheme == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), params['i']).hex()
+    raise ValueError(f"Unknown password hash scheme {scheme!r}")
+
+
+def _encode(scheme, params, digest):
+    return f"{scheme}${','.join(f'{k}={v}' for k, v in params.items())}${digest}"
+
+
+def _decode(stored_hash):
+    scheme, params, digest = stored_hash.split('$')
+    return scheme, {k: int(v) for k, v in (kv.split('=') for kv in params.split(','))}, digest
+
+
+def make_hash(password, kdf=None):
+    """(password_hash, password_salt) for a new password, on the calling thread."""
+    salt = secrets.token_hex(16)
+    scheme, params = current_params(kdf)
+    return _encode(scheme, params, _derive(password, salt, scheme, params)), salt
+
+
+def dummy_hash():
+    """(password_hash, password_salt) of a random password, made with the current settings.
+
+    Logins for unknown emails verify against it, so they cost as much as
+    real ones and response times do not reveal which emails are registered.
+    """
+    scheme, params = current_params()
+    key = (scheme, tuple(params.items()))
+    if key not in _dummy_hashes:
+        _dummy_hashes[key] = make_hash(secrets.token_hex(16))
+    return _dummy_hashes[key]
+
+
+def check(password, stored_hash, salt):
+    """(matches, needs_rehash) on the calling thread."""
+    if '$' not in stored_hash:
+        digest = hashlib.sha256((password + salt).encode()).hexdigest()
+        return hmac.compare_digest(digest, stored_hash), True
+    scheme, params, digest = _decode(stored_hash)
+    ok = hmac.compare_digest(_derive(password, salt, scheme, params), digest)
+    return ok, (scheme, params) != current_params()
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                size = workers()
+                _slots = threading.BoundedSemaphore(int(os.getenv('PASSWORD_MAX_PENDING', size * 4)))
+                _executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='password-kdf')
+    return _executor
+
+
+def _run(fn, *args):
+    executor = _pool()
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """make_hash() on the KDF pool; raises PasswordPoolBusy when it is full."""
+    return _run(make_hash, password)
+
+
+def verify_password(password, stored_hash, salt):
+    """check() on the KDF pool; raises PasswordPoolBusy when it is full."""
+    return _run(check, password, stored_hash, salt)
+
+
+def _time_hash(scheme, params, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _derive('calibration-password', 'calibration-salt', scheme, params)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate(kdf, target_ms):
+    """Cheapest cost whose hash takes at least target_ms here; returns (env, ms)."""
+    target = target_ms / 1000
+    if current_params(kdf)[0] == 'scrypt':
+        n = 2 ** 10
+        while True:
+            seconds = _time_hash('scrypt', {'n': n, 'r': current_params('scrypt')[1]['r'], 'p': 1})
+            if seconds >= target or n >= 2 ** 22:
+                break
+            n *= 2
+        return {'PASSWORD_KDF': 'scrypt', 'PASSWORD_SCRYPT_N': n}, seconds * 1000
+    probe = 50000
+    iterations = probe * target / _time_hash('pbkdf2_sha256', {'i': probe})
+    iterations = max(10000, math.ceil(iterations / 10000) * 10000)
+    seconds = _time_hash('pbkdf2_sha256', {'i': iterations})
+    return {'PASSWORD_KDF': 'pbkdf2', 'PASSWORD_PBKDF2_ITERATIONS': iterations}, seconds * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pick a password hashing cost for this machine.')
+    parser.add_argument('--kdf', choices=('scrypt', 'pbkdf2'),
+                        default='scrypt' if current_params()[0] == 'scrypt' else 'pbkdf2')
+    parser.add_argument('--target-ms', type=float, default=250, help='time one login hash should take')
+    opts = parser.parse_args(argv)
+    env, ms = calibrate(opts.kdf, opts.target_ms)
+    for name, value in env.items():
+        print(f"{name}={value}")
+    size = workers()
+    print(f"# {ms:.0f} ms per hash; {size} workers (PASSWORD_WORKERS) sustain "
+          f"about {size * 1000 / ms:.0f} logins/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
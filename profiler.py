@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# What each thread is working on, e.g. 'route:dashboard' or
+# 'swaig:check_balance'. Written on every request, read only while sampling.
+_tags = {}
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def tag(label):
+    _tags[threading.get_ident()] = label
+
+
+def untag():
+    _tags.pop(threading.get_ident(), None)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':').replace(' ', '_')
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample(seconds, interval=0.01, all_threads=False):
+    """Sample every thread's stack for `seconds`; returns a Counter of stacks.
+
+    Each stack is a tuple starting with the thread's tag (or 'thread:<name>'
+    for untagged background threads, included when all_threads is set).
+    Only one profile runs per process at a time; a second caller gets
+    ProfilerBusy.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()} if all_threads else None
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                label = _tags.get(ident)
+                if label is None:
+                    if not all_threads:
+                        continue
+                    label = f"thread:{names.get(ident, ident)}"
+                stacks[(label, *_stack(frame))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _busy.release()
+
+
+def collapsed(stacks):
+    """Brendan Gregg's folded format, ready for flamegraph.pl or speedscope."""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+def summary(stacks, top=25):
+    """Samples per tag and the frames most often on top of the stack."""
+    by_tag, leaves = Counter(), Counter()
+    for stack, count in stacks.items():
+        by_tag[stack[0]] += count
+        leaves[stack[-1]] += count
+    return {
+        'samples': sum(stacks.values()),
+        'by_tag': dict(by_tag.most_common()),
+        'top_frames': dict(leaves.most_common(top)),
+    }
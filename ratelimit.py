@@ -0,0 +1,101 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Makes admit()'s check-then-spend atomic across limiters
+_admit_lock = threading.Lock()
+
+
+def parse_rate(spec):
+    """'20/60' -> (burst 20, refill 20 per 60 seconds); '' or '0' disables."""
+    spec = (spec or '').strip()
+    if spec in ('', '0'):
+        return None
+    count, _, seconds = spec.partition('/')
+    count, seconds = float(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit {spec!r}; expected '<count>/<seconds>'")
+    return count, count / seconds
+
+
+class TokenBucketLimiter:
+    """Token buckets per key, e.g. per IP address or per email.
+
+    Each key may spend `burst` requests at once and regains `rate` per
+    second. Only the `max_keys` most recently used keys are tracked; a key
+    that falls off the end starts again with a full bucket, which is what
+    an idle key would have had anyway.
+    """
+
+    def __init__(self, burst, rate, max_keys=100000):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.burst
+        return min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+
+    def wait(self, key, cost=1):
+        """Like take(), but spends nothing."""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0 if tokens >= cost else (cost - tokens) / self.rate
+
+    def take(self, key, cost=1):
+        """0 if the request may go ahead, else seconds until it could."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                wait = (cost - tokens) / self.rate
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def admit(buckets, cost=1):
+    """Spend cost from every (limiter, key) bucket, or from none of them.
+
+    Returns (0, None) when the request may go ahead, else the longest wait
+    and the index of the bucket that imposed it. A refused request costs
+    nothing, so a caller that keeps hitting its own limit cannot drain a
+    bucket it shares with everyone else.
+    """
+    with _admit_lock:
+        wait, refused = 0, None
+        for i, (limiter, key) in enumerate(buckets):
+            needed = limiter.wait(key, cost)
+            if needed > wait:
+                wait, refused = needed, i
+        if refused is not None:
+            buckets[refused][0].rejected += 1
+            return wait, refused
+        for limiter, key in buckets:
+            limiter.take(key, cost)
+        return 0, None
+
+
+def from_spec(spec, max_keys=100000):
+    """A limiter for a '<count>/<seconds>' spec, or None when it is disabled."""
+    rate = parse_rate(spec)
+    return TokenBucketLimiter(*rate, max_keys=max_keys) if rate else None
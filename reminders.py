@@ -0,0 +1,195 @@
+import heapq
+import logging
+import threading
+from datetime import datetime
+import db_util
+from scheduling import to_epoch
+
+# How long before the appointment each reminder type goes out, in seconds
+REMINDER_OFFSETS = {
+    'sms': 24 * 3600,
+    'call': 3600,
+}
+
+# Reminder rows still owed a delivery attempt. 'sending' rows are leased: their
+# due_ts is the lease expiry, after which another worker may claim them again.
+# Kept as SQL text, since the partial due index only applies to a literal match.
+DUE_STATUSES = "('pending', 'sending')"
+
+
+def now_ts():
+    """Current local wall-clock time on the same scale as appointments.start_ts."""
+    return to_epoch(datetime.now())
+
+
+def reminder_rows(appointment_id, start_ts, now):
+    return [(appointment_id, reminder_type, start_ts - offset)
+            for reminder_type, offset in REMINDER_OFFSETS.items()
+            if start_ts - offset > now]
+
+
+def arm(db, appointment_id, start_ts, now=None):
+    """Replace the appointment's pending reminders with ones for start_ts.
+
+    Runs inside the caller's transaction and does not commit. Returns the
+    earliest new due time (or None) to pass to ReminderScheduler.notify()
+    once the caller has committed.
+    """
+    disarm(db, appointment_id)
+    rows = reminder_rows(appointment_id, start_ts, now or now_ts())
+    db.executemany('''
+        INSERT INTO appointment_reminders (appointment_id, reminder_type, due_ts, sent_at, status)
+        VALUES (?, ?, ?, NULL, 'pending')
+    ''', rows)
+    return min((due for _, _, due in rows), default=None)
+
+
+def disarm(db, appointment_id):
+    db.execute(f'''
+        UPDATE appointment_reminders SET status = 'cancelled'
+        WHERE appointment_id = ? AND status IN {DUE_STATUSES}
+    ''', (appointment_id,))
+
+
+class ReminderScheduler:
+    """Single worker thread delivering reminders from appointment_reminders.
+
+    Only the reminders due within `horizon` seconds are held in memory, as
+    (due_ts, id) pairs in a min-heap; the worker sleeps until the head is
+    due. Entries for reminders that were cancelled or re-armed are not
+    removed from the heap but skipped when the batch is claimed, because the
+    claim re-checks status and due_ts in the database. Claims take a lease,
+    so several processes can run a scheduler against one database.
+    """
+
+    def __init__(self, send, batch_size=100, horizon=3600, max_loaded=50000,
+                 lease=300, max_attempts=3, retry_delay=60, max_sleep=300):
+        self.send = send
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.max_loaded = max_loaded
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_sleep = max_sleep
+        self._heap = []
+        self._loaded_until = 0
+        self._inbox = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def notify(self, due_ts):
+        """Tell the worker about a reminder armed (and committed) by this process."""
+        if due_ts is None:
+            return
+        with self._lock:
+            self._inbox.append(due_ts)
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                timeout = self.tick()
+            except Exception:
+                logging.exception("Reminder scheduler tick failed")
+                timeout = self.retry_delay
+            self._wake.wait(timeout)
+
+    def _refill(self, db, now):
+        rows = db.execute(f'''
+            SELECT due_ts, id FROM appointment_reminders
+            WHERE status IN {DUE_STATUSES} AND due_ts < ?
+            ORDER BY due_ts LIMIT ?
+        ''', (now + self.horizon, self.max_loaded)).fetchall()
+        self._heap = [(due_ts, reminder_id) for due_ts, reminder_id in rows]
+        heapq.heapify(self._heap)
+        if len(rows) < self.max_loaded:
+            self._loaded_until = now + self.horizon
+        else:
+            # Too many to hold; everything up to the last loaded row is in the heap
+            self._loaded_until = rows[-1][0]
+
+    def tick(self, now=None):
+        """Deliver what is due. Returns the number of seconds to sleep."""
+        self._wake.clear()
+        now = now or now_ts()
+        with self._lock:
+            inbox, self._inbox = self._inbox, []
+        with db_util.connection() as db:
+            # A reminder armed beyond the loaded window is found by the next
+            # refill; one inside it needs the heap reloaded to learn its id.
+            if now >= self._loaded_until or any(due < self._loaded_until for due in inbox):
+                self._refill(db, now)
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap)[1])
+            if batch:
+                self._deliver(db, batch, now)
+        if len(batch) == self.batch_size:
+            return 0
+        next_due = self._heap[0][0] if self._heap else self._loaded_until
+        return max(0, min(next_due, self._loaded_until, now + self.max_sleep) - now)
+
+    def _claim(self, db, ids, now):
+        placeholders = ', '.join('?' * len(ids))
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(f'''
+                SELECT r.id, r.appointment_id, r.reminder_type, r.attempts,
+                       a.customer_id, a.type, a.start_time, a.status AS appointment_status
+                FROM appointment_reminders r
+                JOIN appointments a ON a.id = r.appointment_id
+                WHERE r.id IN ({placeholders}) AND r.due_ts <= ?
+                AND r.status IN {DUE_STATUSES}
+            ''', (*ids, now)).fetchall()
+            db.executemany('''
+                UPDATE appointment_reminders SET status = 'sending', due_ts = ?, attempts = attempts + 1
+                WHERE id = ?
+            ''', [(now + self.lease, row['id']) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return rows
+
+    def _deliver(self, db, ids, now):
+        results = []
+        for row in self._claim(db, ids, now):
+            if row['appointment_status'] != 'scheduled':
+                results.append(('cancelled', None, None, row['id']))
+                continue
+            try:
+                self.send(dict(row))
+                results.append(('sent', None, None, row['id']))
+            except Exception as e:
+                attempts = row['attempts'] + 1
+                logging.warning(f"Reminder {row['id']} attempt {attempts} failed: {e}")
+                if attempts >= self.max_attempts:
+                    results.append(('failed', None, str(e), row['id']))
+                else:
+                    retry_at = now + self.retry_delay * 2 ** (attempts - 1)
+                    results.append(('pending', retry_at, str(e), row['id']))
+                    if retry_at < self._loaded_until:
+                        heapq.heappush(self._heap, (retry_at, row['id']))
+        db.executemany('''
+            UPDATE appointment_reminders
+            SET status = ?, due_ts = COALESCE(?, due_ts), error_message = ?,
+                sent_at = CASE WHEN ? = 'sent' THEN CURRENT_TIMESTAMP ELSE sent_at END
+            WHERE id = ?
+        ''', [(status, due_ts, error, status, reminder_id) for status, due_ts, error, reminder_id in results])
+        db.commit()
@@ -0,0 +1,241 @@
+import time
+import calendar
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Appointment windows offered to customers, as 24h (start, end) wall-clock times.
+TIME_SLOTS = {
+    'morning': ('08:00', '11:00'),
+    'afternoon': ('14:00', '16:00'),
+    'evening': ('18:00', '20:00'),
+    'all_day': ('08:00', '20:00')
+}
+
+APPOINTMENT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Formats found in start_time/end_time columns written by older releases.
+_LEGACY_TIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %I:%M %p',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+)
+
+
+def to_epoch(dt):
+    """Seconds since the epoch for a naive local wall-clock datetime.
+
+    The wall-clock time is read as if it were UTC, so the value never shifts
+    with DST and matches SQLite's strftime('%s', start_time).
+    """
+    return calendar.timegm(dt.timetuple())
+
+
+def from_epoch(ts):
+    return datetime(1970, 1, 1) + timedelta(seconds=ts)
+
+
+def parse_appointment_time(value):
+    for fmt in _LEGACY_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised appointment time: {value!r}")
+
+
+def format_appointment_time(dt):
+    return dt.strftime(APPOINTMENT_TIME_FORMAT)
+
+
+def slot_bounds(date, time_slot):
+    """Return (start, end) datetimes of a named slot on a YYYY-MM-DD date."""
+    start, end = TIME_SLOTS[time_slot]
+    return (datetime.strptime(f"{date} {start}", '%Y-%m-%d %H:%M'),
+            datetime.strptime(f"{date} {end}", '%Y-%m-%d %H:%M'))
+
+
+def day_bounds(day):
+    """Epoch range [start, end) covering the calendar day of a datetime."""
+    start = to_epoch(datetime(day.year, day.month, day.day))
+    return start, start + 86400
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+class DuplicateBooking(Exception):
+    pass
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+# Elementary intervals (minutes since midnight) between every slot boundary.
+# A booking uses one technician in each interval it overlaps, so overlapping
+# slots such as morning and all_day share capacity correctly.
+_BOUNDARIES = sorted({_minutes(t) for bounds in TIME_SLOTS.values() for t in bounds})
+_INTERVALS = list(zip(_BOUNDARIES, _BOUNDARIES[1:]))
+_SLOT_INTERVALS = {
+    name: [i for i, (lo, hi) in enumerate(_INTERVALS) if lo >= _minutes(start) and hi <= _minutes(end)]
+    for name, (start, end) in TIME_SLOTS.items()
+}
+
+ACTIVE_STATUSES = ('scheduled', 'in_progress')
+
+
+def _count_booking(usage, day_start, start_ts, end_ts):
+    start = (start_ts - day_start) // 60
+    end = (end_ts - day_start) // 60
+    for i, (lo, hi) in enumerate(_INTERVALS):
+        if start < hi and end > lo:
+            usage[i] += 1
+
+
+class SlotEngine:
+    """Per-slot booking capacity backed by the active technicians.
+
+    Remaining capacity per day is kept in an in-memory index that answers
+    availability lookups without touching SQLite. The index is only a hint:
+    reserve() recounts the day inside a BEGIN IMMEDIATE transaction, so two
+    workers can never book the same last technician.
+    """
+
+    def __init__(self, ttl=30, max_days=4096):
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._capacity = None
+        self._lock = threading.Lock()
+
+    def capacity(self, db, refresh=False):
+        now = time.monotonic()
+        if refresh or self._capacity is None or now - self._capacity[0] > self.ttl:
+            count = db.execute("SELECT COUNT(*) FROM technicians WHERE status = 'active'").fetchone()[0]
+            # Without any technicians on file, keep the historical one job per slot
+            self._capacity = (now, max(count, 1))
+        return self._capacity[1]
+
+    def _load_usage(self, db, day_start, exclude_id=None):
+        query = f'''
+            SELECT start_ts, end_ts FROM appointments
+            WHERE start_ts >= ? AND start_ts < ?
+            AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+        '''
+        params = [day_start, day_start + 86400, *ACTIVE_STATUSES]
+        if exclude_id is not None:
+            query += ' AND id != ?'
+            params.append(exclude_id)
+        usage = [0] * len(_INTERVALS)
+        for start_ts, end_ts in db.execute(query, params):
+            _count_booking(usage, day_start, start_ts, end_ts)
+        return usage
+
+    def _store(self, key, usage):
+        with self._lock:
+            self._days[key] = (time.monotonic(), usage)
+            self._days.move_to_end(key)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+
+    def usage(self, db, date):
+        """Technicians booked per elementary interval on a YYYY-MM-DD date."""
+        with self._lock:
+            cached = self._days.get(date)
+        if cached and time.monotonic() - cached[0] <= self.ttl:
+            return cached[1]
+        usage = self._load_usage(db, day_bounds(datetime.strptime(date, '%Y-%m-%d'))[0])
+        self._store(date, usage)
+        return usage
+
+    def remaining(self, db, date, time_slot):
+        usage = self.usage(db, date)
+        used = max(usage[i] for i in _SLOT_INTERVALS[time_slot])
+        return max(self.capacity(db) - used, 0)
+
+    def next_available(self, db, start_date, days=14, limit=5, time_slots=None, customer_id=None):
+        """First `limit` bookable (date, time_slot, remaining) over a date window.
+
+        Reads the whole window with one range query, which also refreshes the
+        per-day index. Days on which customer_id already has an active
+        appointment are skipped, matching what reserve() would reject.
+        """
+        time_slots = time_slots or list(TIME_SLOTS)
+        window_start, _ = day_bounds(start_date)
+        window_end = window_start + days * 86400
+        usage_by_day = {window_start + d * 86400: [0] * len(_INTERVALS) for d in range(days)}
+        booked_days = set()
+        rows = db.execute(f'''
+            SELECT start_ts, end_ts, customer_id = ? FROM appointments
+            WHERE start_ts >= ? AND start_ts < ?
+            AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+        ''', (customer_id, window_start, window_end, *ACTIVE_STATUSES))
+        for start_ts, end_ts, is_own in rows:
+            day_start = window_start + (start_ts - window_start) // 86400 * 86400
+            _count_booking(usage_by_day[day_start], day_start, start_ts, end_ts)
+            if is_own:
+                booked_days.add(day_start)
+        capacity = self.capacity(db)
+        found = []
+        for day_start, usage in usage_by_day.items():
+            date = from_epoch(day_start).strftime('%Y-%m-%d')
+            self._store(date, usage)
+            if day_start in booked_days or len(found) >= limit:
+                continue
+            for time_slot in time_slots:
+                remaining = capacity - max(usage[i] for i in _SLOT_INTERVALS[time_slot])
+                if remaining > 0 and len(found) < limit:
+                    found.append((date, time_slot, remaining))
+        return found
+
+    def invalidate(self, date=None):
+        with self._lock:
+            if date is None:
+                self._days.clear()
+            else:
+                self._days.pop(date, None)
+
+    @contextmanager
+    def reserve(self, db, customer_id, date, time_slot, exclude_id=None):
+        """Hold the write lock while the caller books date/time_slot.
+
+        Raises DuplicateBooking if the customer already has an appointment
+        overlapping the slot that day, SlotUnavailable if every technician
+        is taken. The caller's writes commit together with the check.
+        """
+        slot_start, slot_end = slot_bounds(date, time_slot)
+        day_start, day_end = day_bounds(slot_start)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            query = f'''
+                SELECT 1 FROM appointments
+                WHERE customer_id = ? AND start_ts >= ? AND start_ts < ?
+                AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})
+            '''
+            params = [customer_id, day_start, day_end, *ACTIVE_STATUSES]
+            if exclude_id is not None:
+                # Moving an appointment only clashes with the customer's other bookings in the new slot
+                query += ' AND id != ? AND start_ts < ? AND end_ts > ?'
+                params += [exclude_id, to_epoch(slot_end), to_epoch(slot_start)]
+            if db.execute(query, params).fetchone():
+                raise DuplicateBooking(date)
+            usage = self._load_usage(db, day_start, exclude_id)
+            if max(usage[i] for i in _SLOT_INTERVALS[time_slot]) >= self.capacity(db, refresh=True):
+                raise SlotUnavailable(time_slot)
+            yield slot_start, slot_end
+            db.commit()
+        except BaseException:
+            db.rollback()
+            self.invalidate(date)
+            raise
+        # The usage read under the write lock plus this booking is the day's
+        # committed state, so the index stays warm without another query.
+        for i in _SLOT_INTERVALS[time_slot]:
+            usage[i] += 1
+        self._store(date, usage)
@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+# (connect, read) timeouts in seconds per SignalWire operation
+TIMEOUTS = {
+    'sms': (3.05, 10),
+    'mfa_send': (3.05, 10),
+    'mfa_verify': (3.05, 5),
+    'call': (3.05, 10),
+}
+
+
+def default_base_url(space):
+    """SIGNALWIRE_BASE_URL (e.g. a local fake_signalwire.py) or the real space."""
+    return (os.getenv('SIGNALWIRE_BASE_URL') or f"https://{space}.signalwire.com").rstrip('/')
+
+
+class SignalWireHTTP:
+    """Keep-alive client for the SignalWire REST APIs.
+
+    One pooled requests.Session per project, so repeated MFA and SMS calls
+    reuse an open TLS connection instead of handshaking on every request.
+    Methods return the requests.Response; callers decide how to treat
+    status codes, as they did with bare requests.post.
+    """
+
+    def __init__(self, project_id, token, space, pool_size=10, timeouts=None, base_url=None):
+        self.project_id = project_id
+        self.space = space
+        self.base_url = (base_url or default_base_url(space)).rstrip('/')
+        self.relay_url = f"{self.base_url}/api/relay/rest"
+        self.laml_url = f"{self.base_url}/api/laml/2010-04-01/Accounts/{project_id}"
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self.session = requests.Session()
+        self.session.auth = (project_id, token)
+        # POSTs are not idempotent, so only retry connections that never got a request out
+        retry = Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, operation, url, **kwargs):
+        with metrics.timed('http'):
+            return self.session.post(url, timeout=self.timeouts[operation], **kwargs)
+
+    def send_sms(self, to_number, from_number, body):
+        return self.post('sms', f"{self.laml_url}/Messages.json",
+                         data={"From": from_number, "To": to_number, "Body": body})
+
+    def send_mfa(self, to_number, from_number, message, valid_for=3600, token_length=6, max_attempts=3):
+        return self.post('mfa_send', f"{self.relay_url}/mfa/sms", json={
+            "to": to_number,
+            "from": from_number,
+            "message": message,
+            "token_length": token_length,
+            "max_attempts": max_attempts,
+            "allow_alphas": False,
+            "valid_for": valid_for
+        })
+
+    def verify_mfa(self, mfa_id, token):
+        return self.post('mfa_verify', f"{self.relay_url}/mfa/{mfa_id}/verify", json={"token": token})
+
+    def create_call(self, to_number, from_number, url):
+        """Place an outbound call that fetches its LaML from url."""
+        return self.post('call', f"{self.laml_url}/Calls.json",
+                         data={"From": from_number, "To": to_number, "Url": url})
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(project_id, token, space, base_url=None):
+    """Shared SignalWireHTTP for a project; created on first use."""
+    base_url = base_url or default_base_url(space)
+    key = (project_id, token, space, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = SignalWireHTTP(project_id, token, space, base_url=base_url)
+                logging.debug(f"Created SignalWire HTTP pool for {base_url}")
+    return client
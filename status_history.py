@@ -0,0 +1,231 @@
+import time
+import logging
+import threading
+from collections import defaultdict
+import db_util
+
+# Bucket sizes in seconds, finest first. Each level is rolled up from the one
+# before it (minutes from the raw transitions).
+RESOLUTIONS = (
+    ('minute', 60),
+    ('hour', 3600),
+    ('day', 86400),
+)
+BUCKET_SECONDS = dict(RESOLUTIONS)
+
+# How long each level is kept, in seconds. Raw transitions still open (the
+# modem's current status) are kept regardless.
+RETENTION = {
+    'raw': 2 * 86400,
+    'minute': 2 * 86400,
+    'hour': 35 * 86400,
+    'day': 400 * 86400,
+}
+
+COUNTERS = ('transitions', 'drops', 'reboots', 'offline_seconds', 'rebooting_seconds')
+
+# Most raw history one rollup pass will read, so a long outage of the worker
+# is caught up in bounded steps.
+MAX_PASS_SECONDS = 6 * 3600
+
+
+def watermarks(db):
+    """{resolution: epoch up to which that level has been rolled up}."""
+    return {row[0]: row[1] for row in db.execute('SELECT resolution, rolled_until FROM modem_status_rollup_state')}
+
+
+def _set_watermark(db, resolution, ts):
+    db.execute('''
+        INSERT INTO modem_status_rollup_state (resolution, rolled_until) VALUES (?, ?)
+        ON CONFLICT (resolution) DO UPDATE SET rolled_until = excluded.rolled_until
+    ''', (resolution, ts))
+
+
+def _upsert(db, resolution, buckets):
+    db.executemany(f'''
+        INSERT INTO modem_status_rollups (resolution, customer_id, bucket_ts, {', '.join(COUNTERS)})
+        VALUES (?, ?, ?, {', '.join('?' * len(COUNTERS))})
+        ON CONFLICT (resolution, customer_id, bucket_ts) DO UPDATE SET
+        {', '.join(f'{c} = {c} + excluded.{c}' for c in COUNTERS)}
+    ''', [(resolution, customer_id, bucket_ts, *(counts[c] for c in COUNTERS))
+          for (customer_id, bucket_ts), counts in buckets.items()])
+
+
+def rollup_minutes(db, start, end):
+    """Fold raw transitions in [start, end) into sparse per-minute buckets.
+
+    A bucket row exists only where the modem changed status or spent time
+    offline or rebooting, so a healthy fleet writes almost nothing.
+    """
+    rows = db.execute('''
+        SELECT customer_id, status, ts, ended_ts FROM modem_status_events
+        WHERE ts >= ? AND ts < ?
+        UNION ALL
+        SELECT customer_id, status, ts, ended_ts FROM modem_status_events
+        WHERE ended_ts > ? AND ts < ? AND status != 'online'
+        UNION ALL
+        SELECT customer_id, status, ts, ended_ts FROM modem_status_events
+        WHERE ended_ts IS NULL AND ts < ? AND status != 'online'
+    ''', (start, end, start, start, start)).fetchall()
+    buckets = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for customer_id, status, ts, ended_ts in rows:
+        if start <= ts < end:
+            counts = buckets[(customer_id, ts - ts % 60)]
+            counts['transitions'] += 1
+            counts['drops'] += status == 'offline'
+            counts['reboots'] += status == 'rebooting'
+        if status not in ('offline', 'rebooting'):
+            continue
+        # Spread the time spent in this status over the minutes it covers
+        t, until = max(ts, start), min(ended_ts or end, end)
+        while t < until:
+            bucket_ts = t - t % 60
+            step = min(bucket_ts + 60, until) - t
+            buckets[(customer_id, bucket_ts)][f'{status}_seconds'] += step
+            t += step
+    _upsert(db, 'minute', buckets)
+    return len(buckets)
+
+
+def rollup_level(db, resolution, source, start, end):
+    """Fold the `source` level's buckets in [start, end) into `resolution` buckets."""
+    size = BUCKET_SECONDS[resolution]
+    db.execute(f'''
+        INSERT INTO modem_status_rollups (resolution, customer_id, bucket_ts, {', '.join(COUNTERS)})
+        SELECT ?, customer_id, bucket_ts - bucket_ts % ?, {', '.join(f'SUM({c})' for c in COUNTERS)}
+        FROM modem_status_rollups
+        WHERE resolution = ? AND bucket_ts >= ? AND bucket_ts < ?
+        GROUP BY customer_id, bucket_ts - bucket_ts % ?
+        ON CONFLICT (resolution, customer_id, bucket_ts) DO UPDATE SET
+        {', '.join(f'{c} = {c} + excluded.{c}' for c in COUNTERS)}
+    ''', (resolution, size, source, start, end, size))
+
+
+def prune(db, now):
+    """Apply RETENTION, but never drop data the next level has not rolled up yet.
+
+    If the worker falls behind, raw transitions and buckets are kept past
+    their retention until the level built from them catches up.
+    """
+    marks = watermarks(db)
+    levels = [name for name, _ in RESOLUTIONS]
+    for level, consumer in zip(['raw'] + levels, levels + [None]):
+        cutoff = now - RETENTION[level]
+        if consumer is not None:
+            cutoff = min(cutoff, marks.get(consumer, 0))
+        if level == 'raw':
+            db.execute('DELETE FROM modem_status_events WHERE ended_ts < ?', (cutoff,))
+        else:
+            db.execute('DELETE FROM modem_status_rollups WHERE resolution = ? AND bucket_ts < ?', (level, cutoff))
+
+
+def run_rollups(db, now=None):
+    """Advance every level to the last complete bucket and apply retention.
+
+    Each level's work and its watermark commit together, so a crash in the
+    middle of a pass never counts a bucket twice.
+    """
+    now = int(now or time.time())
+    marks = watermarks(db)
+    source, source_until = None, None
+    for resolution, size in RESOLUTIONS:
+        limit = now if source is None else source_until
+        start = marks.get(resolution) or limit - limit % size
+        end = limit - limit % size
+        if source is None:
+            end = min(end, start + MAX_PASS_SECONDS)
+        if end > start:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if source is None:
+                    rollup_minutes(db, start, end)
+                else:
+                    rollup_level(db, resolution, source, start, end)
+                _set_watermark(db, resolution, end)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        elif resolution not in marks:
+            _set_watermark(db, resolution, start)
+            db.commit()
+        source, source_until = resolution, max(end, start)
+    prune(db, now)
+    db.commit()
+
+
+def pick_resolution(since, until):
+    span = until - since
+    if span <= 6 * 3600:
+        return 'minute'
+    if span <= 14 * 86400:
+        return 'hour'
+    return 'day'
+
+
+def query(db, customer_id, since, until, resolution=None):
+    """Bucketed status history for one customer's modem.
+
+    Each level is read only up to its own watermark and the finer levels
+    fill in the rest, so the newest hour or day is not missing while it
+    waits to be rolled up. Returns (resolution, buckets, totals); buckets
+    without activity are omitted, meaning the modem was online throughout.
+    """
+    resolution = resolution or pick_resolution(since, until)
+    size = BUCKET_SECONDS[resolution]
+    since -= since % size
+    marks = watermarks(db)
+    levels = [name for name, _ in RESOLUTIONS]
+    buckets = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    lower = since
+    for level in reversed(levels[:levels.index(resolution) + 1]):
+        upper = min(until, marks.get(level, lower))
+        if upper <= lower:
+            continue
+        rows = db.execute(f'''
+            SELECT bucket_ts, {', '.join(COUNTERS)} FROM modem_status_rollups
+            WHERE resolution = ? AND customer_id = ? AND bucket_ts >= ? AND bucket_ts < ?
+        ''', (level, customer_id, lower, upper)).fetchall()
+        for row in rows:
+            counts = buckets[row[0] - row[0] % size]
+            for i, c in enumerate(COUNTERS, 1):
+                counts[c] += row[i]
+        lower = upper
+    series = [dict(bucket_ts=bucket_ts, **counts) for bucket_ts, counts in sorted(buckets.items())]
+    totals = {c: sum(b[c] for b in series) for c in COUNTERS}
+    covered = max(lower - since, 0)
+    down = totals['offline_seconds'] + totals['rebooting_seconds']
+    totals['uptime_percent'] = round(100 * (1 - down / covered), 2) if covered else None
+    return resolution, series, totals
+
+
+class StatusRollup:
+    """Background worker running run_rollups() every `interval` seconds."""
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='status-rollup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with db_util.connection() as db:
+                    run_rollups(db)
+            except Exception:
+                logging.exception("Modem status rollup failed")
+            self._wake.wait(self.interval)
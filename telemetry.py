@@ -0,0 +1,142 @@
+import re
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+import db_util
+
+MODEM_STATUSES = ('online', 'offline', 'rebooting', 'initializing')
+
+_MAC_SEPARATORS = re.compile(r'[\s:.-]')
+_MAC_DIGITS = re.compile(r'[0-9A-F]{12}')
+
+
+def normalize_mac(mac):
+    """XX:XX:XX:XX:XX:XX form of a MAC address, or None if it is not one.
+
+    Accepts 12 hex digits, optionally split by colons, dashes, dots or spaces.
+    """
+    if not isinstance(mac, str):
+        return None
+    digits = _MAC_SEPARATORS.sub('', mac).upper()
+    if not _MAC_DIGITS.fullmatch(digits):
+        return None
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def sqlite_timestamp(ts):
+    """Epoch seconds as the UTC text CURRENT_TIMESTAMP writes to last_seen."""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class HeartbeatBuffer:
+    """Coalesces modem heartbeats in memory and writes them in bulk.
+
+    Only the newest (status, ts) per MAC is kept between flushes, so the
+    database sees at most one UPDATE per modem per flush_interval however
+    often the modem reports. Each flush is one executemany transaction.
+    on_flush, if given, receives the flushed (mac, status, ts) rows after
+    commit.
+    """
+
+    def __init__(self, flush_interval=1.0, max_pending=200000, on_flush=None):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='heartbeat-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def add(self, mac, status, ts):
+        """Record one normalized heartbeat; older-than-buffered ones are dropped."""
+        with self._lock:
+            current = self._pending.get(mac)
+            if current is None or ts >= current[1]:
+                self._pending[mac] = (status, ts)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of modems written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            rows = [(mac, status, ts) for mac, (status, ts) in batch.items()]
+            try:
+                with db_util.connection() as db:
+                    # A late batch never moves last_seen backwards
+                    db.executemany('''
+                        UPDATE modems SET status = ?, last_seen = ?
+                        WHERE mac_address = ? AND (last_seen IS NULL OR last_seen <= ?)
+                    ''', [(status, sqlite_timestamp(ts), mac, sqlite_timestamp(ts)) for mac, status, ts in rows])
+                    db.commit()
+            except Exception:
+                # Put the batch back unless newer heartbeats arrived meanwhile
+                with self._lock:
+                    for mac, (status, ts) in batch.items():
+                        current = self._pending.get(mac)
+                        if current is None or current[1] < ts:
+                            self._pending[mac] = (status, ts)
+                raise
+            if self.on_flush:
+                try:
+                    self.on_flush(rows)
+                except Exception:
+                    logging.exception("Heartbeat on_flush hook failed")
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Heartbeat flush failed; will retry")
+
+
+def parse_heartbeats(records, now=None):
+    """Validate raw heartbeat dicts into (mac, status, ts) tuples.
+
+    Returns (heartbeats, rejected_count). ts is epoch seconds and defaults
+    to now; MACs are normalized.
+    """
+    now = now or time.time()
+    heartbeats, rejected = [], 0
+    for record in records:
+        if not isinstance(record, dict):
+            rejected += 1
+            continue
+        mac = normalize_mac(record.get('mac') or record.get('mac_address'))
+        status = record.get('status')
+        ts = record.get('ts', now)
+        if not mac or status not in MODEM_STATUSES or not isinstance(ts, (int, float)) or isinstance(ts, bool):
+            rejected += 1
+            continue
+        heartbeats.append((mac, status, min(ts, now)))
+    return heartbeats, rejected
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+import db_util
+from scheduling import to_epoch, format_appointment_time
+
+# Seven appointments over three start times, so most pages end mid-tie
+STARTS = [datetime(2026, 3, 10, 9), datetime(2026, 3, 10, 9), datetime(2026, 3, 10, 9),
+          datetime(2026, 3, 10, 13), datetime(2026, 3, 10, 13),
+          datetime(2026, 3, 11, 9), datetime(2026, 3, 11, 9)]
+
+
+@pytest.fixture
+def customer_with_appointments(client, make_customer):
+    customer_id = make_customer()
+    with db_util.connection() as db:
+        ids = [db.execute('''
+            INSERT INTO appointments (customer_id, type, status, start_time, end_time, start_ts, end_ts)
+            VALUES (?, 'repair', 'scheduled', ?, ?, ?, ?)
+        ''', (customer_id, format_appointment_time(start), format_appointment_time(start),
+              to_epoch(start), to_epoch(start) + 3600)).lastrowid for start in STARTS]
+        db.commit()
+    with client.session_transaction() as session:
+        session['customer_id'] = customer_id
+    return ids
+
+
+def _page_through(client, **params):
+    seen, cursor = [], None
+    while True:
+        query = dict(params, start='2026-03-01', end='2026-04-01', per_page=2)
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/appointments', query_string=query)
+        assert response.status_code == 200
+        page = response.json
+        seen.extend(appt['id'] for appt in page['appointments'])
+        cursor = page['pagination']['next_cursor']
+        assert page['pagination']['has_more'] == (cursor is not None)
+        if not cursor:
+            return seen
+
+
+@pytest.mark.parametrize('sort_by', ['start_time', 'status'])
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_keyset_pages_cover_ties_exactly_once(client, customer_with_appointments, sort_by, sort_order):
+    seen = _page_through(client, sort_by=sort_by, sort_order=sort_order)
+    assert len(seen) == len(set(seen)) and set(seen) == set(customer_with_appointments)
+
+    if sort_by == 'start_time':
+        keyed = sorted(zip(STARTS, customer_with_appointments), reverse=sort_order == 'desc')
+        assert seen == [appointment_id for _, appointment_id in keyed]
+
+
+def test_cursor_for_another_sort_is_rejected(client, customer_with_appointments):
+    query = {'start': '2026-03-01', 'end': '2026-04-01', 'per_page': 2}
+    cursor = client.get('/api/appointments', query_string=query).json['pagination']['next_cursor']
+    response = client.get('/api/appointments', query_string=dict(query, cursor=cursor, sort_order='asc'))
+    assert response.status_code == 400
@@ -0,0 +1,86 @@
+import sqlite3
+from datetime import date
+import pytest
+import billing_cycle
+from migrations import migrate
+
+CUSTOMERS = 25
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite3.connect(tmp_path / 'billing.db')
+    db.row_factory = sqlite3.Row
+    migrate(db)
+    db.execute("INSERT INTO services (id, name, price, type) VALUES (1, 'Internet', 59.99, 'internet'), "
+               "(2, 'TV', 30.01, 'tv')")
+    for cid in range(1, CUSTOMERS + 1):
+        db.execute("INSERT INTO customers (id, name, email, phone, password_hash, password_salt) "
+                   "VALUES (?, ?, ?, '+1555', 'x', 'x')", (cid, f'Customer {cid}', f'c{cid}@example.com'))
+        # Every fifth customer has nothing active and gets no bill
+        db.execute('INSERT INTO customer_services (customer_id, service_id, status) VALUES (?, 1, ?)',
+                   (cid, 'cancelled' if cid % 5 == 0 else 'active'))
+        if cid % 2 and cid % 5:
+            db.execute("INSERT INTO customer_services (customer_id, service_id, status) VALUES (?, 2, 'active')",
+                       (cid,))
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_crashed_run_resumes_without_double_billing(db, monkeypatch):
+    real_bill_chunk = billing_cycle.bill_chunk
+    calls = []
+
+    def crash_on_third_chunk(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise RuntimeError('worker killed')
+        return real_bill_chunk(*args)
+
+    monkeypatch.setattr(billing_cycle, 'bill_chunk', crash_on_third_chunk)
+    with pytest.raises(RuntimeError):
+        billing_cycle.run_cycle(db, '2026-11', chunk_size=4, log=lambda message: None)
+    run = db.execute("SELECT status, cursor FROM billing_runs WHERE period = '2026-11'").fetchone()
+    assert (run['status'], run['cursor']) == ('running', 8)
+
+    monkeypatch.setattr(billing_cycle, 'bill_chunk', real_bill_chunk)
+    run = billing_cycle.run_cycle(db, '2026-11', chunk_size=4, log=lambda message: None)
+
+    billed = db.execute("SELECT customer_id, count(*) FROM billing WHERE period = '2026-11' GROUP BY customer_id")
+    assert {cid: n for cid, n in billed} == {cid: 1 for cid in range(1, CUSTOMERS + 1) if cid % 5}
+    expected = sum(5999 + (3001 if cid % 2 else 0) for cid in range(1, CUSTOMERS + 1) if cid % 5)
+    assert (run['status'], run['invoices'], run['amount_cents']) == ('done', 20, expected)
+    assert db.execute("SELECT count(*), sum(amount_cents) FROM ledger_entries WHERE memo = 'Services 2026-11'"
+                      ).fetchone()[:] == (20, expected)
+
+    again = billing_cycle.run_cycle(db, '2026-11', log=lambda message: None)
+    assert again['invoices'] == 20
+    assert db.execute("SELECT count(*) FROM billing WHERE period = '2026-11'").fetchone()[0] == 20
+
+
+def test_mark_overdue(db):
+    billing_cycle.run_cycle(db, '2026-11', '2026-11-15', log=lambda message: None)
+    assert billing_cycle.mark_overdue(db, date(2026, 11, 15), chunk_size=3, log=lambda message: None) == 0
+    assert billing_cycle.mark_overdue(db, date(2026, 11, 16), chunk_size=3, log=lambda message: None) == 20
+
+
+@pytest.mark.parametrize('today, bills', [
+    (date(2026, 2, 27), False),
+    (date(2026, 2, 28), True),
+    (date(2026, 4, 30), True),
+    (date(2026, 5, 30), False),
+    (date(2026, 5, 31), True),
+])
+def test_cycle_day_past_the_month_end_bills_on_its_last_day(app_module, monkeypatch, today, bills):
+    periods = []
+    monkeypatch.setattr(billing_cycle, 'run_cycle', lambda db, period, *args: periods.append(period))
+    monkeypatch.setattr(billing_cycle, 'mark_overdue', lambda *args: 0)
+    billing_cycle.BillingScheduler(31).run_once(today)
+    assert periods == ([today.strftime('%Y-%m')] if bills else [])
+
+
+@pytest.mark.parametrize('cycle_day', [0, 32])
+def test_cycle_day_is_validated(cycle_day):
+    with pytest.raises(ValueError):
+        billing_cycle.BillingScheduler(cycle_day)
@@ -0,0 +1,41 @@
+import time
+
+MAC = '02:00:00:00:08:01'
+
+
+def _login(client, customer_id):
+    with client.session_transaction() as session:
+        session['customer_id'] = customer_id
+
+
+def test_matching_etag_gets_304_until_a_relevant_write(client, app_module, make_customer):
+    _login(client, make_customer(MAC))
+    first = client.get('/api/modem/status')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag.startswith('W/')
+
+    cached = client.get('/api/modem/status', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+    # last_seen-only heartbeats leave the cached response valid
+    now = time.time()
+    app_module.heartbeat_buffer.add(MAC, 'online', now)
+    app_module.heartbeat_buffer.flush()
+    assert client.get('/api/modem/status', headers={'If-None-Match': etag}).status_code == 304
+
+    app_module.heartbeat_buffer.add(MAC, 'offline', now + 1)
+    app_module.heartbeat_buffer.flush()
+    changed = client.get('/api/modem/status', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json['status'] == 'offline'
+
+
+def test_payment_changes_the_balance_etag(client, make_customer):
+    _login(client, make_customer())
+    client.post('/api/payments', json={'amount': '5.00', 'payment_method': 'card'})
+    etag = client.get('/api/billing/balance').headers['ETag']
+    assert client.get('/api/billing/balance', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/api/payments', json={'amount': '1.00', 'payment_method': 'card'}).status_code == 200
+    changed = client.get('/api/billing/balance', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from job_numbers import DEFAULT_DIGITS, job_number, permute, unpermute
+
+SECRET = 'test-secret'
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 10, 97, 1000, 4096, 5000])
+def test_permute_is_a_bijection_on_small_ranges(size):
+    values = [permute(SECRET, index, size) for index in range(size)]
+    assert sorted(values) == list(range(size))
+    assert [unpermute(SECRET, value, size) for value in values] == list(range(size))
+
+
+def test_job_numbers_do_not_collide_over_a_sample():
+    size = 9 * 10 ** (DEFAULT_DIGITS - 1)
+    sample = list(range(20000)) + random.Random(23).sample(range(size), 20000)
+    values = [permute(SECRET, index, size) for index in sample]
+    assert len(set(values)) == len(set(sample))
+    assert all(0 <= value < size for value in values)
+    assert [unpermute(SECRET, value, size) for value in values] == sample
+
+    numbers = {job_number(SECRET, index) for index in range(1000)}
+    assert len(numbers) == 1000
+    assert all(len(number) == DEFAULT_DIGITS and number[0] != '0' for number in numbers)
+
+
+def test_secret_changes_the_order():
+    assert [permute(SECRET, i, 1000) for i in range(20)] != [permute('other', i, 1000) for i in range(20)]
+
+
+def test_out_of_range_is_rejected():
+    with pytest.raises(ValueError):
+        permute(SECRET, 10, 10)
+    with pytest.raises(ValueError):
+        unpermute(SECRET, -1, 10)
@@ -0,0 +1,70 @@
+import sqlite3
+import pytest
+import ledger
+from migrations import migrate
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite3.connect(tmp_path / 'ledger.db')
+    db.row_factory = sqlite3.Row
+    migrate(db)
+    for cid in (1, 2):
+        db.execute('''
+            INSERT INTO customers (id, name, email, phone, password_hash, password_salt) VALUES (?, ?, ?, '+1555', 'x', 'x')
+        ''', (cid, f'Customer {cid}', f'c{cid}@example.com'))
+    db.commit()
+    yield db
+    db.close()
+
+
+def mismatched(db):
+    """Customers whose balance row disagrees with the sum of their entries."""
+    return db.execute('''
+        SELECT e.customer_id FROM ledger_entries e LEFT JOIN account_balances a USING (customer_id)
+        GROUP BY e.customer_id HAVING a.balance_cents IS NOT sum(e.amount_cents)
+    ''').fetchall()
+
+
+def test_balances_follow_charges_and_payments(db):
+    ledger.post(db, 1, ledger.CHARGE, 8998, due_date='2026-11-15')
+    ledger.post(db, 1, ledger.CHARGE, 1001, due_date='2026-12-15')
+    ledger.post(db, 2, ledger.CHARGE, ledger.to_cents('49.995'), due_date='2026-11-15')
+    ledger.record_payment(db, 1, 5000, 'card', 'completed', 'tx-1')
+    ledger.record_payment(db, 2, 5000, 'card', 'completed', 'tx-2')
+    db.commit()
+
+    assert mismatched(db) == []
+    assert ledger.balance(db, 1)['balance_cents'] == 4999
+    assert ledger.balance(db, 1)['due_date'] == '2026-12-15'
+    assert ledger.balance(db, 2) == {'amount': 0.0, 'balance_cents': 0, 'due_date': '2026-11-15', 'status': 'paid'}
+
+
+def test_reversal_is_a_new_entry(db):
+    entry = ledger.post(db, 1, ledger.CHARGE, 2500, memo='Late fee')
+    ledger.post(db, 1, 'reversal', -2500, memo=f'Reverses entry {entry}')
+    db.commit()
+    assert mismatched(db) == []
+    assert ledger.balance(db, 1)['balance_cents'] == 0
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute('UPDATE ledger_entries SET amount_cents = 0 WHERE id = ?', (entry,))
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute('DELETE FROM ledger_entries WHERE id = ?', (entry,))
+    db.rollback()
+    assert db.execute('SELECT count(*) FROM ledger_entries').fetchone()[0] == 2
+
+
+def test_retried_payment_and_reopening_post_nothing(db):
+    db.execute("INSERT INTO billing (customer_id, amount, due_date, status) VALUES (1, 89.98, '2026-11-15', 'pending')")
+    ledger.open_from_billing(db)
+    ledger.open_from_billing(db)
+    first = ledger.record_payment(db, 1, 2000, 'card', 'completed', 'tx-retry')
+    again = ledger.record_payment(db, 1, 2000, 'card', 'completed', 'tx-retry')
+    db.commit()
+
+    assert first == again
+    assert db.execute('SELECT count(*) FROM payments').fetchone()[0] == 1
+    assert db.execute('SELECT count(*) FROM ledger_entries').fetchone()[0] == 2
+    assert mismatched(db) == []
+    assert ledger.balance(db, 1)['balance_cents'] == 6998
@@ -0,0 +1,40 @@
+import sqlite3
+import db_util
+import outbox
+
+NUMBER = '+15550009999'
+
+
+def _row(db):
+    return db.execute('SELECT status, attempts, next_attempt_ts, last_error FROM sms_outbox WHERE to_number = ?',
+                      (NUMBER,)).fetchone()
+
+
+def test_failed_sends_back_off_then_dead_letter(app_module):
+    attempts = []
+
+    def send(to_number, body):
+        if to_number == NUMBER:
+            attempts.append(body)
+            raise RuntimeError('carrier rejected')
+
+    dispatcher = outbox.OutboxDispatcher(send, max_attempts=4, base_delay=10, max_delay=25, poll_interval=60)
+    db = sqlite3.connect(db_util.database_path())
+    outbox.enqueue(db, NUMBER, 'hello')
+    db.commit()
+    now = _row(db)[2]
+
+    dispatcher.dispatch(now)
+    assert _row(db) == ('pending', 1, now + 10, 'carrier rejected')
+    dispatcher.dispatch(now + 9)
+    assert len(attempts) == 1
+    # Delays double from base_delay and stop at max_delay
+    for attempt, due in ((2, now + 30), (3, now + 55)):
+        dispatcher.dispatch(_row(db)[2])
+        assert _row(db)[:3] == ('pending', attempt, due)
+
+    dispatcher.dispatch(now + 55)
+    assert _row(db)[:2] == ('dead', 4) and _row(db)[3] == 'carrier rejected'
+    dispatcher.dispatch(now + 10000)
+    assert len(attempts) == 4
+    db.close()
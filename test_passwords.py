@@ -0,0 +1,25 @@
+import passwords
+
+
+def test_dummy_hash_uses_current_settings():
+    stored_hash, salt = passwords.dummy_hash()
+    assert passwords.dummy_hash() == (stored_hash, salt)
+    assert passwords.check('anything', stored_hash, salt) == (False, False)
+
+
+def test_unknown_email_still_runs_the_password_check(client, monkeypatch):
+    checked = []
+    real_check = passwords.check
+
+    def spy(password, stored_hash, salt):
+        checked.append((stored_hash, salt))
+        return real_check(password, stored_hash, salt)
+
+    monkeypatch.setattr(passwords, 'check', spy)
+    response = client.post('/login', data={'email': 'nobody@example.com', 'password': 'password123'})
+    assert response.status_code == 200 and b'Invalid credentials' in response.data
+    assert checked == [passwords.dummy_hash()]
+
+    response = client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
+    assert response.status_code == 302
+    assert len(checked) == 2 and checked[1] != passwords.dummy_hash()
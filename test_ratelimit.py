@@ -0,0 +1,23 @@
+import ratelimit
+
+
+def test_admit_spends_nothing_when_refused():
+    shared = ratelimit.TokenBucketLimiter(5, 0.001)
+    per_ip = ratelimit.TokenBucketLimiter(2, 0.001)
+    results = [ratelimit.admit([(per_ip, '10.0.0.1'), (shared, 'all')])[0] for _ in range(10)]
+    assert results[:2] == [0, 0] and all(results[2:])
+    assert per_ip.rejected == 8 and shared.rejected == 0
+    assert ratelimit.admit([(per_ip, '10.0.0.2'), (shared, 'all')]) == (0, None)
+
+
+def test_one_ip_at_its_limit_does_not_lock_out_others(client, app_module, monkeypatch):
+    monkeypatch.setitem(app_module.rate_limiters, 'login', ratelimit.TokenBucketLimiter(5, 0.001))
+    monkeypatch.setitem(app_module.rate_limiters, 'login_ip', ratelimit.TokenBucketLimiter(3, 0.001))
+
+    def login(ip, n):
+        return client.post('/login', data={'email': f'nobody{n}@example.com', 'password': 'wrong'},
+                           environ_base={'REMOTE_ADDR': ip})
+
+    statuses = [login('203.0.113.7', n).status_code for n in range(10)]
+    assert statuses[3:] == [429] * 7
+    assert login('198.51.100.2', 99).status_code != 429
@@ -0,0 +1,50 @@
+import db_util
+import reminders
+
+START_TS = 1_000_000_000  # long past, so no other test's reminders fall due around it
+
+
+def test_seeded_appointments_have_reminders(app_module):
+    with db_util.connection(readonly=True) as db:
+        unarmed = db.execute('''
+            SELECT a.id FROM appointments a
+            WHERE a.customer_id = 8675309 AND a.status = 'scheduled'
+            AND NOT EXISTS (SELECT 1 FROM appointment_reminders r WHERE r.appointment_id = a.id)
+        ''').fetchall()
+        armed = db.execute('''
+            SELECT count(*) FROM appointment_reminders r JOIN appointments a ON a.id = r.appointment_id
+            WHERE a.customer_id = 8675309 AND r.status = 'pending'
+        ''').fetchone()[0]
+    assert unarmed == [] and armed >= 2
+
+
+def test_expired_lease_is_claimed_again(app_module):
+    sent = []
+    with db_util.connection() as db:
+        appointment_id = db.execute('''
+            INSERT INTO appointments (customer_id, type, status, start_time, end_time, start_ts, end_ts)
+            VALUES (8675309, 'repair', 'scheduled', '2001-09-09 01:46 AM', '2001-09-09 01:46 AM', ?, ?)
+        ''', (START_TS, START_TS)).lastrowid
+        reminders.arm(db, appointment_id, START_TS, now=START_TS - 2 * 86400)
+        db.commit()
+        reminder_id, due = db.execute('''
+            SELECT id, due_ts FROM appointment_reminders WHERE appointment_id = ? AND reminder_type = 'sms'
+        ''', (appointment_id,)).fetchone()
+
+        # A worker claims the reminder and dies before recording the result
+        crashed = reminders.ReminderScheduler(sent.append, lease=300)
+        assert [row['id'] for row in crashed._claim(db, [reminder_id], due)] == [reminder_id]
+        assert tuple(db.execute('SELECT status, due_ts, attempts FROM appointment_reminders WHERE id = ?',
+                                (reminder_id,)).fetchone()) == ('sending', due + 300, 1)
+
+    survivor = reminders.ReminderScheduler(sent.append, lease=300)
+    survivor.tick(due + 299)
+    assert sent == []
+    survivor.tick(due + 300)
+    assert [(r['id'], r['reminder_type']) for r in sent] == [(reminder_id, 'sms')]
+
+    with db_util.connection() as db:
+        assert tuple(db.execute('SELECT status, attempts FROM appointment_reminders WHERE id = ?',
+                                (reminder_id,)).fetchone()) == ('sent', 2)
+        # Already sent, so a later pass does not claim it again
+        assert survivor._claim(db, [reminder_id], due + 10000) == []
@@ -0,0 +1,52 @@
+import base64
+import sqlite3
+import threading
+from datetime import date, timedelta
+import db_util
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'swaig:secret').decode()}
+CONCURRENT = 8
+
+
+def _add_customers_and_technicians(count, technicians):
+    db = sqlite3.connect(db_util.database_path())
+    ids = [db.execute('''
+        INSERT INTO customers (name, email, phone, password_hash, password_salt) VALUES (?, ?, ?, 'x', 'x')
+    ''', (f'Slot Test {i}', f'slot-test-{i}@example.com', f'+1555010{i:04d}')).lastrowid for i in range(count)]
+    for i in range(technicians):
+        db.execute('INSERT OR IGNORE INTO technicians (name, phone, email) VALUES (?, ?, ?)',
+                   (f'Tech {i}', f'+1555020{i:04d}', f'slot-tech-{i}@example.com'))
+    db.commit()
+    capacity = db.execute("SELECT count(*) FROM technicians WHERE status = 'active'").fetchone()[0]
+    db.close()
+    return ids, capacity
+
+
+def test_concurrent_bookings_fill_exactly_the_slot_capacity(client, app_module):
+    customer_ids, capacity = _add_customers_and_technicians(CONCURRENT, 3)
+    assert 0 < capacity < CONCURRENT
+    day = (date.today() + timedelta(days=30)).isoformat()
+    start = threading.Barrier(CONCURRENT)
+    replies = []
+
+    def book(customer_id):
+        worker = app_module.app.test_client()
+        start.wait()
+        response = worker.post('/swaig', headers=AUTH, json={'function': 'schedule_appointment', 'argument': {
+            'parsed': [{'customer_id': str(customer_id), 'type': 'repair', 'date': day, 'time_slot': 'afternoon'}]}})
+        replies.append(response.get_data(as_text=True))
+
+    threads = [threading.Thread(target=book, args=(cid,)) for cid in customer_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum('has been scheduled' in r for r in replies) == capacity
+    assert sum('already booked' in r for r in replies) == CONCURRENT - capacity
+    db = sqlite3.connect(db_util.database_path())
+    booked = db.execute(f'''
+        SELECT count(*) FROM appointments WHERE customer_id IN ({', '.join('?' * CONCURRENT)})
+    ''', customer_ids).fetchone()[0]
+    db.close()
+    assert booked == capacity
@@ -0,0 +1,28 @@
+import sqlite3
+import status_history
+from migrations import migrate
+
+DAY = 86400
+
+
+def test_prune_keeps_raw_events_until_rolled_up(tmp_path):
+    db = sqlite3.connect(tmp_path / 'history.db')
+    migrate(db)
+    now = 100 * DAY
+    db.execute('INSERT INTO modem_status_events (customer_id, status, ts, ended_ts) VALUES (1, ?, ?, ?)',
+               ('offline', now - 3 * DAY, now - 3 * DAY + 600))
+    # The worker has been down for four days
+    for resolution, _ in status_history.RESOLUTIONS:
+        status_history._set_watermark(db, resolution, now - 4 * DAY)
+    db.commit()
+
+    status_history.prune(db, now)
+    db.commit()
+    assert db.execute('SELECT count(*) FROM modem_status_events').fetchone()[0] == 1
+
+    while status_history.watermarks(db)['minute'] < now:
+        status_history.run_rollups(db, now)
+    offline = db.execute("SELECT sum(offline_seconds) FROM modem_status_rollups WHERE resolution = 'hour'")
+    assert offline.fetchone()[0] == 600
+    assert db.execute('SELECT count(*) FROM modem_status_events').fetchone()[0] == 0
+    db.close()
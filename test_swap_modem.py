@@ -0,0 +1,28 @@
+import base64
+import db_util
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'swaig:secret').decode()}
+
+
+def _swap(client, customer_id, mac):
+    response = client.post('/swaig', headers=AUTH, json={'function': 'swap_modem', 'argument': {
+        'parsed': [{'customer_id': str(customer_id), 'make': 'Arris', 'model': 'SB8200', 'mac_address': mac}]}})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_swap_replaces_the_customers_modem(client, make_customer):
+    customer_id = make_customer('02:00:00:00:01:01')
+    assert 'updated successfully' in _swap(client, customer_id, '02-00-00-00-01-02')
+    with db_util.connection(readonly=True) as db:
+        modem = db.execute('SELECT make, mac_address FROM modems WHERE customer_id = ?', (customer_id,)).fetchone()
+    assert tuple(modem) == ('Arris', '02:00:00:00:01:02')
+
+
+def test_swap_without_a_modem_on_file_is_refused(client, make_customer):
+    customer_id = make_customer()
+    reply = _swap(client, customer_id, '02:00:00:00:01:03')
+    assert "couldn't find a modem" in reply
+    with db_util.connection(readonly=True) as db:
+        history = db.execute("SELECT count(*) FROM modem_history WHERE customer_id = ?", (customer_id,)).fetchone()[0]
+    assert history == 0
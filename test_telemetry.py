@@ -0,0 +1,70 @@
+import base64
+import time
+from datetime import date, timedelta
+import sqlite3
+import db_util
+import telemetry
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'swaig:secret').decode()}
+
+
+def test_normalize_mac():
+    assert telemetry.normalize_mac('aa-bb-cc-dd-ee-0f') == 'AA:BB:CC:DD:EE:0F'
+    assert telemetry.normalize_mac('aabb.ccdd.ee0f') == 'AA:BB:CC:DD:EE:0F'
+    assert telemetry.normalize_mac('AA:BB:CC:DD:EE:GG') is None
+    assert telemetry.normalize_mac('AA:BB:CC:DD:EE:0F:zz') is None
+    assert telemetry.normalize_mac(None) is None
+
+
+def test_voice_swap_is_found_by_heartbeats(client, app_module):
+    def swap(mac):
+        return client.post('/swaig', headers=AUTH, json={'function': 'swap_modem', 'argument': {'parsed': [{
+            'customer_id': '8675309', 'make': 'Netgear', 'model': 'CM1000', 'mac_address': mac}]}})
+
+    assert 'Invalid MAC address' in swap('zz:zz:zz:zz:zz:zz').get_data(as_text=True)
+    assert 'updated successfully' in swap('0a-1b-2c-3d-4e-5f').get_data(as_text=True)
+
+    response = client.post('/api/modems/telemetry', headers=AUTH, json={'heartbeats': [
+        {'mac': '0a:1b:2c:3d:4e:5f', 'status': 'offline', 'ts': time.time()}]})
+    assert response.status_code < 300
+    app_module.heartbeat_buffer.flush()
+
+    db = sqlite3.connect(db_util.database_path())
+    assert db.execute('SELECT mac_address, status FROM modems WHERE customer_id = 8675309').fetchone() == \
+        ('0A:1B:2C:3D:4E:5F', 'offline')
+    db.close()
+
+
+def test_modem_swap_appointment_stores_normalized_mac(client):
+    day = (date.today() + timedelta(days=10)).isoformat()
+    response = client.post('/swaig', headers=AUTH, json={'function': 'schedule_appointment', 'argument': {'parsed': [{
+        'customer_id': '8675309', 'type': 'modem_swap', 'date': day, 'time_slot': 'morning',
+        'make': 'Netgear', 'model': 'CM1000', 'mac_address': '0a1b.2c3d.4e60'}]}})
+    assert response.status_code == 200
+
+    db = sqlite3.connect(db_util.database_path())
+    notes = db.execute("SELECT notes FROM appointments WHERE customer_id = 8675309 AND type = 'modem_swap'").fetchone()
+    db.close()
+    assert notes is not None and 'MAC: 0A:1B:2C:3D:4E:60' in notes[0]
+
+
+def test_same_status_heartbeats_keep_the_modem_version(app_module, make_customer):
+    mac = '02:00:00:00:13:01'
+    customer_id = make_customer(mac)
+    db = sqlite3.connect(db_util.database_path())
+
+    def version():
+        return db.execute("SELECT version FROM data_versions WHERE customer_id = ? AND resource = 'modem'",
+                          (customer_id,)).fetchone()[0]
+
+    before = version()
+    now = time.time()
+    for i in range(3):
+        app_module.heartbeat_buffer.add(mac, 'online', now + i)
+        app_module.heartbeat_buffer.flush()
+    assert version() == before
+
+    app_module.heartbeat_buffer.add(mac, 'rebooting', now + 5)
+    app_module.heartbeat_buffer.flush()
+    assert version() == before + 1
+    db.close()
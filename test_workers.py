@@ -0,0 +1,18 @@
+import os
+
+
+def test_workers_start_once_per_process(client, app_module, monkeypatch):
+    started = []
+    for worker in (app_module.status_rollup, app_module.reminder_scheduler, app_module.sms_dispatcher):
+        monkeypatch.setattr(worker, 'start', lambda worker=worker: started.append(worker))
+    monkeypatch.setattr(app_module, 'BACKGROUND_WORKERS', True)
+    monkeypatch.setattr(app_module, '_workers_pid', None)
+
+    client.get('/login')
+    client.get('/login')
+    assert len(started) == 3
+
+    # A forked WSGI worker does not inherit the parent's threads
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    client.get('/login')
+    assert len(started) == 6